@@ -0,0 +1,214 @@
+#!/usr/bin/python
+
+# Benchmarks of the stages of the visualiser on synthetic traces (see synthetic.py), recording the wall time and peak RSS of each
+# stage at several trace sizes. Each size runs in a fresh process. Results are saved as JSON, and compared with those of an earlier
+# run with --compare.
+#
+#   python -m benchmarks.run --events 10k 100k 1M 10M -o results.json
+#   python -m benchmarks.run --compare baseline.json results.json
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from scripts.profiling import reset_peak_rss, peak_rss
+
+
+# Stages which can be benchmarked: generating the synthetic parsed data, writing it as CTF and parsing that, restoring the parsed
+# data, building the visualisers (which filters and colours the events), and rendering
+STAGES = ["generate", "write_ctf", "parse", "restore", "visualisers", "remove_reactions", "colour", "find_dependencies", "bokeh", "holoviews"]
+
+# Suffixes of the event counts given on the command line
+COUNT_SUFFIXES = {"k": 1000, "M": 1000000, "G": 1000000000}
+
+# Relative slowdown of a stage reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.1
+
+
+def parse_count(text):
+    '''Converts an event count such as "100k" or "10M" to an integer'''
+    if text[-1:] in COUNT_SUFFIXES:
+        return int(float(text[:-1]) * COUNT_SUFFIXES[text[-1]])
+    return int(text)
+
+
+
+class stage_recorder:
+    '''Records the wall time and peak RSS of nested stages. The peak RSS is reset when a stage starts, so a stage's peak includes
+    those of the stages nested in it'''
+
+    def __init__(self, events):
+        self.events = events
+        self.results = {}
+        self.open_stages = []
+
+    def run(self, name, function, *args):
+        self.open_stages.append([])
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        peak = max([peak_rss()] + self.open_stages.pop())
+        if self.open_stages:
+            self.open_stages[-1].append(peak)
+        self.results[name] = {"seconds": seconds, "peak_rss_mb": peak / 2**20, "events_per_second": self.events / seconds if seconds > 0 else None}
+        return result
+
+
+def run_size(events, options):
+    '''Runs the selected stages on a synthetic trace of about the given number of events (in a fresh process, see main). Returns
+    the results of the size'''
+    # Rendered pages are written to a temporary directory, without opening a browser
+    os.environ["BOKEH_BROWSER"] = "none"
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="tracing-lf-benchmark-") as work_dir:
+        os.chdir(work_dir)
+        try:
+            return run_stages(events, options, work_dir)
+        finally:
+            # Leave the directory before it is removed
+            os.chdir(previous_dir)
+
+
+def run_stages(events, options, work_dir):
+    '''Body of run_size, with work_dir as working directory'''
+    # Imported here, so that the parent process stays small
+    from benchmarks import synthetic
+    from scripts.read_ctf import parser
+    import visualiser
+
+    yaml_data = synthetic.topology(options["reactors"], options["reactions"], options["fanout"], options["seed"])
+    yaml_filepath = os.path.join(work_dir, "program.yaml")
+    synthetic.write_topology(yaml_data, yaml_filepath)
+    tags = synthetic.tags_for_events(yaml_data, events)
+    trace_options = (tags, options["workers"], options["period_ns"], options["duration_ns"], options["seed"])
+
+    recorder = stage_recorder(events)
+    stages = options["stages"]
+    state, tables = recorder.run("generate", synthetic.parser_state, yaml_filepath, *trace_options)
+
+    if events <= options["max_ctf_events"] and ("write_ctf" in stages or "parse" in stages):
+        ctf_path = os.path.join(work_dir, "ctf")
+        recorder.run("write_ctf", synthetic.write_ctf, yaml_filepath, ctf_path, *trace_options)
+        if "parse" in stages:
+            recorder.run("parse", parser().parse, ctf_path, yaml_filepath, None, options["jobs"], options["native"])
+
+    data_parser = parser()
+    recorder.run("restore", data_parser.set_state, state, tables)
+    del state, tables
+
+    render = events <= options["max_render_events"]
+    if "visualisers" in stages or render:
+
+        # Times the stages called by the constructor and by bokeh_visualisation
+        class timed_visualisers(visualiser.visualisers):
+            def remove_reactions(self):
+                return recorder.run("remove_reactions", super().remove_reactions)
+
+            def colour(self):
+                return recorder.run("colour", super().colour)
+
+            def find_dependencies(self):
+                return recorder.run("find_dependencies", super().find_dependencies)
+
+        vis = recorder.run("visualisers", timed_visualisers, None, yaml_filepath, None, options["exclude"], False, False,
+                           None, 1, False, None, False, data_parser)
+        if render and "bokeh" in stages:
+            recorder.run("bokeh", vis.bokeh_visualisation)
+        if render and "holoviews" in stages:
+            recorder.run("holoviews", vis.holoviews_visualisation)
+        if "find_dependencies" in stages and "find_dependencies" not in recorder.results:
+            vis.find_dependencies()
+
+    results = {name: result for name, result in recorder.results.items() if name in stages}
+    return {"events": events, "tags": tags, "executions": len(data_parser.get_ordered_exe_events()), "stages": results}
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold=REGRESSION_THRESHOLD):
+    '''Text comparison of the stage times of two result files, and whether any stage is slower by more than threshold'''
+    baseline_sizes = {size["events"]: size for size in baseline["sizes"]}
+    lines = ["%12s %-18s %12s %12s %9s %12s %12s" % ("events", "stage", "before (s)", "after (s)", "change", "before (MB)", "after (MB)")]
+    regression = False
+    for size in results["sizes"]:
+        before_size = baseline_sizes.get(size["events"])
+        if before_size is None:
+            continue
+        for stage, after in size["stages"].items():
+            before = before_size["stages"].get(stage)
+            if before is None:
+                continue
+            change = after["seconds"] / before["seconds"] - 1 if before["seconds"] > 0 else 0.0
+            slower = change > threshold
+            regression = regression or slower
+            lines.append("%12d %-18s %12.3f %12.3f %+8.1f%% %12.1f %12.1f%s" % (size["events"], stage, before["seconds"], after["seconds"], 100 * change,
+                                                                                 before["peak_rss_mb"], after["peak_rss_mb"], "  REGRESSION" if slower else ""))
+    return "\n".join(lines), regression
+
+
+def main():
+    argparser = argparse.ArgumentParser(description="Benchmarks the stages of the visualiser on synthetic traces")
+    argparser.add_argument("--events", nargs="+", type=parse_count, default=[parse_count(count) for count in ["10k", "100k", "1M", "10M"]],
+                           help="Trace sizes, in events (e.g. 10k 100k 1M 10M)")
+    argparser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to benchmark (all by default)")
+    argparser.add_argument("--reactors", type=int, default=10, help="Number of reactors of the synthetic program")
+    argparser.add_argument("--reactions", type=int, default=4, help="Number of reactions of every reactor")
+    argparser.add_argument("--fanout", type=int, default=2, help="Number of later reactors the output of every reactor is connected to")
+    argparser.add_argument("--workers", type=int, default=4, help="Number of workers executing the reactions")
+    argparser.add_argument("--period", dest="period_ns", type=int, default=1000000, help="Time between tags (ns)")
+    argparser.add_argument("--duration", dest="duration_ns", type=int, default=5000, help="Typical execution time of a reaction (ns)")
+    argparser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic program and trace")
+    argparser.add_argument("-x", "--exclude", type=str, help="Regex of the reactions removed by the visualisers (times remove_reactions)")
+    argparser.add_argument("--max-ctf-events", type=parse_count, default=parse_count("1M"),
+                           help="Largest trace written as CTF and parsed (larger traces only restore the parsed data)")
+    argparser.add_argument("--max-render-events", type=parse_count, default=parse_count("1M"),
+                           help="Largest trace rendered with Bokeh and holoviews")
+    argparser.add_argument("-j", "--jobs", type=int, default=1, help="Number of processes decoding the CTF trace")
+    argparser.add_argument("--native", action="store_true", help="Decode the CTF trace with the native decoder")
+    argparser.add_argument("-o", "--output", type=str, default="benchmark.json", help="JSON file the results are written to")
+    argparser.add_argument("--compare", nargs=2, metavar=("BASELINE", "RESULTS"),
+                           help="Compares two result files instead of running the benchmarks (exits with 1 if a stage regressed)")
+    args = argparser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            results = json.load(f)
+        report, regression = compare(baseline, results)
+        print(report)
+        sys.exit(1 if regression else 0)
+
+    options = {option: getattr(args, option) for option in ["stages", "reactors", "reactions", "fanout", "workers", "period_ns", "duration_ns",
+                                                            "seed", "exclude", "max_ctf_events", "max_render_events", "jobs", "native"]}
+    results = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": git_revision(), "python": platform.python_version(),
+               "platform": platform.platform(), "options": options, "sizes": []}
+
+    for events in args.events:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            size = executor.submit(run_size, events, options).result()
+        results["sizes"].append(size)
+        for stage, result in size["stages"].items():
+            print("%12d events %-18s %10.3f s %10.1f MB" % (events, stage, result["seconds"], result["peak_rss_mb"]))
+
+        # Written after every size, so that the results of the smaller sizes are kept if a larger one runs out of memory
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
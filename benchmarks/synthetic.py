@@ -0,0 +1,226 @@
+#!/usr/bin/python
+
+# Synthetic reactor_cpp programs for the benchmarks: a YAML topology, and the trace of its execution either as the parsed data
+# (the (state, tables) form of parser.get_state, which scales to tens of millions of events) or as a CTF trace written by
+# ctf_writer (decoded by the parser like a recorded trace).
+
+import math
+import os
+
+import numpy as np
+import yaml
+
+from scripts import ctf_writer
+from scripts.event_store import name_categories
+from scripts.read_ctf import parser
+from scripts.symbols import symbol_table
+
+
+# Origin of the synthetic clock and of the logical times (ns)
+ORIGIN_NS = 1700000000000000000
+
+# Time between the instantaneous events of a tag and the executions they trigger (ns)
+EVENT_GAP_NS = 20
+
+
+def topology(reactors=10, reactions=4, fanout=2, seed=0):
+    '''YAML data of a program of reactors Main.r0 ... Main.r<reactors - 1>, each with reactions reaction_0 ... and a logical action
+    t scheduled by reaction_0 at every tag. The output of each reactor is connected to the input of fanout later reactors (chosen
+    at random), where it triggers reaction_1. Within a reactor, each reaction depends on the previous one'''
+    random_generator = np.random.default_rng(seed)
+    main = "Main"
+    names = [main + ".r%d" % reactor for reactor in range(reactors)]
+    instances = {}
+    dependencies = []
+
+    # Downstream reactors of each reactor
+    downstream = [sorted(random_generator.choice(np.arange(reactor + 1, reactors), min(fanout, reactors - reactor - 1), replace=False).tolist())
+                  for reactor in range(reactors)]
+
+    for reactor, reactor_name in enumerate(names):
+        upstream = [names[source] for source in range(reactor) if reactor in downstream[source]]
+        reaction_list = []
+        for reaction in range(reactions):
+            triggers = [reactor_name + ".t"] + ([reactor_name + ".startup"] if reaction == 0 else [])
+            if reaction == 1 and upstream:
+                triggers.append(reactor_name + ".inp")
+            effects = [reactor_name + ".t"] if reaction == 0 else ([reactor_name + ".out"] if reaction == reactions - 1 else None)
+            reaction_list.append({"name": "reaction_%d" % reaction, "priority": reaction, "level": reactor * reactions + reaction,
+                                  "triggers": triggers, "effects": effects})
+            # reaction_dependencies entries read "from" depends on "to"
+            if reaction:
+                dependencies += [{"from": reactor_name + ".reaction_%d" % reaction}, {"to": reactor_name + ".reaction_%d" % (reaction - 1)}]
+        for source in upstream:
+            dependencies += [{"from": reactor_name + ".reaction_%d" % min(1, reactions - 1)}, {"to": source + ".reaction_%d" % (reactions - 1)}]
+
+        instances[reactor_name] = {
+            "reactions": reaction_list,
+            "triggers": [{"name": "t", "type": "logical action", "effect_of": [reactor_name + ".reaction_0"],
+                          "trigger_of": [reactor_name + ".reaction_%d" % reaction for reaction in range(reactions)]},
+                         {"name": "startup", "type": "startup", "effect_of": None, "trigger_of": [reactor_name + ".reaction_0"]}],
+            "inputs": {"inp": {"upstream_port": names[max(source for source in range(reactor) if reactor in downstream[source])] + ".out"
+                               if upstream else None,
+                               "downstream_ports": None, "trigger_of": [reactor_name + ".reaction_%d" % min(1, reactions - 1)]}},
+            "outputs": {"out": {"upstream_port": None, "downstream_ports": [names[target] + ".inp" for target in downstream[reactor]] or None,
+                                "trigger_of": None}}}
+
+    return {"top_level_instances": [main], "all_reactor_instances": instances, "reaction_dependencies": dependencies}
+
+
+def write_topology(yaml_data, yaml_filepath):
+    with open(yaml_filepath, "w") as f:
+        yaml.dump(yaml_data, f)
+
+
+def tags_for_events(yaml_data, events):
+    '''Number of tags giving about the given number of trace events (a schedule_action per reactor, and a trigger_reaction,
+    reaction_execution_starts and reaction_execution_finishes per reaction at every tag)'''
+    instances = yaml_data["all_reactor_instances"].values()
+    per_tag = sum(1 + 3 * len(items["reactions"]) for items in instances)
+    return max(1, int(math.ceil(events / per_tag)))
+
+
+def schedule(yaml_data, tags=1000, workers=4, period_ns=1000000, duration_ns=5000, seed=0):
+    '''Executions of every reaction at every tag, scheduled on the workers in topological order (a reaction starts once the
+    reactions it depends on have finished and a worker is free). Tags are period_ns apart in logical time, and a tag starts once
+    the previous one has finished. Execution times are log-normally distributed around duration_ns.
+
+    Returns the reactions [(reactor, reaction)] in topological order, and {column : array} of shape (tags, reactions) with the
+    absolute start and end times, the worker of every execution, and the logical time and microstep of every tag'''
+    random_generator = np.random.default_rng(seed)
+    instances = yaml_data["all_reactor_instances"]
+    reactions = [(reactor_name, reaction["name"]) for reactor_name, items in instances.items() for reaction in items["reactions"]]
+    position = {reactor_name + "." + name: index for index, (reactor_name, name) in enumerate(reactions)}
+
+    depends_on = [[] for _ in reactions]
+    dependencies = iter(yaml_data["reaction_dependencies"])
+    for item in dependencies:
+        depends_on[position[item["from"]]].append(position[next(dependencies)["to"]])
+
+    # Schedule every tag from time 0, all tags at once (one vectorized step per reaction)
+    durations = random_generator.lognormal(math.log(duration_ns), 0.5, size=(tags, len(reactions))).astype(np.int64) + 1
+    starts = np.zeros((tags, len(reactions)), dtype=np.int64)
+    ends = np.zeros((tags, len(reactions)), dtype=np.int64)
+    assigned = np.zeros((tags, len(reactions)), dtype=np.int32)
+    free = np.full((workers, tags), EVENT_GAP_NS * len(instances), dtype=np.int64)
+    rows = np.arange(tags)
+    for index in range(len(reactions)):
+        ready = np.max(ends[:, depends_on[index]], axis=1) if depends_on[index] else np.zeros(tags, dtype=np.int64)
+        worker = np.argmin(free, axis=0)
+        starts[:, index] = np.maximum(ready, free[worker, rows]) + EVENT_GAP_NS
+        ends[:, index] = starts[:, index] + durations[:, index]
+        free[worker, rows] = ends[:, index]
+        assigned[:, index] = worker
+
+    # Start of every tag: at its logical time, or once the previous tag has finished (S[t] = max(L[t], S[t - 1] + M[t - 1]), solved
+    # with a running maximum)
+    logical_times = ORIGIN_NS + np.arange(tags, dtype=np.int64) * period_ns
+    makespans = ends.max(axis=1) + EVENT_GAP_NS
+    elapsed = np.concatenate(([0], np.cumsum(makespans)[:-1]))
+    tag_starts = np.maximum.accumulate(logical_times - elapsed) + elapsed
+
+    return reactions, {"start": starts + tag_starts[:, None], "end": ends + tag_starts[:, None], "worker": assigned,
+                       "tag_start": tag_starts, "logical_time": logical_times, "microstep": np.zeros(tags, dtype=np.int64)}
+
+
+def parser_state(yaml_filepath, tags=1000, workers=4, period_ns=1000000, duration_ns=5000, seed=0):
+    '''Parsed data of a synthetic trace (of at least one tag) of the program in yaml_filepath, in the (state, tables) form of
+    parser.get_state. The events are those write_ctf would write, so parsing that trace gives the same rows (up to the order of
+    simultaneous events)'''
+    yaml_parser = parser()
+    yaml_parser.redundant_reactions = []
+    yaml_parser.parse_yaml(yaml_filepath)
+    yaml_data = yaml.load(open(yaml_filepath), Loader=yaml.FullLoader)
+    reactions, executions = schedule(yaml_data, tags, workers, period_ns, duration_ns, seed)
+    symbols = symbol_table.from_reaction_dict(yaml_parser.reaction_dict, yaml_parser.redundant_reactions)
+    reactors = list(yaml_data["all_reactor_instances"])
+
+    # Names in order of first appearance: the startup action of each reactor (scheduled at the first tag), the reactions in the
+    # order they are first triggered, then the actions t (scheduled from the second tag on)
+    categories = name_categories()
+    appearance = [(reactor_name, "startup") for reactor_name in reactors]
+    appearance += [reactions[index] for index in np.argsort(executions["start"][0], kind="stable")]
+    appearance += [(reactor_name, "t") for reactor_name in reactors] if tags > 1 else []
+    for pair in appearance:
+        symbol = symbols.pair_ids[pair]
+        categories.add(symbols.names[symbol], symbols.attribute_row(symbol))
+    reaction_codes = np.array([categories.codes[reactor_name + "." + name] for reactor_name, name in reactions], dtype=np.int32)
+
+    start_time_ns = int(executions["tag_start"][0])
+    start_time_logical = int(executions["logical_time"][0])
+
+    # Executions, ordered by the time they finished
+    order = np.argsort(executions["end"], axis=None, kind="stable")
+    tag_of = order // len(reactions)
+    exe_events = {"name_id": reaction_codes[order % len(reactions)],
+                  "start_ns": executions["start"].reshape(-1)[order] - start_time_ns,
+                  "end_ns": executions["end"].reshape(-1)[order] - start_time_ns,
+                  "logical_time": executions["logical_time"][tag_of] - start_time_logical,
+                  "microstep": executions["microstep"][tag_of],
+                  "worker": executions["worker"].reshape(-1)[order]}
+
+    # Instantaneous events: the actions scheduled at the start of every tag (startup at the first tag, shown as reactions) and the
+    # trigger_reaction event before every execution
+    trigger_order = np.argsort(executions["start"], axis=None, kind="stable")
+    trigger_tags = trigger_order // len(reactions)
+    triggers = {"name_id": reaction_codes[trigger_order % len(reactions)],
+                "logical_time": executions["logical_time"][trigger_tags] - start_time_logical,
+                "microstep": executions["microstep"][trigger_tags]}
+    startup = {"name_id": np.arange(len(reactors), dtype=np.int32), "logical_time": np.zeros(len(reactors), dtype=np.int64),
+               "microstep": np.zeros(len(reactors), dtype=np.int64)}
+    scheduled_tags = np.repeat(np.arange(1, tags), len(reactors))
+    actions = {"name_id": np.tile(np.arange(len(categories) - len(reactors), len(categories), dtype=np.int32), tags - 1),
+               "logical_time": executions["logical_time"][scheduled_tags] - start_time_logical,
+               "microstep": executions["microstep"][scheduled_tags]}
+
+    state = {"start_time": start_time_ns / 1000.0,
+             "start_time_ns": start_time_ns,
+             "start_time_logical": start_time_logical,
+             "y_axis_labels": list(categories.names),
+             "redundant_reactions": yaml_parser.redundant_reactions,
+             "reaction_dict": yaml_parser.reaction_dict,
+             "action_names": yaml_parser.action_names,
+             "reactor_name": yaml_parser.reactor_name,
+             "dependency_dict": dict(yaml_parser.dependency_dict),
+             "port_dict": dict(yaml_parser.port_dict),
+             "names": categories.names,
+             "attributes": categories.attributes}
+
+    tables = {"exe_events": exe_events,
+              "inst_events_reactions": {column: np.concatenate((startup[column], triggers[column])) for column in triggers},
+              "inst_events_actions": actions}
+    return state, tables
+
+
+def write_ctf(yaml_filepath, ctf_path, tags=1000, workers=4, period_ns=1000000, duration_ns=5000, seed=0, cpus=None):
+    '''Writes the synthetic trace returned by parser_state as a CTF trace (one stream file per worker unless cpus is given).
+    The events are built as a list, so this is meant for traces of up to a few million events'''
+    yaml_data = yaml.load(open(yaml_filepath), Loader=yaml.FullLoader)
+    reactions, executions = schedule(yaml_data, tags, workers, period_ns, duration_ns, seed)
+    reactors = list(yaml_data["all_reactor_instances"])
+    cpus = cpus or workers
+
+    events = []
+    for tag in range(tags):
+        logical_time = int(executions["logical_time"][tag])
+        microstep = int(executions["microstep"][tag])
+        tag_start = int(executions["tag_start"][tag])
+        for index, reactor_name in enumerate(reactors):
+            events.append((tag_start + index, "reactor_cpp:schedule_action",
+                           {"reactor_name": reactor_name, "action_name": "startup" if tag == 0 else "t", "timestamp_ns": logical_time,
+                            "timestamp_microstep": microstep}, index % cpus))
+        for index, (reactor_name, name) in enumerate(reactions):
+            start = int(executions["start"][tag, index])
+            worker = int(executions["worker"][tag, index])
+            execution = {"reaction_name": reactor_name + "." + name, "worker_id": worker, "timestamp_ns": logical_time,
+                         "timestamp_microstep": microstep}
+            events.append((start - EVENT_GAP_NS // 2, "reactor_cpp:trigger_reaction",
+                           {"reactor_name": reactor_name, "reaction_name": name, "timestamp_ns": logical_time, "timestamp_microstep": microstep},
+                           worker % cpus))
+            events.append((start, "reactor_cpp:reaction_execution_starts", execution, worker % cpus))
+            events.append((int(executions["end"][tag, index]), "reactor_cpp:reaction_execution_finishes", execution, worker % cpus))
+
+    events.sort(key=lambda event: event[0])
+    os.makedirs(ctf_path, exist_ok=True)
+    ctf_writer.write_trace(ctf_path, events, ORIGIN_NS)
+    return len(events)
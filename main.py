@@ -4,7 +4,9 @@ import argparse
 import os
 import sys
 import time
-import visualiser
+from scripts.trace_cache import trace_cache
+from scripts.time_window import time_window, parse_duration
+from scripts.profiling import stage_profiler, stage
 
 
 
@@ -12,12 +14,35 @@ import visualiser
 start_time = time.time()
 
 
+# "serve" as first argument runs a Bokeh server showing the trace at a level of detail matching the visible range, instead of
+# writing an HTML file
+serve_mode = len(sys.argv) > 1 and sys.argv[1] == "serve"
+
+# "stats" as first argument prints the execution time statistics of every reaction (streamed from the trace, without building
+# the event tables), instead of visualising it
+stats_mode = len(sys.argv) > 1 and sys.argv[1] == "stats"
+
+# "diff" as first argument compares two traces (CTF YAML CTF_AFTER YAML_AFTER), printing the reactions whose execution times
+# changed significantly
+diff_mode = len(sys.argv) > 1 and sys.argv[1] == "diff"
+
+# "export" as first argument converts the trace to a Perfetto or Chrome JSON trace, streamed from the CTF trace in constant memory
+export_mode = len(sys.argv) > 1 and sys.argv[1] == "export"
+if serve_mode or stats_mode or diff_mode or export_mode:
+    del sys.argv[1]
+
+
 # Argparser to get the ctf trace directory and the yaml filepath
 argparser = argparse.ArgumentParser()
 argparser.add_argument("ctf", metavar="CTF", type=str,
                     help="Path to the CTF trace directory")
 argparser.add_argument("yamlfile", type=str,
                     help="Path to the .yaml file")
+if diff_mode:
+    argparser.add_argument("ctf_after", metavar="CTF_AFTER", type=str,
+                        help="Path to the CTF trace directory to compare with (diff mode)")
+    argparser.add_argument("yamlfile_after", type=str,
+                        help="Path to the .yaml file of the trace to compare with (diff mode)")
 argparser.add_argument("-i", "--include", type=str,
                     help="Regex to INCLUDE only certain reactors or reactions")
 argparser.add_argument("-x", "--exclude", type=str,
@@ -30,63 +55,194 @@ argparser.add_argument("-hv", "--holoviews", action='store_true',
                     help="Generates a STANDARD trace view using Holoviews. Designed for large traces, losing some functionality of standard visualisation")
 argparser.add_argument("-hw", "--holoviews_worker", action='store_true',
                     help="Generates the WORKER TRACE view using Holoviews. Designed for large traces, losing some functionality of standard visualisation")
+argparser.add_argument("--rasterize", action='store_true',
+                    help="With -hv or -hw, rasterizes the executions with datashader (re-aggregated on zoom) and serves the view instead of saving it")
+argparser.add_argument("--chunked", action='store_true',
+                    help="Writes a static HTML file which loads the events of the visible range from chunk files written next to it, for traces too large to embed in one page")
+argparser.add_argument("--utilization", action='store_true',
+                    help="Prints the busy and idle time of each worker, and shows their utilization and the idle time while work was pending in the worker view")
+argparser.add_argument("--critical-path", action='store_true',
+                    help="Prints the critical path (longest chain of dependent executions) of the tags, and highlights it in the dependencies view")
+argparser.add_argument("--lateness", type=parse_duration, metavar="TIME",
+                    help="Prints how late the executions of each reaction started after their tag, and lists the tags which started more than TIME late")
+argparser.add_argument("--lateness-alignment", choices=["min", "first"], default="min",
+                    help="How the physical and logical clocks are aligned for --lateness: so that the least late execution is on time (min), or the first event of the trace (first)")
+argparser.add_argument("--no-cache", action='store_true',
+                    help="Always decode the CTF trace, without reading or writing the parsed trace cache")
+argparser.add_argument("--cache-dir", type=str,
+                    help="Directory of the parsed trace cache (default: ~/.cache/tracing-lf)")
+argparser.add_argument("--evict-cache", type=float, metavar="DAYS",
+                    help="Remove cached traces which have not been used for more than DAYS days (0 removes all) before running")
+argparser.add_argument("-j", "--jobs", type=int, default=1,
+                    help="Number of processes used to decode the stream files of the trace in parallel")
+argparser.add_argument("--native", action='store_true',
+                    help="Decode the trace with the built-in memory-mapped decoder instead of Babeltrace (falls back to Babeltrace for unsupported layouts)")
+argparser.add_argument("--from", dest="begin", type=parse_duration, metavar="TIME",
+                    help="Only load events recorded at least TIME (e.g. 12.5s, 300ms) after the start of the trace")
+argparser.add_argument("--to", dest="end", type=parse_duration, metavar="TIME",
+                    help="Only load events recorded at most TIME after the start of the trace")
+argparser.add_argument("--from-tag", dest="tag_begin", type=parse_duration, metavar="TIME",
+                    help="Only load events with a logical time at least TIME after the first tag of the trace")
+argparser.add_argument("--to-tag", dest="tag_end", type=parse_duration, metavar="TIME",
+                    help="Only load events with a logical time at most TIME after the first tag of the trace")
+argparser.add_argument("--filter-on-load", action='store_true',
+                    help="Apply -i/-x while parsing, so that the events of excluded reactions are never stored (the cached trace is then specific to the regex)")
+argparser.add_argument("--port", type=int, default=5006,
+                    help="Port of the Bokeh server (serve mode and --rasterize)")
+argparser.add_argument("--format", choices=["text", "json", "csv", "perfetto", "chrome-json"],
+                    help="Format of the statistics table (stats mode, text by default), comparison (diff mode, text or json) or exported trace (export mode, perfetto by default, or chrome-json)")
+argparser.add_argument("--profile", type=str, metavar="FILE",
+                    help="Times each stage of the run (decoding, YAML parsing, colouring, dependency discovery, rendering, ...) with its throughput and peak memory, and writes the report to FILE as JSON")
+argparser.add_argument("--profile-memory", action='store_true',
+                    help="With --profile, also records the peak Python memory of each stage with tracemalloc (slows the run down)")
+argparser.add_argument("--profile-sample", type=float, metavar="MS",
+                    help="With --profile, samples the Python stack every MS milliseconds and reports the functions the time was spent in")
+argparser.add_argument("-o", "--output", type=str,
+                    help="File to write the statistics table or comparison to, instead of printing it (stats and diff modes), or the exported trace to (export mode)")
 args = argparser.parse_args()
 
+# Formats accepted by each mode (the first one being the default)
+if export_mode:
+    formats = ["perfetto", "chrome-json"]
+elif diff_mode:
+    formats = ["text", "json"]
+else:
+    formats = ["text", "json", "csv"]
+if args.format is None:
+    args.format = formats[0]
+elif args.format not in formats:
+    argparser.error("--format " + args.format + " is not supported in this mode (expected " + ", ".join(formats) + ")")
 
-if not os.path.isdir(args.ctf):
-    raise NotADirectoryError(args.ctf)
 
-ctf_path = None
-for root, dirs, files in os.walk(args.ctf):
-    for f in files:
-        if f == "metadata":
-            if ctf_path is None:
-                ctf_path = str(root)
-            else:
-                raise RuntimeError("%s is not a single trace (contains "
-                                    "more than one metadata file!" %
-                                    args.ctf)
-if ctf_path is None:
-    raise RuntimeError("%s is not a CTF trace (does not contain a metadata"
-                        " file)" % args.ctf)
+def trace_directory(path):
+    '''Directory of the single CTF trace (containing a metadata file) within path'''
+    if not os.path.isdir(path):
+        raise NotADirectoryError(path)
 
+    ctf_path = None
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            if f == "metadata":
+                if ctf_path is None:
+                    ctf_path = str(root)
+                else:
+                    raise RuntimeError("%s is not a single trace (contains "
+                                        "more than one metadata file!" %
+                                        path)
+    if ctf_path is None:
+        raise RuntimeError("%s is not a CTF trace (does not contain a metadata"
+                            " file)" % path)
+    return ctf_path
 
 
+ctf_path = trace_directory(args.ctf)
 
 
-# Do the visualisation
 
-# Include both logic lines and plain view
-if args.plain and args.logic:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, True, True)
-    vis.bokeh_visualisation()
 
-# Include plain view
-elif args.plain:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, True, False)
-    vis.bokeh_visualisation()
 
-# Include logic lines view 
-elif args.logic:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, False, True)
-    vis.bokeh_visualisation()
+# Cache of parsed traces, so that re-rendering the same trace skips decoding
+cache = None if args.no_cache else trace_cache(args.cache_dir)
 
-# Do visualisation with holoviews
-elif args.holoviews:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, False, False)
-    vis.holoviews_visualisation()
+if args.evict_cache is not None:
+    print("Evicted " + str(trace_cache(args.cache_dir).evict(args.evict_cache)) + " cached trace(s)")
 
-# Do visualisation with holoviews, showing the worker view
-elif args.holoviews_worker:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, False, False)
-    vis.holoviews_worker_visualisation()
+# Part of the trace to load (the whole trace if no limits are given)
+window = time_window(args.begin, args.end, args.tag_begin, args.tag_end)
 
-# Normal Visualisation
-else:
-    vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, False, False)
-    vis.bokeh_visualisation()
 
+# Time the stages of the run
+profiler = None
+if args.profile:
+    profiler = stage_profiler(args.profile_memory, args.profile_sample / 1000.0 if args.profile_sample else None)
+    profiler.start()
 
 
+# Do the visualisation
 
-print("\n VISUALISER TOTAL TIME: " + str(time.time() - start_time) + "\n")
\ No newline at end of file
+# Print the execution time statistics of every reaction, or the comparison of two traces
+if stats_mode or diff_mode:
+    if stats_mode:
+        from scripts.latency_stats import latency_stats
+        from scripts.name_filter import name_filter
+        with stage("stats"):
+            stats = latency_stats.load(ctf_path, args.yamlfile, cache, args.jobs, args.native, window)
+            report = stats.report(args.format, name_filter(args.include, args.exclude))
+    else:
+        from scripts.trace_diff import parse_concurrently, trace_summary, trace_diff
+        with stage("diff"):
+            before, after = parse_concurrently([(ctf_path, args.yamlfile), (trace_directory(args.ctf_after), args.yamlfile_after)],
+                                               cache, args.jobs, args.native, window)
+            comparison = trace_diff(trace_summary(before), trace_summary(after))
+            report = comparison.to_json() if args.format == "json" else comparison.report()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+# Convert the trace for Perfetto or the Chrome trace viewer
+elif export_mode:
+    from scripts.trace_export import trace_exporter, FORMATS
+    from scripts.name_filter import name_filter
+    with stage("export") as record:
+        exporter = trace_exporter(ctf_path, args.yamlfile, name_filter(args.include, args.exclude), window, args.native)
+        filename = args.output or exporter.reactor_name + FORMATS[args.format]
+        count = record["events"] = exporter.export(filename, args.format)
+    print("Exported " + str(count) + " executions to " + filename)
+
+else:
+    # Imported only when a view is rendered, as it loads Bokeh (the other modes only use the plotting-free modules of scripts/)
+    import visualiser
+    with stage("visualisers"):
+        vis = visualiser.visualisers(ctf_path, args.yamlfile, args.include, args.exclude, args.plain, args.logic, cache, args.jobs, args.native, window,
+                                     args.filter_on_load)
+
+    # Print the lateness of the executions after their tags
+    if args.lateness is not None:
+        with stage("lateness"):
+            print(vis.lateness(args.lateness_alignment).report(vis.ordered_exe_events.categories.names, args.lateness))
+
+    # Serve the trace with a Bokeh server (not profiled, as it runs until it is interrupted)
+    if serve_mode:
+        from scripts.server import trace_server
+        trace_server(vis).serve(args.port)
+
+    # Static HTML file loading the events from chunk files
+    elif args.chunked:
+        from scripts.chunked_html import chunked_html
+        with stage("chunked_html"):
+            chunked_html(vis).save()
+
+    # Include the plain view and/or logic lines view
+    elif args.plain or args.logic:
+        with stage("bokeh"):
+            vis.bokeh_visualisation(args.utilization, args.critical_path)
+
+    # Do visualisation with holoviews
+    elif args.holoviews:
+        with stage("holoviews"):
+            vis.holoviews_visualisation(args.rasterize, args.port)
+
+    # Do visualisation with holoviews, showing the worker view
+    elif args.holoviews_worker:
+        with stage("holoviews_worker"):
+            vis.holoviews_worker_visualisation(args.rasterize, args.port)
+
+    # Normal Visualisation
+    else:
+        with stage("bokeh"):
+            vis.bokeh_visualisation(args.utilization, args.critical_path)
+
+
+# Write the profile (the summary goes to stderr, so that reports printed to stdout stay machine-readable)
+if profiler is not None:
+    profiler.stop()
+    profiler.save(args.profile)
+    print(profiler.summary(), file=sys.stderr)
+
+
+# (not printed with the statistics and comparisons, which may be printed as JSON or CSV)
+if not stats_mode and not diff_mode:
+    print("\n VISUALISER TOTAL TIME: " + str(time.time() - start_time) + "\n")
\ No newline at end of file
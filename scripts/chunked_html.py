@@ -0,0 +1,270 @@
+#!/usr/bin/python
+
+import json
+import os
+
+from bokeh.io import output_file, save
+from bokeh.models import ColumnDataSource, CustomJS, CustomJSTransform, HoverTool, Panel, Tabs, PrintfTickFormatter, Range1d
+from bokeh.plotting import figure
+from bokeh.transform import transform
+import numpy as np
+
+
+# Average number of events per chunk file (the chunk width is the length of the trace divided by the number of chunks)
+CHUNK_EVENTS = 20000
+
+# Number of chunks embedded in the page, covering the range shown when it is opened
+INITIAL_CHUNKS = 2
+
+# Chunks are loaded up to LOAD_MARGIN visible widths beyond each side of the x-range, and dropped beyond KEEP_MARGIN widths
+LOAD_MARGIN = 0.5
+KEEP_MARGIN = 2.0
+
+# Columns written for each event table
+EXE_COLUMNS = ["name_id", "tag", "time_start", "time_end", "y_axis", "worker", "logical_time", "microstep"]
+INSTANT_COLUMNS = ["name_id", "tag", "logical_time", "y_axis", "microstep"]
+
+
+# Runs on every change of the x-range. Chunk files are scripts calling window.trace_chunk(table, chunk, columns), so that they
+# can be loaded from a page opened from disk (where browsers block fetch and XMLHttpRequest). The loaded chunks of a table are
+# concatenated into its data source once none of them is pending, so that the events on screen do not flicker while loading
+LOAD_CHUNKS = """
+// The chunks embedded in the page are loaded already: their rows are at the start of the data sources, in the order of
+// initial[table].chunks, with initial[table].counts rows each
+if (!window.trace_chunks) {
+    const loaded = {};
+    for (const table of Object.keys(sources)) {
+        let offset = 0;
+        initial[table].chunks.forEach((chunk, i) => {
+            const count = initial[table].counts[i];
+            const columns = {};
+            for (const column of Object.keys(sources[table].data)) {
+                columns[column] = Array.from(sources[table].data[column].slice(offset, offset + count));
+            }
+            loaded[table + "_" + chunk] = columns;
+            offset += count;
+        });
+    }
+    window.trace_chunks = {loaded: loaded, pending: {}};
+}
+const state = window.trace_chunks;
+const span = x_range.end - x_range.start;
+const of_table = (table, key) => key.startsWith(table + "_");
+
+// Chunks of a table overlapping the x-range widened by margin visible widths on each side
+const chunks_in_range = (table, margin) => {
+    const {chunks, starts, ends} = index[table];
+    const begin = x_range.start - margin * span;
+    const end = x_range.end + margin * span;
+    return chunks.filter((chunk, i) => starts[i] <= end && ends[i] >= begin).map((chunk) => table + "_" + chunk);
+};
+
+const rebuild = (table) => {
+    const parts = Object.keys(state.loaded).filter((key) => of_table(table, key)).map((key) => state.loaded[key]);
+    const data = {};
+    for (const column of Object.keys(sources[table].data)) {
+        data[column] = [].concat(...parts.map((part) => part[column]));
+    }
+    sources[table].data = data;
+};
+
+const pending = (table) => Object.keys(state.pending).some((key) => of_table(table, key));
+
+window.trace_chunk = (table, chunk, columns) => {
+    const key = table + "_" + chunk;
+    if (!(key in state.pending)) {
+        return;
+    }
+    delete state.pending[key];
+    state.loaded[key] = columns;
+    if (!pending(table)) {
+        rebuild(table);
+    }
+};
+
+for (const table of Object.keys(sources)) {
+    // Drop the chunks (and forget the pending ones) far off-screen
+    const keep = new Set(chunks_in_range(table, keep_margin));
+    let dropped = false;
+    for (const key of Object.keys(state.loaded).filter((key) => of_table(table, key) && !keep.has(key))) {
+        delete state.loaded[key];
+        dropped = true;
+    }
+    for (const key of Object.keys(state.pending).filter((key) => of_table(table, key) && !keep.has(key))) {
+        delete state.pending[key];
+    }
+
+    for (const key of chunks_in_range(table, load_margin)) {
+        if (key in state.loaded || key in state.pending) {
+            continue;
+        }
+        state.pending[key] = true;
+        const script = document.createElement("script");
+        script.src = directory + "/" + key + ".js";
+        script.onload = () => script.remove();
+        script.onerror = () => {
+            delete state.pending[key];
+            script.remove();
+        };
+        document.head.appendChild(script);
+    }
+
+    if (dropped && !pending(table)) {
+        rebuild(table);
+    }
+}
+"""
+
+
+
+class chunked_html:
+    '''Static HTML page of a parsed trace (a visualisers instance) which does not embed the events: the event tables are split into
+    chunks of a fixed x-width, written as script files in a directory next to the page. The page loads the chunks overlapping the
+    visible x-range (and a margin around it) when the range changes, and drops the chunks far off-screen, so it can be opened
+    from disk without a server whatever the size of the trace. Only the chunks shown when the page is opened are embedded.'''
+
+    def __init__(self, vis, chunk_events=CHUNK_EVENTS):
+        self.vis = vis
+
+        # Event tables: (columns, x-values of the start and end of every event)
+        exe = vis.ordered_exe_events.as_dict(EXE_COLUMNS)
+        reactions = vis.ordered_inst_events_reactions.as_dict(INSTANT_COLUMNS)
+        actions = vis.ordered_inst_events_actions.as_dict(INSTANT_COLUMNS)
+        self.tables = {"exe": (exe, exe["time_start"], exe["time_end"]),
+                       "reaction": (reactions, reactions["logical_time"], reactions["logical_time"]),
+                       "action": (actions, actions["logical_time"], actions["logical_time"])}
+
+        # Chunk grid of every table: (origin, chunk width), from the x-values of the table (the tables do not share a grid, as the
+        # executions are placed by physical time and the reactions and actions by logical time)
+        self.grids = {table: self.grid(np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), chunk_events)
+                      for table, (columns, starts, ends) in self.tables.items()}
+
+    def grid(self, starts, ends, chunk_events):
+        '''Origin and width of the chunks of a table, whose events are split into chunks of chunk_events events on average'''
+        if not len(starts):
+            return 0.0, 1.0
+        origin = float(starts.min())
+        chunk_count = max(1, -(-len(starts) // chunk_events))
+        return origin, max(float(ends.max()) - origin, 1e-9) / chunk_count
+
+    def save(self, filename=None):
+        '''Writes the page (graph_name_chunked.html by default) and its chunk directory, returning the path of the page'''
+        filename = filename or self.vis.graph_name + "_chunked.html"
+        directory = os.path.splitext(filename)[0] + "_chunks"
+        os.makedirs(directory, exist_ok=True)
+        for f in os.listdir(directory):
+            if f.endswith(".js"):
+                os.remove(os.path.join(directory, f))
+
+        # The page opens on the first INITIAL_CHUNKS chunks of the executions
+        exe_origin, exe_width = self.grids["exe"]
+        exe_starts, exe_ends = (np.asarray(values, dtype=np.float64) for values in self.tables["exe"][1:])
+        initial_start = exe_origin
+        initial_end = min(exe_origin + INITIAL_CHUNKS * exe_width, float(exe_ends.max())) if len(exe_ends) else exe_origin + exe_width
+
+        # Write the chunks of every table and index them by x-range, and embed the chunks of every table overlapping the initial range
+        index = {}
+        initial = {}
+        sources = {}
+        for table, (columns, starts, ends) in self.tables.items():
+            index[table], chunk_rows = self.write_chunks(directory, table, columns, np.asarray(starts, dtype=np.float64),
+                                                         np.asarray(ends, dtype=np.float64))
+            embedded = [i for i, (start, end) in enumerate(zip(index[table]["starts"], index[table]["ends"]))
+                        if start < initial_end and end >= initial_start]
+            initial[table] = {"chunks": [index[table]["chunks"][i] for i in embedded], "counts": [len(chunk_rows[i]) for i in embedded]}
+            rows = np.concatenate([chunk_rows[i] for i in embedded]) if embedded else np.zeros(0, dtype=np.int64)
+            sources[table] = ColumnDataSource({column: values[rows] for column, values in columns.items()})
+
+        # All views share the x-range, whose changes load the chunks
+        x_range = Range1d(initial_start, initial_end)
+        load_chunks = CustomJS(args={"x_range": x_range, "sources": sources, "index": index, "initial": initial,
+                                     "directory": os.path.basename(directory), "load_margin": LOAD_MARGIN, "keep_margin": KEEP_MARGIN},
+                               code=LOAD_CHUNKS)
+        x_range.js_on_change("start", load_chunks)
+        x_range.js_on_change("end", load_chunks)
+
+        output_file(filename, title=self.vis.graph_name)
+        save(Tabs(tabs=[Panel(child=self.reactions_plot(x_range, sources), title="reactions"),
+                        Panel(child=self.workers_plot(x_range, sources), title="workers")]))
+        print("Wrote " + filename + " and its chunks to " + directory)
+        return filename
+
+    def write_chunks(self, directory, table, columns, starts, ends):
+        '''Writes the rows of a table in chunk files by start time (on the grid of the table). Returns the index {"chunks", "starts",
+        "ends"} of the non-empty chunks (ends being the latest end of the events of each chunk), and the rows of each of them'''
+        origin, width = self.grids[table]
+        chunks = np.clip(np.floor((starts - origin) / width).astype(np.int64), 0, None)
+        order = np.argsort(chunks, kind="stable")
+        chunks = chunks[order]
+        firsts = np.flatnonzero(np.concatenate(([True], chunks[1:] != chunks[:-1]))) if len(chunks) else chunks
+        bounds = np.append(firsts, len(chunks))
+
+        index = {"chunks": [], "starts": [], "ends": []}
+        chunk_rows = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            rows = order[first:last]
+            chunk = int(chunks[first])
+            data = {column: values[rows].tolist() for column, values in columns.items()}
+            with open(os.path.join(directory, table + "_" + str(chunk) + ".js"), "w") as f:
+                f.write("trace_chunk(" + json.dumps(table) + "," + str(chunk) + "," + json.dumps(data, separators=(",", ":")) + ");\n")
+            index["chunks"].append(chunk)
+            index["starts"].append(origin + chunk * width)
+            index["ends"].append(float(ends[rows].max()))
+            chunk_rows.append(rows)
+        return index, chunk_rows
+
+    def reactions_plot(self, x_range, sources):
+        '''Executions, reactions and actions by reaction'''
+        plot = figure(sizing_mode="stretch_both", title=self.vis.graph_name, x_range=x_range, y_range=(-1, len(self.vis.labels)))
+        colours = self.vis.tag_colours()
+        metadata = {"@name_id": self.vis.metadata_hover()}
+
+        # Middle point of every execution, between its start and end time
+        exe_midpoint = CustomJSTransform(args={"source": sources["exe"]},
+                                         v_func="const ends = source.data.time_end; return xs.map((start, i) => (start + ends[i]) / 2)")
+
+        executions = plot.segment(x0="time_start", y0="y_axis", x1="time_end", y1="y_axis", width=8, color=colours, hover_alpha=0.5,
+                                  source=sources["exe"], legend_label="Execution Events", muted_alpha=0.2)
+        plot.diamond(x=transform("time_start", exe_midpoint), y="y_axis", color=colours, size=7, source=sources["exe"],
+                     legend_label="Execution Event Markers", muted_alpha=0.2)
+        reactions = plot.hex(x="logical_time", y="y_axis", fill_color=colours, line_color="lightgrey", size=10, source=sources["reaction"],
+                             legend_label="Reactions", muted_alpha=0.2)
+        actions = plot.inverted_triangle(x="logical_time", y="y_axis", fill_color=colours, line_color="lightgrey", size=10,
+                                         source=sources["action"], legend_label="Actions", muted_alpha=0.2)
+
+        plot.add_tools(HoverTool(tooltips=[("name", "@name_id{name}"), ("time_start", "@time_start{0,0.00}"), ("time_end", "@time_end{0,0.00}"),
+                                           ("priority", "@name_id{priority}"), ("level", "@name_id{level}"), ("logical_time", "@logical_time"),
+                                           ("microstep", "@microstep")], renderers=[executions], formatters=metadata),
+                       HoverTool(tooltips=[("name", "@name_id{name}"), ("time_start", "@logical_time{0,0.00}"), ("priority", "@name_id{priority}"),
+                                           ("level", "@name_id{level}"), ("logical_time", "@logical_time"), ("microstep", "@microstep")],
+                                 renderers=[reactions], formatters=metadata),
+                       HoverTool(tooltips=[("name", "@name_id{name}"), ("time_start", "@logical_time{0,0.00}"), ("trace_event_type", "@name_id{type}"),
+                                           ("logical_time", "@logical_time"), ("microstep", "@microstep")], renderers=[actions], formatters=metadata))
+
+        plot.yaxis.ticker = list(range(len(self.vis.labels)))
+        plot.yaxis.major_label_overrides = {k: v.split(".", 1)[1] for k, v in self.vis.number_labels.items()}
+        plot.yaxis.axis_label = "Reaction Name"
+        return self.finish(plot)
+
+    def workers_plot(self, x_range, sources):
+        '''Executions by worker'''
+        worker_count = int(self.tables["exe"][0]["worker"].max()) + 1 if len(self.tables["exe"][0]["worker"]) else 1
+        plot = figure(sizing_mode="stretch_both", title=self.vis.graph_name, x_range=x_range, y_range=(-1, worker_count))
+        workers = plot.segment(x0="time_start", y0="worker", x1="time_end", y1="worker", width=8, color=self.vis.tag_colours(), hover_alpha=0.5,
+                               source=sources["exe"], legend_label="Execution Events", muted_alpha=0.2)
+        plot.add_tools(HoverTool(tooltips=[("name", "@name_id{name}"), ("time_start", "@time_start{0,0.00}"), ("time_end", "@time_end{0,0.00}"),
+                                           ("logical_time", "@logical_time"), ("microstep", "@microstep")], renderers=[workers],
+                                 formatters={"@name_id": self.vis.metadata_hover()}))
+
+        plot.yaxis.ticker = list(range(worker_count))
+        plot.yaxis.major_label_overrides = {i: "Worker " + str(i) for i in range(worker_count)}
+        plot.yaxis.axis_label = "Worker"
+        return self.finish(plot)
+
+    def finish(self, plot):
+        '''Options shared by the plots'''
+        plot.legend.location = "top_left"
+        plot.legend.click_policy = "mute"
+        plot.xaxis[0].formatter = PrintfTickFormatter(format="%f")
+        plot.xaxis.axis_label = "Time (ms)"
+        return plot
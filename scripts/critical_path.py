@@ -0,0 +1,109 @@
+#!/usr/bin/python
+
+import numpy as np
+
+from scripts.dependencies import dependency_pairs
+
+
+# Number of reactions and tags listed in the report
+REPORT_ROWS = 20
+
+
+
+class critical_path:
+    '''Critical path of every tag: the chain of executions at that tag, linked by reaction dependencies (see dependency_pairs),
+    with the largest total execution time.
+
+    The dependency pairs (i, j) of the execution table always have i < j, so the table order is a topological order of each
+    tag's DAG. The longest paths are found by relaxing all pairs at once until no length changes, which takes as many vectorized
+    passes as the longest chain has links (the depth of the reaction graph) rather than one Python step per execution.'''
+
+    def __init__(self, exe_table, tags, edges):
+        self.name_ids = np.asarray(exe_table["name_id"])
+        self.exe_tags = np.asarray(exe_table["tag"])
+        self.durations = np.asarray(exe_table["end_ns"], dtype=np.int64) - np.asarray(exe_table["start_ns"], dtype=np.int64)
+        self.tags = tags
+        self.sources, self.targets = dependency_pairs(exe_table["name_id"], exe_table["logical_time"], exe_table["microstep"], edges)
+
+        # Length of the longest chain ending with each execution (including it)
+        self.lengths = self.durations.copy()
+        while True:
+            longest = self.lengths.copy()
+            np.maximum.at(longest, self.targets, self.lengths[self.sources] + self.durations[self.targets])
+            if np.array_equal(longest, self.lengths):
+                break
+            self.lengths = longest
+
+        # Predecessor of each execution on its longest chain (-1 if the chain starts with it): the source with the longest chain
+        # among the pairs of each target
+        self.predecessors = np.full(len(self.lengths), -1, dtype=np.int64)
+        on_chain = self.lengths[self.sources] + self.durations[self.targets] == self.lengths[self.targets]
+        self.predecessors[self.targets[on_chain]] = self.sources[on_chain]
+
+        # Last execution of the critical path of each tag (-1 for tags without executions)
+        order = np.lexsort((self.lengths, self.exe_tags))
+        last_of_tag = np.flatnonzero(np.append(self.exe_tags[order][1:] != self.exe_tags[order][:-1], True)) if len(order) else order
+        self.path_ends = np.full(len(tags), -1, dtype=np.int64)
+        self.path_ends[self.exe_tags[order[last_of_tag]]] = order[last_of_tag]
+        self.path_lengths = np.where(self.path_ends >= 0, self.lengths[self.path_ends], 0) if len(self.lengths) else np.zeros(len(tags), dtype=np.int64)
+
+        # Executions on the critical paths, found by following the predecessors of all tags at once
+        self.on_path = np.zeros(len(self.lengths), dtype=np.bool_)
+        current = self.path_ends[self.path_ends >= 0]
+        while len(current):
+            self.on_path[current] = True
+            current = self.predecessors[current]
+            current = current[current >= 0]
+
+    def spans(self):
+        '''Wall-clock span (ns) of the executions of each tag, from the first start to the last end'''
+        return np.where(self.tags.execution_count > 0, self.tags.last_end_ns - self.tags.first_start_ns, 0)
+
+    def critical_edges(self):
+        '''Pairs of rows (i, j) linking consecutive executions of the critical paths'''
+        targets = np.flatnonzero(self.on_path & (self.predecessors >= 0))
+        return self.predecessors[targets], targets
+
+    def tag_table(self):
+        '''Per-tag summary {column : values} of the tags with executions, with times in ms'''
+        started = np.flatnonzero(self.tags.execution_count > 0)
+        spans = self.spans()[started]
+        path_executions = np.bincount(self.exe_tags[self.on_path], minlength=len(self.tags))[started]
+        return {"tag": started, "logical_time": self.tags.logical_time[started], "microstep": self.tags.microstep[started],
+                "executions": self.tags.execution_count[started], "path_executions": path_executions,
+                "path_ms": self.path_lengths[started] / 1e6, "span_ms": spans / 1e6,
+                "path_share": self.path_lengths[started] / np.maximum(spans, 1)}
+
+    def reaction_table(self, names):
+        '''Per-reaction summary {column : values} of the reactions on at least one critical path, sorted by the number of tags
+        whose critical path they are on'''
+        name_count = len(names)
+        # Tags whose critical path includes each reaction (a reaction can appear at most once per tag, but is counted once anyway)
+        pairs = np.unique(self.exe_tags[self.on_path].astype(np.int64) * name_count + self.name_ids[self.on_path])
+        tag_counts = np.bincount(pairs % name_count, minlength=name_count)
+        time_on_path = np.bincount(self.name_ids[self.on_path], weights=self.durations[self.on_path], minlength=name_count)
+        executions = np.bincount(self.name_ids, minlength=name_count)
+
+        order = np.lexsort((-time_on_path, -tag_counts))
+        order = order[tag_counts[order] > 0]
+        return {"name": [names[i] for i in order], "critical_tags": tag_counts[order], "executions": executions[order],
+                "path_ms": time_on_path[order] / 1e6}
+
+    def report(self, names):
+        '''Text report of the reactions most often on the critical paths and of the tags with the longest critical paths'''
+        tags = self.tag_table()
+        tag_count = max(len(tags["tag"]), 1)
+        lines = ["Critical paths of " + str(len(tags["tag"])) + " tags: " + format(float(np.sum(tags["path_ms"])), ".3f") + " ms of executions, " +
+                 format(float(np.mean(tags["path_share"])) if len(tags["tag"]) else 0.0, ".1%") + " of the span of a tag on average", ""]
+
+        reactions = self.reaction_table(names)
+        lines.append("%-60s %15s %10s %12s" % ("reaction", "critical tags", "executions", "on path (ms)"))
+        for name, critical_tags, executions, path_ms in list(zip(*reactions.values()))[:REPORT_ROWS]:
+            lines.append("%-60s %6d (%5.1f%%) %10d %12.3f" % (name, critical_tags, 100 * critical_tags / tag_count, executions, path_ms))
+
+        lines.append("")
+        lines.append("%14s %10s %10s %12s %12s %8s" % ("logical time", "microstep", "executions", "path (ms)", "span (ms)", "share"))
+        for row in np.argsort(-tags["path_ms"], kind="stable")[:REPORT_ROWS]:
+            lines.append("%14d %10d %10d %12.3f %12.3f %7.1f%%" % (tags["logical_time"][row], tags["microstep"][row], tags["executions"][row],
+                                                                  tags["path_ms"][row], tags["span_ms"][row], 100 * tags["path_share"][row]))
+        return "\n".join(lines)
@@ -0,0 +1,1296 @@
+#!/usr/bin/python
+
+# Decoder for the CTF traces written by LTTng for reactor_cpp programs, which reads the stream files through mmap instead of
+# the Babeltrace 2 Python bindings (which create Python objects for every message and field access).
+#
+# The TSDL metadata is parsed once, and the layouts of the event headers, event contexts and event payloads of each stream class
+# are turned into NumPy readers (see bulk_decoder). The packets of a stream file are decoded in batches: the next event of every
+# packet of a batch is decoded at once, reading the fixed-size fields as structured records, and only the fields of the
+# consumed reactor_cpp events are kept. Layouts (and data) which are not supported raise unsupported_layout, so that the caller
+# can fall back to Babeltrace.
+
+import array
+import mmap
+import os
+import re
+import struct
+
+import numpy as np
+
+from scripts.parallel_decode import START_SCHEMA, FINISH_SCHEMA, INST_SCHEMA, stream_files, muxer_ranks
+from scripts.time_window import NO_BEGIN, within_limits
+
+
+# Magic numbers of the packet header, of packetized metadata and of packet index files
+PACKET_MAGIC = 0xC1FC1FC1
+METADATA_MAGIC = 0x75D11D57
+INDEX_MAGIC = 0xC1F1DCC1
+
+# Size of the header of a metadata packet (in bytes)
+METADATA_HEADER_SIZE = 37
+
+# Fields of the consumed events, as named by Babeltrace (without the leading underscore of the metadata)
+CONSUMED_EVENTS = {"reactor_cpp:reaction_execution_starts": ["reaction_name", "timestamp_ns", "timestamp_microstep", "worker_id"],
+                   "reactor_cpp:reaction_execution_finishes": ["reaction_name", "timestamp_ns", "timestamp_microstep"],
+                   "reactor_cpp:schedule_action": ["reactor_name", "action_name", "timestamp_ns", "timestamp_microstep"],
+                   "reactor_cpp:trigger_reaction": ["reactor_name", "reaction_name", "timestamp_ns", "timestamp_microstep"]}
+
+
+
+class unsupported_layout(Exception):
+    '''Raised for traces whose metadata or layout is not supported by this decoder'''
+
+
+
+# -------------------------------------------------------------------
+# Metadata
+
+def read_metadata_text(ctf_path):
+    '''Reads the TSDL metadata of a trace, which is either plain text or split into metadata packets'''
+    with open(os.path.join(ctf_path, "metadata"), "rb") as f:
+        data = f.read()
+
+    for byte_order in ("<", ">"):
+        if len(data) >= 4 and struct.unpack_from(byte_order + "I", data)[0] == METADATA_MAGIC:
+            text = []
+            offset = 0
+            while offset + METADATA_HEADER_SIZE <= len(data):
+                # magic, uuid, checksum, content_size, packet_size, compression_scheme, encryption_scheme, checksum_scheme, major, minor
+                magic, content_size, packet_size, compression, encryption = struct.unpack_from(byte_order + "I20xIIBB", data, offset)
+                if magic != METADATA_MAGIC:
+                    raise unsupported_layout("invalid metadata packet")
+                if compression or encryption:
+                    raise unsupported_layout("compressed or encrypted metadata")
+                text.append(data[offset + METADATA_HEADER_SIZE:offset + content_size // 8])
+                offset += packet_size // 8
+            return b"".join(text).decode("utf-8")
+
+    return data.decode("utf-8")
+
+
+TOKEN_PATTERN = re.compile(r'''\s+|/\*.*?\*/|//[^\n]*|(?P<string>"(?:\\.|[^"\\])*")|(?P<number>-?(?:0[xX][0-9a-fA-F]+|[0-9]+))[uUlL]*'''
+                           r'''|(?P<ident>[A-Za-z_][A-Za-z0-9_]*)|(?P<punct>:=|\.\.\.|[{}\[\]();=<>:,.+*-])''', re.S)
+
+TYPE_KEYWORDS = ("integer", "floating_point", "string", "struct", "variant", "enum")
+
+
+def tokenize(text):
+    '''Splits TSDL text into tokens ("string", "number", "ident" or "punct", value)'''
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if match is None:
+            raise unsupported_layout("cannot parse metadata near: " + text[pos:pos + 40])
+        pos = match.end()
+        if match.lastgroup == "number":
+            tokens.append(("number", int(match.group("number"), 0)))
+        elif match.lastgroup is not None:
+            tokens.append((match.lastgroup, match.group(match.lastgroup)))
+    return tokens
+
+
+
+class tsdl_metadata:
+    '''Trace, clock, stream and event classes parsed from TSDL metadata. Types are dictionaries with a "kind" key'''
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.pos = 0
+
+        # Named types {name : type}
+        self.aliases = {}
+        self.structs = {}
+        self.variants = {}
+        self.enums = {}
+
+        self.byte_order = "<"
+        self.packet_header = None
+        self.clocks = {}
+        self.streams = {}
+        self.events = {}
+
+        while self.pos < len(self.tokens):
+            self.parse_statement()
+
+    # Token helpers
+    def peek(self, offset=0):
+        if self.pos + offset < len(self.tokens):
+            return self.tokens[self.pos + offset][1]
+        return None
+
+    def next(self):
+        if self.pos >= len(self.tokens):
+            raise unsupported_layout("unexpected end of metadata")
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def expect(self, value):
+        token = self.next()
+        if token != value:
+            raise unsupported_layout("expected " + str(value) + " in metadata, found " + str(token))
+
+    def parse_statement(self):
+        keyword = self.peek()
+        if keyword == "typealias":
+            self.parse_typealias()
+        elif keyword == "typedef":
+            self.next()
+            declared = self.parse_declaration()
+            self.aliases[declared[0]] = declared[1]
+            self.expect(";")
+        elif keyword in ("trace", "env", "clock", "stream", "event", "callsite"):
+            self.next()
+            block = self.parse_block()
+            self.expect(";")
+            self.add_block(keyword, block)
+        elif keyword in ("struct", "variant", "enum"):
+            self.parse_type()
+            self.expect(";")
+        else:
+            raise unsupported_layout("unknown metadata statement " + str(keyword))
+
+    def parse_typealias(self):
+        self.expect("typealias")
+        declared_type = self.parse_type()
+        self.expect(":=")
+        name = []
+        while self.peek() != ";":
+            name.append(str(self.next()))
+        self.expect(";")
+        self.aliases[" ".join(name)] = declared_type
+
+    def parse_block(self):
+        '''Parses { key = value; key := type; ... } into a dictionary'''
+        self.expect("{")
+        block = {}
+        while self.peek() != "}":
+            if self.peek() == "typealias":
+                self.parse_typealias()
+                continue
+            key = [str(self.next())]
+            while self.peek() == ".":
+                self.next()
+                key.append(str(self.next()))
+            key = ".".join(key)
+            assign = self.next()
+            if assign == ":=":
+                block[key] = self.parse_type()
+            elif assign == "=":
+                value = []
+                while self.peek() != ";":
+                    value.append(self.tokens[self.pos])
+                    self.pos += 1
+                if len(value) == 1:
+                    kind, token = value[0]
+                    block[key] = token[1:-1] if kind == "string" else token
+                else:
+                    block[key] = "".join(str(token) for kind, token in value)
+            else:
+                raise unsupported_layout("expected = or := in metadata block")
+            self.expect(";")
+        self.expect("}")
+        return block
+
+    def parse_type(self):
+        '''Parses a type specifier'''
+        keyword = self.next()
+
+        if keyword == "integer":
+            attributes = self.parse_block()
+            size = int(attributes["size"])
+            byte_order = attributes.get("byte_order", "native")
+            clock = str(attributes.get("map", ""))
+            return {"kind": "integer", "size": size,
+                    "align": int(attributes.get("align", 8 if size % 8 == 0 else 1)),
+                    "signed": str(attributes.get("signed", "false")).lower() in ("true", "1"),
+                    "byte_order": {"le": "<", "be": ">", "network": ">"}.get(str(byte_order)),
+                    "clock": clock.split(".")[1] if clock.startswith("clock.") else None}
+
+        if keyword == "floating_point":
+            attributes = self.parse_block()
+            size = int(attributes["exp_dig"]) + int(attributes["mant_dig"])
+            return {"kind": "float", "size": size, "align": int(attributes.get("align", 8)),
+                    "byte_order": {"le": "<", "be": ">", "network": ">"}.get(str(attributes.get("byte_order", "native")))}
+
+        if keyword == "string":
+            if self.peek() == "{":
+                self.parse_block()
+            return {"kind": "string"}
+
+        if keyword == "struct":
+            name = self.next() if self.peek() != "{" else None
+            if self.peek() != "{":
+                if name not in self.structs:
+                    raise unsupported_layout("unknown struct " + str(name))
+                return self.structs[name]
+            fields = self.parse_fields()
+            align = 1
+            if self.peek() == "align":
+                self.next()
+                self.expect("(")
+                align = int(self.next())
+                self.expect(")")
+            declared_type = {"kind": "struct", "fields": fields, "align": align}
+            if name is not None:
+                self.structs[name] = declared_type
+            return declared_type
+
+        if keyword == "variant":
+            name = self.next() if self.peek() not in ("{", "<") else None
+            tag = None
+            if self.peek() == "<":
+                self.next()
+                tag = []
+                while self.peek() != ">":
+                    tag.append(str(self.next()))
+                self.next()
+                tag = "".join(tag)
+            if self.peek() != "{":
+                if name not in self.variants:
+                    raise unsupported_layout("unknown variant " + str(name))
+                return dict(self.variants[name], tag=tag)
+            declared_type = {"kind": "variant", "options": self.parse_fields(), "tag": tag}
+            if name is not None:
+                self.variants[name] = declared_type
+            return declared_type
+
+        if keyword == "enum":
+            name = self.next() if self.peek() not in (":", "{") else None
+            if self.peek() not in (":", "{"):
+                if name not in self.enums:
+                    raise unsupported_layout("unknown enum " + str(name))
+                return self.enums[name]
+            container = self.aliases.get("int")
+            if self.peek() == ":":
+                self.next()
+                container = self.parse_type()
+            if container is None or container["kind"] != "integer":
+                raise unsupported_layout("enum without integer container")
+            declared_type = dict(container, kind="enum", mappings=self.parse_enum_mappings())
+            if name is not None:
+                self.enums[name] = declared_type
+            return declared_type
+
+        # Name of a type alias, which can span several identifiers (e.g. unsigned long)
+        name = [str(keyword)]
+        while " ".join(name) not in self.aliases and self.peek() not in (";", ":=", "{", "[", None):
+            name.append(str(self.next()))
+        if " ".join(name) not in self.aliases:
+            raise unsupported_layout("unknown type " + " ".join(name))
+        return self.aliases[" ".join(name)]
+
+    def parse_enum_mappings(self):
+        '''Parses { label = value, label = low ... high, label, ... } into a list of (label, low, high)'''
+        self.expect("{")
+        mappings = []
+        next_value = 0
+        while self.peek() != "}":
+            label = self.next()
+            if isinstance(label, str) and label.startswith('"'):
+                label = label[1:-1]
+            low = high = next_value
+            if self.peek() == "=":
+                self.next()
+                low = high = int(self.next())
+                if self.peek() == "...":
+                    self.next()
+                    high = int(self.next())
+            mappings.append((str(label), low, high))
+            next_value = high + 1
+            if self.peek() == ",":
+                self.next()
+        self.expect("}")
+        return mappings
+
+    def parse_declaration(self):
+        '''Parses "type name[length]..." into (name, type)'''
+        if self.peek() in TYPE_KEYWORDS:
+            declared_type = self.parse_type()
+            name = str(self.next())
+        else:
+            # Alias name followed by the field name: the field name is the last identifier
+            words = [str(self.next())]
+            while self.peek() not in (";", "[", ",", None):
+                words.append(str(self.next()))
+            name = words.pop()
+            if " ".join(words) not in self.aliases:
+                raise unsupported_layout("unknown type " + " ".join(words))
+            declared_type = self.aliases[" ".join(words)]
+
+        lengths = []
+        while self.peek() == "[":
+            self.next()
+            length = []
+            while self.peek() != "]":
+                length.append(self.next())
+            self.next()
+            lengths.append(length[0] if len(length) == 1 and isinstance(length[0], int) else "".join(str(token) for token in length))
+
+        # The first dimension is the outermost
+        for length in reversed(lengths):
+            if isinstance(length, int):
+                declared_type = {"kind": "array", "element": declared_type, "length": length}
+            else:
+                declared_type = {"kind": "sequence", "element": declared_type, "length": length}
+        return name, declared_type
+
+    def parse_fields(self):
+        '''Parses { declaration; ... } into a list of (name, type)'''
+        self.expect("{")
+        fields = []
+        while self.peek() != "}":
+            if self.peek() == "typealias":
+                self.parse_typealias()
+                continue
+            fields.append(self.parse_declaration())
+            self.expect(";")
+        self.expect("}")
+        return fields
+
+    def add_block(self, keyword, block):
+        if keyword == "trace":
+            self.byte_order = {"le": "<", "be": ">", "network": ">"}.get(str(block.get("byte_order", "le")), "<")
+            self.packet_header = block.get("packet.header")
+
+        elif keyword == "clock":
+            self.clocks[str(block["name"])] = {"freq": int(block.get("freq", 1000000000)), "offset_s": int(block.get("offset_s", 0)),
+                                               "offset": int(block.get("offset", 0))}
+
+        elif keyword == "stream":
+            self.streams[int(block.get("id", 0))] = {"event.header": block.get("event.header"), "packet.context": block.get("packet.context"),
+                                                     "event.context": block.get("event.context")}
+
+        elif keyword == "event":
+            stream_id = int(block.get("stream_id", 0))
+            self.events[(stream_id, int(block.get("id", 0)))] = {"name": str(block["name"]), "context": block.get("context"),
+                                                                 "fields": block.get("fields")}
+
+
+
+# -------------------------------------------------------------------
+# Layouts
+
+def alignment(declared_type):
+    '''Alignment of a type (in bits)'''
+    kind = declared_type["kind"]
+    if kind in ("integer", "enum", "float"):
+        return declared_type["align"]
+    if kind == "string":
+        return 8
+    if kind == "struct":
+        return max([declared_type["align"]] + [alignment(field_type) for name, field_type in declared_type["fields"]])
+    if kind in ("array", "sequence"):
+        return alignment(declared_type["element"])
+    return 1
+
+
+def fixed_size(declared_type):
+    '''Size of a type (in bits) if it does not depend on the data and needs no padding between array elements, else None'''
+    kind = declared_type["kind"]
+    if kind in ("integer", "enum", "float"):
+        if declared_type["size"] % declared_type["align"] == 0:
+            return declared_type["size"]
+    return None
+
+
+def byte_aligned(declared_type):
+    '''Whether a type is a byte-aligned integer or floating point number which can be read with a single load'''
+    return declared_type["kind"] in ("integer", "enum", "float") and declared_type["size"] in (8, 16, 32, 64) \
+        and declared_type["align"] % 8 == 0 and (declared_type["kind"] != "float" or declared_type["size"] >= 32)
+
+
+def bare_name(name):
+    '''Field name as seen by Babeltrace (the leading underscore is removed)'''
+    return name[1:] if name.startswith("_") else name
+
+def packet_fields(declared_type, byte_order, begin):
+    '''Decoder of the top level integer fields of a packet header or context starting at bit begin of a packet (packets start
+    on 8 bytes). Returns (struct.Struct, names of the fields it returns, bit position after the fields). Only byte-aligned
+    integers and arrays of them are supported, which is what LTTng writes there'''
+    fmt = byte_order
+    names = []
+    pos = begin
+    if declared_type is not None:
+        padding = -pos % alignment(declared_type)
+        fmt += "%dx" % (padding // 8)
+        pos += padding
+        for name, field_type in declared_type["fields"]:
+            element = field_type["element"] if field_type["kind"] == "array" else field_type
+            if not byte_aligned(element) or element["kind"] == "float" or (element["byte_order"] or byte_order) != byte_order:
+                raise unsupported_layout("packet field " + bare_name(name))
+            padding = -pos % alignment(field_type)
+            if field_type["kind"] == "array":
+                size = field_type["length"] * element["size"]
+                fmt += "%dx" % ((padding + size) // 8)
+            else:
+                size = element["size"]
+                code = {8: "b", 16: "h", 32: "i", 64: "q"}[size]
+                fmt += "%dx%s" % (padding // 8, code if element["signed"] else code.upper())
+                names.append(bare_name(name))
+            pos += padding + size
+    return struct.Struct(fmt), names, pos
+
+
+
+# -------------------------------------------------------------------
+# Bulk decoding
+
+# Largest span of a stream file decoded in one batch (in bytes)
+BATCH_BYTES = 1 << 26
+
+# Zero bytes added after the data of a batch, so that fields are read with fixed-width loads (8 bytes at most) up to its end
+BATCH_PADDING = 16
+
+# Longest string decoded in bulk (the strings of a batch are compared as fixed-width byte strings of the longest one)
+MAX_BULK_STRING = 1024
+
+
+def gather(buf, byte_positions, dtype):
+    '''Values of the given dtype stored at the byte positions of buf (read through a view of buf with a value at every byte)'''
+    dtype = np.dtype(dtype)
+    values = np.ndarray((len(buf) - dtype.itemsize + 1,), dtype=dtype, buffer=buf, strides=(1,))
+    return values[byte_positions]
+
+
+def string_ends(buf, begins):
+    '''Byte positions of the NUL bytes ending the strings starting at begins, found 8 bytes at a time (the lowest zero byte of
+    a word v being the lowest one flagged in (v - 0x0101...) & ~v & 0x8080...)'''
+    ends = np.zeros(len(begins), dtype=np.int64)
+    rows = np.arange(len(begins))
+    offset = 0
+    while len(rows):
+        if offset > MAX_BULK_STRING:
+            raise unsupported_layout("string of more than %d bytes" % MAX_BULK_STRING)
+        words = gather(buf, np.minimum(begins[rows] + offset, len(buf) - 8), "<u8")
+        zeros = (words - np.uint64(0x0101010101010101)) & ~words & np.uint64(0x8080808080808080)
+        found = zeros != 0
+        lowest = zeros[found] & (~zeros[found] + np.uint64(1))
+        ends[rows[found]] = begins[rows[found]] + offset + (np.log2(lowest.astype(np.float64)).astype(np.int64) >> 3)
+        rows = rows[~found]
+        offset += 8
+    return ends
+
+
+def align_positions(pos, bits):
+    '''Bit positions rounded up to a multiple of bits'''
+    if bits <= 1:
+        return pos
+    return (pos + (bits - 1)) & -bits
+
+
+def byte_strings(buf, begins, ends):
+    '''Distinct strings buf[begins:ends] (as bytes), the row of the first occurrence of each, and the index of the string of
+    every row. The strings are grouped by a hash of their bytes, checked against the first string of each group'''
+    lengths = ends - begins
+    width = (max(int(lengths.max()) if len(lengths) else 0, 1) + 7) >> 3
+    if width * 8 > MAX_BULK_STRING:
+        raise unsupported_layout("string of more than %d bytes" % MAX_BULK_STRING)
+
+    # Strings as words of 8 bytes, with the bytes after their end set to 0
+    words = gather(buf, np.minimum(begins[:, None] + 8 * np.arange(width), len(buf) - 8), "<u8")
+    word_lengths = np.clip(lengths[:, None] - 8 * np.arange(width), 0, 8).astype(np.uint64)
+    words &= np.where(word_lengths == 8, np.uint64(0xFFFFFFFFFFFFFFFF), (np.uint64(1) << (word_lengths * np.uint64(8))) - np.uint64(1))
+
+    hashes = lengths.astype(np.uint64)
+    for column in range(width):
+        hashes = hashes * np.uint64(0x9E3779B97F4A7C15) ^ words[:, column]
+    hashes, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    if not (words == words[first[inverse]]).all():
+        strings, first, inverse = np.unique(words.view("S%d" % (8 * width)).ravel(), return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return [words[row].tobytes()[:length] for row, length in zip(first.tolist(), lengths[first].tolist())], first, inverse
+
+
+def clock_values(packets, bits, values, packet_begins):
+    '''Clock value after each event, in stream order, from the values of the clock fields of the events (bits being the size of
+    the field, 0 for events without one) and the clock value at the start of each packet. A field smaller than 64 bits only
+    gives the low bits of the clock, whose high bits are kept from the previous value, and incremented when the low bits decrease'''
+    count = len(packets)
+    if not count:
+        return np.zeros(0, dtype=np.int64)
+    full = bits >= 64
+    partial = (bits > 0) & ~full
+    sizes = np.unique(bits[partial])
+    if len(sizes) > 1:
+        raise unsupported_layout("clock fields of several sizes")
+
+    # Segments of events starting at the first event of a packet (from the clock value at the start of the packet) or at an
+    # event setting the whole clock
+    first = np.ones(count, dtype=bool)
+    first[1:] = packets[1:] != packets[:-1]
+    segment_starts = first | full
+    segments = np.cumsum(segment_starts) - 1
+    bases = np.where(full, values, packet_begins[packets])[segment_starts]
+
+    clock = np.full(count, -1, dtype=np.int64)
+    clock[full] = values[full]
+    clock[first & ~full] = bases[segments[first & ~full]]
+    if len(sizes):
+        size = int(sizes[0])
+        mask = (1 << size) - 1
+        rows = np.flatnonzero(partial)
+        low = values[rows]
+        row_segments = segments[rows]
+
+        # Low bits of the clock before each partial update: those of the previous update of the segment, or of its base
+        previous_low = np.empty_like(low)
+        previous_low[1:] = low[:-1]
+        segment_firsts = np.ones(len(rows), dtype=bool)
+        segment_firsts[1:] = row_segments[1:] != row_segments[:-1]
+        previous_low[segment_firsts] = bases[row_segments[segment_firsts]] & mask
+
+        # Wrap-arounds since the start of the segment
+        wraps = (low < previous_low).astype(np.int64)
+        wrap_counts = np.cumsum(wraps)
+        first_rows = np.maximum.accumulate(np.where(segment_firsts, np.arange(len(rows)), 0))
+        wrap_counts -= wrap_counts[first_rows] - wraps[first_rows]
+        clock[rows] = (bases[row_segments] & ~mask) + (wrap_counts << size) + low
+
+    # Events without clock field keep the clock value of the previous event
+    return clock[np.maximum.accumulate(np.where(clock >= 0, np.arange(count), 0))]
+
+
+
+class step_fields(dict):
+    '''Values of the fields of a step of the bulk decoder {key : array with one value per event}, those of the events without
+    the field being 0'''
+
+    def __init__(self, length):
+        super().__init__()
+        self.length = length
+
+    def store(self, key, rows, values):
+        if key not in self:
+            self[key] = np.zeros(self.length, dtype=values.dtype)
+        self[key][rows] = values
+
+
+
+class bulk_decoder:
+    '''Decodes the packets of a stream class into NumPy arrays. As the events of a packet follow one another and their sizes
+    depend on their strings, the position of an event is only known once the previous one is decoded: each step decodes the
+    next event of every packet of the batch at once. Consecutive byte-aligned fields are read at the positions of all events
+    with one structured dtype, and the ends of strings are found by looking for zero bytes 8 bytes at a time (see string_ends).
+    The types are turned into readers once, functions (buf, pos, rows, scope, out) -> (positions after the value, values for
+    integers else None). Raises unsupported_layout for the layouts (and data) it cannot handle'''
+
+    def __init__(self, metadata, stream_id):
+        stream = metadata.streams[stream_id]
+        if stream["event.header"] is None:
+            raise unsupported_layout("stream without event header")
+        self.byte_order = metadata.byte_order
+
+        # Event header: the last decoded field named id is the event id
+        self.header = self.reader(stream["event.header"],
+                                  lambda path, field_type: "event_id" if path.split(".")[-1] == "id" and field_type["kind"] in ("integer", "enum") else None,
+                                  True)
+        self.context = self.reader(stream["event.context"], lambda path, field_type: None, True) if stream["event.context"] is not None else None
+
+        self.events = {}
+        for (event_stream_id, event_id), event in metadata.events.items():
+            if event_stream_id != stream_id:
+                continue
+            consumed = CONSUMED_EVENTS.get(event["name"], ())
+            fields = [bare_name(name) for name, field_type in event["fields"]["fields"]] if event["fields"] is not None else []
+            missing = [field for field in consumed if field not in fields]
+            if missing:
+                raise unsupported_layout(event["name"] + " without field(s) " + ", ".join(missing))
+            capture = lambda path, field_type, consumed=consumed: path if path in consumed and field_type["kind"] in ("integer", "enum", "string") else None
+            self.events[event_id] = [self.reader(event[scope], capture if scope == "fields" else lambda path, field_type: None, True)
+                                     for scope in ("context", "fields") if event[scope] is not None]
+
+    def reader(self, declared_type, capture, track_clock, path=""):
+        '''Reader of a type. capture(path, type) gives the key under which a field is stored in out (or None). scope maps the
+        names of previously decoded integer fields to (values, type), for sequence lengths and variant tags'''
+        kind = declared_type["kind"]
+
+        if kind in ("integer", "enum"):
+            align = declared_type["align"]
+            size = declared_type["size"]
+            byte_order = declared_type["byte_order"] or self.byte_order
+            keep = self.keeper(capture(path[:-1], declared_type), size if track_clock and declared_type.get("clock") is not None else 0)
+            if byte_aligned(declared_type):
+                dtype = np.dtype(byte_order + ("i" if declared_type["signed"] else "u") + str(size // 8))
+
+                def read(buf, pos, rows, scope, out):
+                    pos = align_positions(pos, align)
+                    values = gather(buf, pos >> 3, dtype).astype(np.int64)
+                    keep(values, rows, out)
+                    return pos + size, values
+                return read
+
+            # Bit field: little endian fields are packed starting from the least significant bit
+            if byte_order != "<" or size > 57:
+                raise unsupported_layout("bit field of %d bits" % size)
+            mask = np.uint64((1 << size) - 1)
+
+            def read(buf, pos, rows, scope, out):
+                pos = align_positions(pos, align)
+                values = ((gather(buf, pos >> 3, "<u8") >> (pos & 7).astype(np.uint64)) & mask).astype(np.int64)
+                if declared_type["signed"]:
+                    values = np.where(values >= 1 << (size - 1), values - (1 << size), values)
+                keep(values, rows, out)
+                return pos + size, values
+            return read
+
+        if kind == "float":
+            if not byte_aligned(declared_type):
+                raise unsupported_layout("floating point bit field")
+            return lambda buf, pos, rows, scope, out: (align_positions(pos, declared_type["align"]) + declared_type["size"], None)
+
+        if kind == "string":
+            key = capture(path[:-1], declared_type)
+
+            def read(buf, pos, rows, scope, out):
+                begins = align_positions(pos, 8) >> 3
+                ends = string_ends(buf, begins)
+                if key is not None:
+                    out.store(key, rows, begins)
+                    out.store(key + ".end", rows, ends)
+                return (ends + 1) << 3, None
+            return read
+
+        if kind == "struct":
+            return self.struct_reader(declared_type, capture, track_clock, path)
+
+        if kind in ("array", "sequence"):
+            element = declared_type["element"]
+            element_size = fixed_size(element)
+            element_alignment = alignment(element)
+            if kind == "array":
+                length = lambda scope: declared_type["length"]
+            else:
+                length_name = declared_type["length"].split(".")[-1]
+                length = lambda scope: scope[length_name][0] if length_name in scope else None
+            if element_size is not None:
+                def read(buf, pos, rows, scope, out):
+                    lengths = length(scope)
+                    if lengths is None:
+                        raise unsupported_layout("sequence length " + declared_type["length"])
+                    return align_positions(pos, element_alignment) + lengths * element_size, None
+                return read
+            if kind == "sequence":
+                raise unsupported_layout("sequence of variable size elements")
+            read_element = self.reader(element, lambda field_path, field_type: None, False, path)
+
+            def read(buf, pos, rows, scope, out):
+                for index in range(declared_type["length"]):
+                    pos, values = read_element(buf, pos, rows, scope, out)
+                return pos, None
+            return read
+
+        if kind == "variant":
+            tag_name = declared_type["tag"].split(".")[-1]
+            options = [(name, self.reader(option_type, capture, track_clock, path + bare_name(name) + "."))
+                       for name, option_type in declared_type["options"]]
+
+            def read(buf, pos, rows, scope, out):
+                if tag_name not in scope or scope[tag_name][1]["kind"] != "enum":
+                    raise unsupported_layout("variant tag " + str(declared_type["tag"]))
+                tags, tag_type = scope[tag_name]
+                ranges = {}
+                for label, low, high in tag_type["mappings"]:
+                    ranges.setdefault(label, []).append((low, high))
+
+                # The first option matching the tag of an event is decoded
+                pos = pos.copy()
+                matched = np.zeros(len(pos), dtype=bool)
+                for name, read_option in options:
+                    option_ranges = ranges.get(name, ranges.get(bare_name(name)))
+                    if option_ranges is None:
+                        continue
+                    selected = np.zeros(len(pos), dtype=bool)
+                    for low, high in option_ranges:
+                        selected |= (tags >= low) & (tags <= high)
+                    subset = np.flatnonzero(selected & ~matched)
+                    matched |= selected
+                    if not len(subset):
+                        continue
+                    option_scope = {scope_name: (values[subset], scope_type) for scope_name, (values, scope_type) in scope.items()}
+                    pos[subset], values = read_option(buf, pos[subset], rows[subset], option_scope, out)
+                if not matched.all():
+                    raise ValueError("invalid variant tag")
+                return pos, None
+            return read
+
+        raise unsupported_layout("type " + kind)
+
+    def struct_reader(self, declared_type, capture, track_clock, path):
+        '''Reader of a struct. Consecutive byte-aligned fields are read as one record (see record_reader)'''
+        fields = declared_type["fields"]
+        struct_alignment = alignment(declared_type)
+
+        # Fields which are referenced as sequence length or variant tag by a later field are kept in the scope
+        referenced = set()
+        for name, field_type in fields:
+            while field_type["kind"] in ("array", "sequence"):
+                if field_type["kind"] == "sequence":
+                    referenced.add(field_type["length"].split(".")[-1])
+                field_type = field_type["element"]
+            if field_type["kind"] == "variant":
+                referenced.add(field_type["tag"].split(".")[-1])
+
+        readers = []
+        run = []
+        for name, field_type in fields:
+            field_path = path + bare_name(name)
+            if byte_aligned(field_type) or (field_type["kind"] == "array" and byte_aligned(field_type["element"])
+                                            and capture(field_path, field_type) is None):
+                # A record starts aligned to its first field, so the padding within it is known if no later field needs more
+                if run and alignment(field_type) > alignment(run[0][1]):
+                    readers.append(self.record_reader(run, capture, track_clock, path))
+                    run = []
+                run.append((name, field_type))
+                continue
+            if run:
+                readers.append(self.record_reader(run, capture, track_clock, path))
+                run = []
+            readers.append((name if name in referenced else None, field_type, self.reader(field_type, capture, track_clock, field_path + ".")))
+        if run:
+            readers.append(self.record_reader(run, capture, track_clock, path))
+
+        def read(buf, pos, rows, scope, out):
+            pos = align_positions(pos, struct_alignment)
+            local_scope = dict(scope)
+            for name, field_type, read_field in readers:
+                pos, values = read_field(buf, pos, rows, local_scope, out)
+                if name is None:
+                    continue
+                if isinstance(name, list):
+                    local_scope.update(zip(name, values))
+                else:
+                    local_scope[name] = (values, field_type)
+            return pos, None
+        return read
+
+    def record_reader(self, run, capture, track_clock, path):
+        '''(names, None, reader) of consecutive byte-aligned fields [(name, type), ...], read as a structured dtype record.
+        The reader returns the (values, type) of the integer fields in the scope of the struct'''
+        record_alignment = alignment(run[0][1])
+        names, formats, offsets, fields = [], [], [], []
+        size = 0
+        for name, field_type in run:
+            size += -size % alignment(field_type)
+            if field_type["kind"] in ("integer", "enum"):
+                byte_order = field_type["byte_order"] or self.byte_order
+                names.append(name)
+                formats.append(byte_order + ("i" if field_type["signed"] else "u") + str(field_type["size"] // 8))
+                offsets.append(size // 8)
+                fields.append((field_type, self.keeper(capture(path + bare_name(name), field_type),
+                                                       field_type["size"] if track_clock and field_type.get("clock") is not None else 0)))
+            size += field_type["size"] if field_type["kind"] != "array" else field_type["length"] * field_type["element"]["size"]
+        dtype = np.dtype({"names": ["f%d" % index for index in range(len(names))], "formats": formats, "offsets": offsets,
+                          "itemsize": (size + 7) // 8})
+
+        def read(buf, pos, rows, scope, out):
+            pos = align_positions(pos, record_alignment)
+            records = gather(buf, pos >> 3, dtype) if names else None
+            values = []
+            for index, (field_type, keep) in enumerate(fields):
+                field_values = records["f%d" % index].astype(np.int64)
+                keep(field_values, rows, out)
+                values.append((field_values, field_type))
+            return pos + size, values
+        return names, None, read
+
+    def keeper(self, key, clock_size):
+        '''Function storing the values of an integer field in out (under key if not None, and as clock value if clock_size)'''
+        if key is None and not clock_size:
+            return lambda values, rows, out: None
+
+        def keep(values, rows, out):
+            if key is not None:
+                out.store(key, rows, values)
+            if clock_size:
+                if out["clock_bits"][rows].any():
+                    raise unsupported_layout("event with several clock fields")
+                out["clock"][rows] = values
+                out["clock_bits"][rows] = clock_size
+        return keep
+
+    def decode_step(self, buf, pos):
+        '''Decodes the event at each of the bit positions pos. Returns the positions after the events and their fields: the event
+        id, the clock field (clock_bits being its size, 0 for events without one), and the consumed fields (strings as their
+        begin and end byte positions in buf)'''
+        rows = np.arange(len(pos))
+        out = step_fields(len(pos))
+        out["event_id"] = np.zeros(len(pos), dtype=np.int64)
+        out["clock"] = np.zeros(len(pos), dtype=np.int64)
+        out["clock_bits"] = np.zeros(len(pos), dtype=np.int64)
+
+        pos, values = self.header(buf, pos, rows, {}, out)
+        if self.context is not None:
+            pos, values = self.context(buf, pos, rows, {}, out)
+
+        event_ids = out["event_id"]
+        for event_id in np.unique(event_ids).tolist():
+            readers = self.events.get(event_id)
+            if readers is None:
+                raise unsupported_layout("unknown event id %d" % event_id)
+            subset = np.flatnonzero(event_ids == event_id)
+            event_pos = pos[subset]
+            for read in readers:
+                event_pos, values = read(buf, event_pos, subset, {}, out)
+            pos[subset] = event_pos
+        return pos, out
+
+    def decode_packets(self, buf, packets):
+        '''Decodes the events of packets [(begin, end, clock value at the start), ...], with begin and end the bit positions of
+        their events in buf. Returns the fields of the events (see decode_step) in stream order, with the packet of each event
+        and the clock value after it'''
+        pos = np.array([begin for begin, end, clock in packets], dtype=np.int64)
+        ends = np.array([end for begin, end, clock in packets], dtype=np.int64)
+
+        steps = []
+        active = np.flatnonzero(pos < ends)
+        while len(active):
+            new_pos, out = self.decode_step(buf, pos[active])
+            out["packet"] = active
+            steps.append(out)
+            pos[active] = new_pos
+            active = active[new_pos < ends[active]]
+
+        # Events of all steps in stream order: the event of a packet decoded at step i is the i-th one of the packet
+        keys = set(key for out in steps for key in out) | {"packet", "event_id", "clock", "clock_bits"}
+        packet_events = np.zeros(len(packets), dtype=np.int64)
+        for out in steps:
+            packet_events[out["packet"]] += 1
+        packet_firsts = np.cumsum(packet_events) - packet_events
+        order = np.concatenate([packet_firsts[out["packet"]] + step for step, out in enumerate(steps)] or [np.zeros(0, dtype=np.int64)])
+        events = {}
+        for key in keys:
+            events[key] = np.zeros(len(order), dtype=np.int64)
+            events[key][order] = np.concatenate([out[key] if key in out else np.zeros(out.length, dtype=np.int64) for out in steps]
+                                                or [np.zeros(0, dtype=np.int64)])
+        events["clock"] = clock_values(events["packet"], events["clock_bits"], events["clock"],
+                                       np.array([clock for begin, end, clock in packets], dtype=np.int64))
+        return events
+
+
+
+# -------------------------------------------------------------------
+# Decoding
+
+class trace_decoder:
+    '''Decoder for the stream files of one trace. Raises unsupported_layout when the metadata cannot be handled'''
+
+    def __init__(self, ctf_path):
+        self.ctf_path = ctf_path
+        self.metadata = tsdl_metadata(read_metadata_text(ctf_path))
+
+        if self.metadata.packet_header is None and len(self.metadata.streams) > 1:
+            raise unsupported_layout("several stream classes without packet header")
+
+        # Packet header decoder, and packet context and event decoders of every stream class (see packet_fields)
+        self.packet_header = packet_fields(self.metadata.packet_header, self.metadata.byte_order, 0)
+        self.packet_context = {}
+        self.events = {}
+        for stream_id, stream in self.metadata.streams.items():
+            self.packet_context[stream_id] = packet_fields(stream["packet.context"], self.metadata.byte_order, self.packet_header[2])
+            self.events[stream_id] = bulk_decoder(self.metadata, stream_id)
+
+        # Clock used by the event timestamps (ns from origin = offset + cycles * 1e9 / freq)
+        clocks = list(self.metadata.clocks.values())
+        if len(clocks) != 1:
+            raise unsupported_layout("trace with %d clocks" % len(clocks))
+        self.clock = clocks[0]
+
+    def cycles_to_ns(self, cycles):
+        '''Converts clock values to ns from origin'''
+        freq = self.clock["freq"]
+        offset_ns = self.clock["offset_s"] * 1000000000
+        if freq == 1000000000:
+            return cycles + (offset_ns + self.clock["offset"])
+        cycles = cycles + self.clock["offset"]
+        return offset_ns + (cycles // freq) * 1000000000 + ((cycles % freq) * 1000000000) // freq
+
+    def read_packet(self, mm, offset):
+        '''Decodes the header and context of the packet at the given offset (in bytes). Returns (stream id, events begin,
+        events end, packet context, offset of the next packet), with the positions of the events in bits'''
+        stream_id, header = self.read_packet_header(mm, offset)
+        fields, names, end = self.packet_context[stream_id]
+        context = dict(zip(names, fields.unpack_from(mm, offset + self.packet_header[2] // 8)))
+        packet_size = context.get("packet_size", (len(mm) - offset) * 8)
+        content_size = context.get("content_size", packet_size)
+        return stream_id, offset * 8 + end, offset * 8 + content_size, context, offset + packet_size // 8
+
+    def read_packet_header(self, mm, offset):
+        '''Decodes the header of the packet at the given offset (in bytes). Returns (stream class id, packet header)'''
+        if offset % 8:
+            raise unsupported_layout("packet not aligned to 8 bytes")
+        fields, names, end = self.packet_header
+        header = dict(zip(names, fields.unpack_from(mm, offset)))
+        if "magic" in header and header["magic"] != PACKET_MAGIC:
+            raise unsupported_layout("invalid packet magic")
+        stream_id = header.get("stream_id", next(iter(self.metadata.streams)))
+        if stream_id not in self.metadata.streams:
+            raise unsupported_layout("unknown stream class %d" % stream_id)
+        return stream_id, header
+
+    def stream_key(self, stream):
+        '''(stream id, stream class id) of a stream file as seen by Babeltrace, whose muxer orders the messages with equal
+        timestamps by them (None for an empty file). The stream id is the stream_instance_id of the packet header (None if there
+        is none)'''
+        with open(os.path.join(self.ctf_path, stream), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                stream_id, header = self.read_packet_header(mm, 0)
+        return header.get("stream_instance_id"), stream_id
+
+    def packet_index(self, stream, mm):
+        '''List of (offset in bytes, timestamp_begin, timestamp_end) of the packets of a stream file, with timestamps in ns from
+        origin (None if unknown). Read from the packet index written by LTTng if there is one, else from the packet contexts'''
+        index_path = os.path.join(self.ctf_path, "index", stream + ".idx")
+        if os.path.isfile(index_path):
+            with open(index_path, "rb") as f:
+                data = f.read()
+            if len(data) >= 16 and struct.unpack_from(">I", data)[0] == INDEX_MAGIC:
+                entry_size = struct.unpack_from(">I", data, 12)[0]
+                index = []
+                for entry in range(16, len(data) - entry_size + 1, entry_size):
+                    offset, packet_size, content_size, timestamp_begin, timestamp_end = struct.unpack_from(">QQQQQ", data, entry)
+                    index.append((offset, self.cycles_to_ns(timestamp_begin), self.cycles_to_ns(timestamp_end)))
+                return index
+
+        index = []
+        offset = 0
+        while offset < len(mm):
+            stream_id, pos, end, context, next_offset = self.read_packet(mm, offset)
+            index.append((offset, self.cycles_to_ns(context["timestamp_begin"]) if "timestamp_begin" in context else None,
+                          self.cycles_to_ns(context["timestamp_end"]) if "timestamp_end" in context else None))
+            offset = next_offset
+        return index
+
+    def first_event(self):
+        '''(timestamp, logical time) of the first event of the trace, decoding only the first packets of each stream file'''
+        first_events = []
+        for stream in stream_files(self.ctf_path):
+            with stream_reader(self, stream) as reader:
+                for packet in range(len(reader.index)):
+                    reader.decode_packets([packet])
+                    first_event = reader.partition()["first_event"]
+                    if first_event is not None:
+                        first_events.append(first_event)
+                        break
+        return min(first_events) if first_events else None
+
+    def decode_stream(self, stream, limits=None):
+        '''Decodes a stream file into partial columns, in the same format as parallel_decode.decode_partition. With limits (see
+        time_window.limits), only the events within the limits are kept, and packets outside of them are skipped'''
+        with stream_reader(self, stream) as reader:
+            if limits is None:
+                reader.decode_packets(range(len(reader.index)))
+                return reader.partition()
+
+            begin_ns, end_ns, begin_logical, end_logical = limits
+
+            # Packets outside the physical time range (known from their begin/end timestamps) are skipped
+            packets = [packet for packet, (offset, timestamp_begin, timestamp_end) in enumerate(reader.index)
+                       if (timestamp_end is None or timestamp_end >= begin_ns) and (timestamp_begin is None or timestamp_begin <= end_ns)]
+
+            # Tags are processed in order, so the logical times of the reaction events do not decrease along a stream. The first
+            # packet reaching the logical time range is found by bisection, and decoding stops at the first packet beyond it
+            first = 0
+            if begin_logical != NO_BEGIN:
+                last = len(packets)
+                while first < last:
+                    middle = (first + last) // 2
+                    logical_range = reader.logical_range([packets[middle]], keep=False)
+                    if logical_range is not None and logical_range[1] < begin_logical:
+                        first = middle + 1
+                    else:
+                        last = middle
+            # The packets are decoded in batches of doubling size, stopping after the first batch beyond the range
+            batch_size = 1
+            while first < len(packets):
+                logical_range = reader.logical_range(packets[first:first + batch_size], keep=True)
+                if logical_range is not None and logical_range[0] > end_logical:
+                    break
+                first += batch_size
+                batch_size *= 2
+
+            return reader.partition(limits)
+
+
+
+class stream_reader:
+    '''Decodes the packets of one stream file into typed arrays. Used as a context manager, which maps the file'''
+
+    def __init__(self, decoder, stream):
+        self.decoder = decoder
+        self.stream = stream
+
+        # Local names [(reactor_name, reaction_name), ...] and their codes, for execution names and (reactor, reaction) pairs
+        self.names = []
+        self.codes = {}
+
+        # Rows of each output, stored one after the other in an int64 array (which grows faster than NumPy arrays when appending)
+        self.outputs = {"starts": START_SCHEMA, "finishes": FINISH_SCHEMA, "inst": INST_SCHEMA}
+        self.arrays = {output: array.array("q") for output in self.outputs}
+
+    def __enter__(self):
+        self.file = open(os.path.join(self.decoder.ctf_path, self.stream), "rb")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.mm = b""
+        else:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = self.decoder.packet_index(self.stream, self.mm)
+        return self
+
+    def __exit__(self, *exception):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
+
+    def code(self, name):
+        name_code = self.codes.get(name)
+        if name_code is None:
+            name_code = len(self.names)
+            self.codes[name] = name_code
+            self.names.append(name)
+        return name_code
+
+    def decode_packets(self, packets):
+        '''Decodes the given packets (indices in the packet index) in order, in batches of consecutive packets of the same stream
+        class. The clock value at the start of each packet is needed to decode its timestamps'''
+        batch = []
+        for packet in packets:
+            offset = self.index[packet][0]
+            stream_id, pos, end, context, next_offset = self.decoder.read_packet(self.mm, offset)
+            if "timestamp_begin" not in context:
+                raise unsupported_layout("packet without timestamp_begin")
+            if batch and (batch[0][0] != stream_id or next_offset - batch[0][1] > BATCH_BYTES):
+                self.decode_batch(batch)
+                batch = []
+            batch.append((stream_id, offset, pos, end, context["timestamp_begin"], min(next_offset, len(self.mm))))
+        if batch:
+            self.decode_batch(batch)
+
+    def decode_batch(self, batch):
+        '''Decodes packets [(stream id, offset, events begin, events end, timestamp_begin, next offset), ...] of a stream class'''
+        stream_id = batch[0][0]
+        base = batch[0][1]
+        size = max(packet[5] for packet in batch) - base
+        buf = np.zeros(size + BATCH_PADDING, dtype=np.uint8)
+        buf[:size] = np.frombuffer(self.mm, dtype=np.uint8, count=size, offset=base)
+
+        events = self.decoder.events[stream_id].decode_packets(buf, [(pos - base * 8, end - base * 8, timestamp_begin)
+                                                                     for stream_id, offset, pos, end, timestamp_begin, next_offset in batch])
+        for output, values in self.output_rows(stream_id, buf, events).items():
+            self.arrays[output].frombytes(values.tobytes())
+
+    def output_rows(self, stream_id, buf, events):
+        '''Rows of each output (see self.outputs) of the consumed events of a batch, as int64 arrays. Names are given codes in
+        order of first appearance'''
+        event_names = {event_id: event["name"] for (event_stream_id, event_id), event in self.decoder.metadata.events.items()
+                       if event_stream_id == stream_id}
+        event_ids, event_inverse = np.unique(events["event_id"], return_inverse=True)
+        selected = lambda *names: np.isin(event_ids, [event_id for event_id, name in event_names.items() if name in names])[event_inverse.ravel()]
+        is_start = selected("reactor_cpp:reaction_execution_starts")
+        is_finish = selected("reactor_cpp:reaction_execution_finishes")
+        is_trigger = selected("reactor_cpp:trigger_reaction")
+        is_inst = is_trigger | selected("reactor_cpp:schedule_action")
+        field = lambda key: events.get(key, np.zeros(len(is_inst), dtype=np.int64))
+
+        # Distinct names (reaction names of the executions, (reactor, action or reaction) pairs of the instantaneous events), with
+        # the first row they appear at and the rows using them
+        distinct = []
+        exe_rows = np.flatnonzero(is_start | is_finish)
+        if len(exe_rows):
+            strings, firsts, inverse = byte_strings(buf, events["reaction_name"][exe_rows], events["reaction_name.end"][exe_rows])
+            names = [tuple(string.decode("utf-8").rsplit(".", 1)) for string in strings]
+            distinct.append((exe_rows, names, exe_rows[firsts], inverse))
+        inst_rows = np.flatnonzero(is_inst)
+        if len(inst_rows):
+            reactors, reactor_firsts, reactor_inverse = byte_strings(buf, events["reactor_name"][inst_rows], events["reactor_name.end"][inst_rows])
+            is_action = ~is_trigger[inst_rows]
+            targets, target_firsts, target_inverse = byte_strings(buf,
+                                                                  np.where(is_action, field("action_name")[inst_rows], field("reaction_name")[inst_rows]),
+                                                                  np.where(is_action, field("action_name.end")[inst_rows], field("reaction_name.end")[inst_rows]))
+            pairs, firsts, inverse = np.unique(reactor_inverse * len(targets) + target_inverse, return_index=True, return_inverse=True)
+            names = [(reactors[pair // len(targets)].decode("utf-8"), targets[pair % len(targets)].decode("utf-8")) for pair in pairs.tolist()]
+            distinct.append((inst_rows, names, inst_rows[firsts], inverse.ravel()))
+
+        codes = np.zeros(len(is_inst), dtype=np.int64)
+        new_names = sorted((first, output, index) for output, (rows, names, firsts, inverse) in enumerate(distinct)
+                           for index, first in enumerate(firsts.tolist()))
+        name_codes = [np.zeros(len(names), dtype=np.int64) for rows, names, firsts, inverse in distinct]
+        for first, output, index in new_names:
+            name_codes[output][index] = self.code(distinct[output][1][index])
+        for (rows, names, firsts, inverse), output_codes in zip(distinct, name_codes):
+            codes[rows] = output_codes[inverse]
+
+        columns = {"name": codes, "logical_time": field("timestamp_ns"), "microstep": field("timestamp_microstep"),
+                   "start": events["clock"], "end": events["clock"], "timestamp": events["clock"], "worker": field("worker_id"),
+                   "is_reaction": is_trigger}
+        return {output: np.column_stack([columns[column][rows].astype(np.int64) for column in self.outputs[output]])
+                for output, rows in (("starts", is_start), ("finishes", is_finish), ("inst", is_inst))}
+
+    def logical_range(self, packets, keep):
+        '''Decodes packets, and returns the (min, max) logical times of their reaction events (None if they have none). The rows
+        of the packets are dropped unless keep is True'''
+        lengths = {output: len(values) for output, values in self.arrays.items()}
+        self.decode_packets(packets)
+
+        logical_times = []
+        for output, values in self.arrays.items():
+            rows = np.array(values[lengths[output]:], dtype=np.int64).reshape(-1, len(self.outputs[output]))
+            if output == "inst":
+                rows = rows[rows[:, list(INST_SCHEMA).index("is_reaction")] != 0]
+            logical_times.append(rows[:, list(self.outputs[output]).index("logical_time")])
+            if not keep:
+                del values[lengths[output]:]
+
+        logical_times = np.concatenate(logical_times)
+        if len(logical_times) == 0:
+            return None
+        return int(logical_times.min()), int(logical_times.max())
+
+    def partition(self, limits=None):
+        '''Partial columns of the decoded packets (see pair_executions), keeping only the events within limits if given'''
+        columns = {}
+        for output, schema in self.outputs.items():
+            rows = np.array(self.arrays[output], dtype=np.int64).reshape(-1, len(schema))
+            columns[output] = {column: rows[:, i].astype(dtype) for i, (column, dtype) in enumerate(schema.items())}
+
+        # Convert clock values to ns from origin
+        columns["starts"]["start"] = self.decoder.cycles_to_ns(columns["starts"]["start"])
+        columns["finishes"]["end"] = self.decoder.cycles_to_ns(columns["finishes"]["end"])
+        columns["inst"]["timestamp"] = self.decoder.cycles_to_ns(columns["inst"]["timestamp"])
+
+        if limits is not None:
+            for output, timestamp in (("starts", "start"), ("finishes", "end"), ("inst", "timestamp")):
+                output_columns = columns[output]
+                keep = within_limits(limits, output_columns[timestamp], output_columns["logical_time"])
+                columns[output] = {column: values[keep] for column, values in output_columns.items()}
+
+        return pair_executions(self.names, columns["starts"], columns["finishes"], columns["inst"])
+
+
+
+def pair_executions(names, starts, finishes, inst):
+    '''Pairs execution starts and finishes on (reaction, logical time, microstep), vectorized. Returns the partial columns of a
+    stream, with the unmatched starts and finishes kept for merging'''
+
+    # Sort starts and finishes together by key, with each start before its finish
+    count = len(starts["name"])
+    key_columns = ["name", "logical_time", "microstep"]
+    keys = {column: np.concatenate((starts[column], finishes[column])) for column in key_columns}
+    is_finish = np.concatenate((np.zeros(count, dtype=bool), np.ones(len(finishes["name"]), dtype=bool)))
+    order = np.lexsort((is_finish, keys["microstep"], keys["logical_time"], keys["name"]))
+
+    same_key = np.ones(max(len(order) - 1, 0), dtype=bool)
+    for column in key_columns:
+        sorted_column = keys[column][order]
+        same_key &= sorted_column[1:] == sorted_column[:-1]
+    paired = same_key & ~is_finish[order][:-1] & is_finish[order][1:]
+
+    start_rows = order[:-1][paired]
+    finish_rows = order[1:][paired] - count
+
+    exe = {"name": starts["name"][start_rows], "logical_time": starts["logical_time"][start_rows],
+           "microstep": starts["microstep"][start_rows], "start": starts["start"][start_rows],
+           "end": finishes["end"][finish_rows], "worker": starts["worker"][start_rows]}
+
+    unmatched_starts = np.ones(count, dtype=bool)
+    unmatched_starts[start_rows] = False
+    unmatched_finishes = np.ones(len(finishes["name"]), dtype=bool)
+    unmatched_finishes[finish_rows] = False
+
+    # The first event of the stream gives the start times
+    first_event = None
+    for timestamps, logical_times in [(starts["start"], starts["logical_time"]), (finishes["end"], finishes["logical_time"]),
+                                      (inst["timestamp"], inst["logical_time"])]:
+        if len(timestamps) and (first_event is None or int(timestamps[0]) < first_event[0]):
+            first_event = (int(timestamps[0]), int(logical_times[0]))
+
+    return {"names": names,
+            "first_event": first_event,
+            "exe": exe,
+            "starts": {column: values[unmatched_starts] for column, values in starts.items()},
+            "finishes": {column: values[unmatched_finishes] for column, values in finishes.items()},
+            "inst": inst}
+
+
+
+# Decoders of the traces opened in this process {ctf_path : trace_decoder}
+trace_decoders = {}
+
+def open_trace(ctf_path):
+    '''Returns the decoder of a trace, parsing its metadata on first use'''
+    if ctf_path not in trace_decoders:
+        trace_decoders[ctf_path] = trace_decoder(ctf_path)
+    return trace_decoders[ctf_path]
+
+def decode_stream(ctf_path, stream, limits=None):
+    '''Decodes one stream file of a trace (used as process pool task)'''
+    return open_trace(ctf_path).decode_stream(stream, limits)
+
+def muxer_order(ctf_path):
+    '''Rank of each stream file of a trace (in stream_files order) in the order Babeltrace's muxer gives to messages with equal
+    timestamps (see parallel_decode.muxer_ranks), from the ids in their packet headers'''
+    decoder = open_trace(ctf_path)
+    return muxer_ranks([decoder.stream_key(stream) for stream in stream_files(ctf_path)])
+
+
+
+# -------------------------------------------------------------------
+# Comparison with Babeltrace
+
+def partition_rows(partition):
+    '''Rows of the partial columns of a stream with names instead of codes, in a canonical order (the decoders pair executions
+    in a different order)'''
+    rows = {}
+    for table in ("exe", "starts", "finishes", "inst"):
+        columns = partition[table]
+        names = [partition["names"][code] for code in columns["name"]]
+        values = [columns[column].tolist() for column in columns if column != "name"]
+        rows[table] = sorted(zip(names, *values))
+    return rows
+
+
+def compare_with_babeltrace(ctf_path):
+    '''Decodes every stream file of a trace with both decoders. Returns the names of the stream files with differing results'''
+    import tempfile
+    from scripts.parallel_decode import partition_streams, decode_partition
+
+    differing = []
+    with tempfile.TemporaryDirectory() as partitions_dir:
+        for stream, partition_path in zip(stream_files(ctf_path), partition_streams(ctf_path, partitions_dir)):
+            native = decode_stream(ctf_path, stream)
+            babeltrace = decode_partition(partition_path)
+            if native["first_event"] != babeltrace["first_event"] or partition_rows(native) != partition_rows(babeltrace):
+                differing.append(stream)
+    return differing
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+    import time
+    from scripts.ctf_writer import synthetic_events, write_trace
+
+    argparser = argparse.ArgumentParser(description="Checks that the native decoder gives the same results as Babeltrace")
+    argparser.add_argument("ctf", type=str, nargs="?", help="Path to a CTF trace (a synthetic trace is written if omitted)")
+    argparser.add_argument("--tags", type=int, default=1000, help="Number of tags of the synthetic trace")
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        ctf_path = args.ctf
+        if ctf_path is None:
+            ctf_path = os.path.join(tmp_path, "ctf")
+            write_trace(ctf_path, synthetic_events(tags=args.tags, cpus=4), offset_ns=1600000000000000000)
+
+        start = time.perf_counter()
+        for stream in stream_files(ctf_path):
+            decode_stream(ctf_path, stream)
+        print("Native decoding: %.3f s" % (time.perf_counter() - start))
+
+        differing = compare_with_babeltrace(ctf_path)
+        if differing:
+            print("Results differ from Babeltrace for: " + ", ".join(differing))
+            raise SystemExit(1)
+        print("Results match Babeltrace")
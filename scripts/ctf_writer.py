@@ -0,0 +1,240 @@
+#!/usr/bin/python
+
+# Writes synthetic CTF traces with the layout LTTng uses for reactor_cpp tracepoints (compact/extended event headers, one stream
+# file per CPU), for checking the native decoder against Babeltrace without a traced program.
+
+import os
+import random
+import struct
+import uuid
+
+
+# Packet size of the stream files (in bytes)
+PACKET_SIZE = 4096
+
+# Event ids and fields (name, TSDL type) of the reactor_cpp tracepoints
+EVENTS = [("reactor_cpp:reaction_execution_starts", [("reaction_name", "string"), ("worker_id", "int"),
+                                                     ("timestamp_ns", "uint64_t"), ("timestamp_microstep", "uint64_t")]),
+          ("reactor_cpp:reaction_execution_finishes", [("reaction_name", "string"), ("worker_id", "int"),
+                                                       ("timestamp_ns", "uint64_t"), ("timestamp_microstep", "uint64_t")]),
+          ("reactor_cpp:schedule_action", [("reactor_name", "string"), ("action_name", "string"),
+                                           ("timestamp_ns", "uint64_t"), ("timestamp_microstep", "uint64_t")]),
+          ("reactor_cpp:trigger_reaction", [("reactor_name", "string"), ("reaction_name", "string"),
+                                            ("timestamp_ns", "uint64_t"), ("timestamp_microstep", "uint64_t")])]
+
+METADATA = '''/* CTF 1.8 */
+
+typealias integer { size = 8; align = 8; signed = false; } := uint8_t;
+typealias integer { size = 16; align = 8; signed = false; } := uint16_t;
+typealias integer { size = 32; align = 8; signed = false; } := uint32_t;
+typealias integer { size = 64; align = 8; signed = false; } := uint64_t;
+typealias integer { size = 64; align = 8; signed = false; } := unsigned long;
+typealias integer { size = 5; align = 1; signed = false; } := uint5_t;
+typealias integer { size = 27; align = 1; signed = false; } := uint27_t;
+
+trace {
+	major = 1;
+	minor = 8;
+	uuid = "%(uuid)s";
+	byte_order = le;
+	packet.header := struct {
+		uint32_t magic;
+		uint8_t  uuid[16];
+		uint32_t stream_id;
+		uint64_t stream_instance_id;
+	};
+};
+
+env {
+	hostname = "synthetic";
+	domain = "ust";
+	tracer_name = "lttng-ust";
+};
+
+clock {
+	name = "monotonic";
+	uuid = "%(uuid)s";
+	description = "Monotonic Clock";
+	freq = 1000000000; /* Frequency, in Hz */
+	/* clock value offset from Epoch is: offset * (1/freq) */
+	offset = %(offset)d;
+};
+
+typealias integer {
+	size = 27; align = 1; signed = false;
+	map = clock.monotonic.value;
+} := uint27_clock_monotonic_t;
+
+typealias integer {
+	size = 64; align = 8; signed = false;
+	map = clock.monotonic.value;
+} := uint64_clock_monotonic_t;
+
+struct packet_context {
+	uint64_clock_monotonic_t timestamp_begin;
+	uint64_clock_monotonic_t timestamp_end;
+	uint64_t content_size;
+	uint64_t packet_size;
+	uint64_t packet_seq_num;
+	unsigned long events_discarded;
+	uint32_t cpu_id;
+};
+
+struct event_header_compact {
+	enum : uint5_t { compact = 0 ... 30, extended = 31 } id;
+	variant <id> {
+		struct {
+			uint27_clock_monotonic_t timestamp;
+		} compact;
+		struct {
+			uint32_t id;
+			uint64_clock_monotonic_t timestamp;
+		} extended;
+	} v;
+} align(8);
+
+stream {
+	id = 0;
+	event.header := struct event_header_compact;
+	packet.context := struct packet_context;
+	event.context := struct {
+		integer { size = 32; align = 8; signed = 1; encoding = none; base = 10; } _vpid;
+		integer { size = 8; align = 8; signed = 1; encoding = UTF8; base = 10; } _procname[17];
+	};
+};
+'''
+
+EVENT_METADATA = '''
+event {
+	name = "%(name)s";
+	id = %(id)d;
+	stream_id = 0;
+	loglevel = 13;
+	fields := struct {
+%(fields)s
+	};
+};
+'''
+
+FIELD_TYPES = {"string": "string _%s;",
+               "int": "integer { size = 32; align = 8; signed = 1; encoding = none; base = 10; } _%s;",
+               "uint64_t": "integer { size = 64; align = 8; signed = 0; encoding = none; base = 10; } _%s;"}
+
+FIELD_FORMATS = {"int": "<i", "uint64_t": "<Q"}
+
+# Header and context of every packet, then the event context of every event
+PACKET_HEADER_SIZE = 32
+PACKET_CONTEXT_SIZE = 52
+EVENT_CONTEXT = struct.pack("<i17s", 1000, b"synthetic")
+
+
+def write_trace(ctf_path, events, offset_ns=0):
+    '''Writes a trace from a list of (timestamp in ns from origin, event name, {field : value}, cpu), sorted by timestamp.
+    Each cpu gets its own stream file. The clock offset is set to offset_ns'''
+    os.makedirs(ctf_path, exist_ok=True)
+    trace_uuid = uuid.uuid4()
+    event_ids = {name: event_id for event_id, (name, fields) in enumerate(EVENTS)}
+
+    metadata = METADATA % {"uuid": trace_uuid, "offset": offset_ns}
+    for event_id, (name, fields) in enumerate(EVENTS):
+        metadata += EVENT_METADATA % {"name": name, "id": event_id,
+                                      "fields": "\n".join("\t\t" + FIELD_TYPES[field_type] % field for field, field_type in fields)}
+    with open(os.path.join(ctf_path, "metadata"), "w") as f:
+        f.write(metadata)
+
+    streams = {}
+    for timestamp, name, values, cpu in events:
+        streams.setdefault(cpu, []).append((timestamp - offset_ns, event_ids[name], values))
+
+    # Stream files, and their packet index as written by LTTng (big endian (offset, packet_size, content_size, timestamp_begin,
+    # timestamp_end, events_discarded, stream_id) entries after a header)
+    os.makedirs(os.path.join(ctf_path, "index"), exist_ok=True)
+    for cpu, stream_events in streams.items():
+        index = [struct.pack(">IIII", 0xC1F1DCC1, 1, 0, 56)]
+        with open(os.path.join(ctf_path, "chan_%d" % cpu), "wb") as f:
+            for sequence_number, packet in enumerate(packets(stream_events)):
+                data = packet_bytes(trace_uuid, cpu, sequence_number, packet)
+                content_size = struct.unpack_from("<Q", data, PACKET_HEADER_SIZE + 16)[0]
+                index.append(struct.pack(">QQQQQQQ", f.tell(), PACKET_SIZE * 8, content_size, packet[0], packet[1], 0, 0))
+                f.write(data)
+        with open(os.path.join(ctf_path, "index", "chan_%d.idx" % cpu), "wb") as f:
+            f.write(b"".join(index))
+
+
+def event_bytes(event_id, values, clock, previous_clock):
+    '''Encodes an event, with a compact header if the id and timestamp fit into it'''
+    if event_id < 31 and clock - previous_clock < (1 << 27):
+        header = struct.pack("<I", event_id | ((clock & ((1 << 27) - 1)) << 5))
+    else:
+        header = struct.pack("<BIQ", 31, event_id, clock)
+
+    payload = []
+    for field, field_type in EVENTS[event_id][1]:
+        if field_type == "string":
+            payload.append(values[field].encode("utf-8") + b"\0")
+        else:
+            payload.append(struct.pack(FIELD_FORMATS[field_type], values[field]))
+    return header + EVENT_CONTEXT + b"".join(payload)
+
+
+def packets(stream_events):
+    '''Splits the events of a stream into packets, yielding (timestamp_begin, timestamp_end, encoded events)'''
+    begin = previous_clock = stream_events[0][0]
+    encoded = []
+    size = PACKET_HEADER_SIZE + PACKET_CONTEXT_SIZE
+    for clock, event_id, values in stream_events:
+        data = event_bytes(event_id, values, clock, previous_clock)
+        if size + len(data) > PACKET_SIZE:
+            yield begin, previous_clock, encoded
+            begin = previous_clock
+            encoded = []
+            size = PACKET_HEADER_SIZE + PACKET_CONTEXT_SIZE
+        encoded.append(data)
+        size += len(data)
+        previous_clock = clock
+    yield begin, previous_clock, encoded
+
+
+def packet_bytes(trace_uuid, cpu, sequence_number, packet):
+    begin, end, encoded = packet
+    content = b"".join(encoded)
+    content_size = (PACKET_HEADER_SIZE + PACKET_CONTEXT_SIZE + len(content)) * 8
+    header = struct.pack("<I16sIQ", 0xC1FC1FC1, trace_uuid.bytes, 0, cpu)
+    context = struct.pack("<QQQQQQI", begin, end, content_size, PACKET_SIZE * 8, sequence_number, 0, cpu)
+    return (header + context + content).ljust(PACKET_SIZE, b"\0")
+
+
+def synthetic_events(reactors=4, reactions=3, tags=1000, workers=2, cpus=2, seed=0):
+    '''Events of a program where every reaction of every reactor is triggered and executed at every tag, starting from an
+    action scheduled at that tag. Returns the list of events for write_trace'''
+    random_generator = random.Random(seed)
+    events = []
+    clock = 1700000000000000000
+    for tag in range(tags):
+        logical_time = 1700000000000000000 + tag * 1000000
+        microstep = tag % 2
+        clock = max(clock, logical_time) + random_generator.randint(100, 1000)
+        for reactor in range(reactors):
+            reactor_name = "Main.r%d" % reactor
+            events.append((clock, "reactor_cpp:schedule_action", {"reactor_name": reactor_name, "action_name": "startup" if tag == 0 else "t",
+                                                                   "timestamp_ns": logical_time, "timestamp_microstep": microstep}, reactor % cpus))
+            clock += random_generator.randint(1, 50)
+            for reaction in range(reactions):
+                cpu = random_generator.randrange(cpus)
+                worker = random_generator.randrange(workers)
+                values = {"reactor_name": reactor_name, "reaction_name": "reaction_%d" % reaction, "timestamp_ns": logical_time,
+                          "timestamp_microstep": microstep}
+                execution = {"reaction_name": reactor_name + ".reaction_%d" % reaction, "worker_id": worker, "timestamp_ns": logical_time,
+                             "timestamp_microstep": microstep}
+                events.append((clock, "reactor_cpp:trigger_reaction", values, cpu))
+                clock += random_generator.randint(1, 50)
+                events.append((clock, "reactor_cpp:reaction_execution_starts", execution, cpu))
+                clock += random_generator.randint(100, 10000)
+                # Occasionally finish on another CPU (the thread migrated), so that pairs cross stream files
+                events.append((clock, "reactor_cpp:reaction_execution_finishes", execution,
+                               cpu if random_generator.random() < 0.9 else random_generator.randrange(cpus)))
+                clock += random_generator.randint(1, 50)
+        # Occasional idle periods longer than the compact event header timestamps can represent
+        if random_generator.random() < 0.01:
+            clock += 1 << 28
+    return events
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+def dependency_edges(categories, dependency_dict):
+    '''Converts the YAML dependencies {name : [name it depends on, ...]} to arrays (source codes, target codes) of the names in
+    categories. Dependencies on names which are not in categories are left out, and those listed several times (e.g. through
+    several ports) are kept once, so that they give a single arrow'''
+    sources = []
+    targets = []
+    for source, code in categories.codes.items():
+        for target in dict.fromkeys(dependency_dict.get(source, [])):
+            target_code = categories.codes.get(target)
+            if target_code is not None:
+                sources.append(code)
+                targets.append(target_code)
+    return np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+
+def next_greater(values):
+    '''Index of the next element greater than each element (len(values) if there is none), by pointer jumping: every element
+    between i and following[i] is at most values[i], so following[i] can jump to following[following[i]] while that holds'''
+    count = len(values)
+    extended = np.append(values, np.iinfo(np.int64).max)
+    following = np.append(np.arange(1, count + 1), count)
+
+    active = np.flatnonzero(extended[following[:count]] <= values)
+    while len(active):
+        following[active] = following[following[active]]
+        active = active[extended[following[active]] <= values[active]]
+    return following[:count]
+
+
+def expand_ranges(starts, counts):
+    '''Concatenation of the ranges [start, start + count) for every pair, and the index of the pair of each element'''
+    owners = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets, owners
+
+
+def dependency_pairs(name_ids, logical_times, microsteps, edges):
+    '''Finds the pairs of rows (i, j) of a table of executions such that j follows i, both have the same logical time and
+    microstep, and name_ids[i] depends on name_ids[j] according to edges (see dependency_edges). As when scanning forward from
+    each row until a greater logical time is found, pairs separated by a row with a greater logical time are left out.
+    Returns the arrays (i, j), ordered by i then j.
+
+    Rows are grouped by tag, and each row is joined with the rows of its tag whose name is one of its dependencies, so that the
+    work is proportional to the number of rows and candidate pairs rather than to the square of the number of rows per tag.'''
+    logical_times = np.asarray(logical_times, dtype=np.int64)
+    microsteps = np.asarray(microsteps, dtype=np.int64)
+    name_ids = np.asarray(name_ids, dtype=np.int64)
+    sources, targets = edges
+    count = len(name_ids)
+    if count == 0 or len(sources) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # Tag of each row, numbered in order of (logical time, microstep)
+    _, tags = np.unique(np.stack((logical_times, microsteps)), axis=1, return_inverse=True)
+    tags = tags.reshape(-1)
+
+    # Dependencies of each name, as ranges of the edges sorted by source
+    name_count = max(int(name_ids.max()), int(sources.max()), int(targets.max())) + 1
+    edge_order = np.argsort(sources, kind="stable")
+    targets = targets[edge_order]
+    edge_counts = np.bincount(sources, minlength=name_count)
+    edge_starts = np.cumsum(edge_counts) - edge_counts
+
+    # Candidate pairs (row, name it depends on)
+    edge_positions, rows = expand_ranges(edge_starts[name_ids], edge_counts[name_ids])
+    wanted_keys = tags[rows] * name_count + targets[edge_positions]
+
+    # Join the candidates with the rows of the same tag and name
+    row_keys = tags * name_count + name_ids
+    row_order = np.argsort(row_keys, kind="stable")
+    sorted_keys = row_keys[row_order]
+    first = np.searchsorted(sorted_keys, wanted_keys, side="left")
+    last = np.searchsorted(sorted_keys, wanted_keys, side="right")
+    matches, candidates = expand_ranges(first, last - first)
+    i = rows[candidates]
+    j = row_order[matches]
+
+    # Keep the rows following i up to the next greater logical time
+    keep = (j > i) & (j < next_greater(logical_times)[i])
+    i = i[keep]
+    j = j[keep]
+
+    order = np.lexsort((j, i))
+    return i[order], j[order]
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+# Number of rows allocated at once while a table is being filled
+CHUNK_SIZE = 65536
+
+
+def object_array(values):
+    '''Converts a list to a one dimensional object array (np.asarray would turn a list of equal length lists into a 2D array)'''
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+
+class name_categories:
+    '''Categorical encoding of reaction and action names, shared by all event tables. Each name is stored once, together with
+    its YAML attributes, and events refer to it by an integer code (assigned in order of first appearance).'''
+
+    def __init__(self):
+        # list of names - [reactor.name0, reactor.name1, ...]
+        self.names = []
+
+        # inverse of names - {reactor.name0 : 0, reactor.name1 : 1, ...}
+        self.codes = {}
+
+        # Attributes of each name, as lists indexed by code {attribute : [value_0, value_1, ...]}
+        self.attributes = {}
+
+        # y-value (height) of each name on the plots, indexed by code. -1 if the name is not shown
+        self.y_axis = np.empty(0, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, attributes):
+        '''Returns the code of the given name, adding it with the given attributes on first appearance'''
+        code = self.codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self.codes[name] = code
+            self.names.append(name)
+            for attribute, value in attributes.items():
+                self.attributes.setdefault(attribute, [None] * code).append(value)
+            for attribute, values in self.attributes.items():
+                if len(values) == code:
+                    values.append(None)
+        return code
+
+    def set_y_axis(self, label_y_pos):
+        '''Sets the y-value of each name from a dictionary {name : y-value}. Names which are not in the dictionary are hidden'''
+        self.y_axis = np.full(len(self.names), -1, dtype=np.int32)
+        for name, y_value in label_y_pos.items():
+            code = self.codes.get(name)
+            if code is not None:
+                self.y_axis[code] = y_value
+
+    def lookup(self, attribute, codes):
+        '''Gets the value of an attribute for every code in the array'''
+        if attribute == "name":
+            values = self.names
+        else:
+            values = self.attributes[attribute]
+        return object_array(values)[codes]
+
+
+
+class event_table:
+    '''Columnar table of trace events. Stored columns are typed NumPy arrays which grow in chunks while parsing.
+    Derived columns (names, y-values, multi-line coordinates, YAML attributes, ...) are computed on demand from the stored
+    columns, and extra columns (e.g. colours) can be added once the table is filled.'''
+
+    def __init__(self, schema, derived, categories, chunk_size=CHUNK_SIZE):
+        # Stored columns {column : dtype}, in the order values are passed to append
+        self.schema = dict(schema)
+
+        # Derived columns {column : function(table) -> array}
+        self.derived = dict(derived)
+
+        # Categorical names shared by all tables
+        self.categories = categories
+
+        self.chunk_size = chunk_size
+
+        # Full chunks of every stored column, which are concatenated when the table is read
+        self._chunks = {column: [] for column in self.schema}
+
+        # Chunk that is currently being filled
+        self._current = [np.empty(chunk_size, dtype=dtype) for dtype in self.schema.values()]
+        self._fill = 0
+
+        # Concatenated stored columns and extra columns
+        self._columns = {column: np.empty(0, dtype=dtype) for column, dtype in self.schema.items()}
+        self._consolidated = True
+
+    @classmethod
+    def from_arrays(cls, schema, derived, categories, arrays):
+        '''Builds a filled table from a dictionary of arrays (one for each stored column, plus any extra columns)'''
+        table = cls(schema, derived, categories, chunk_size=1)
+        table._columns = {column: np.asarray(array) for column, array in arrays.items()}
+        return table
+
+    def append(self, *values):
+        '''Adds a row. Values are given in the order of the schema'''
+        if self._consolidated:
+            self._consolidated = False
+            for column in self.schema:
+                self._chunks[column] = [self._columns[column]]
+
+        fill = self._fill
+        for array, value in zip(self._current, values):
+            array[fill] = value
+        self._fill = fill + 1
+
+        # Store full chunk and start a new one
+        if self._fill == self.chunk_size:
+            for column, array in zip(self.schema, self._current):
+                self._chunks[column].append(array)
+            self._current = [np.empty(self.chunk_size, dtype=dtype) for dtype in self.schema.values()]
+            self._fill = 0
+
+    def _consolidate(self):
+        '''Concatenates the chunks of every stored column'''
+        if not self._consolidated:
+            for column, array in zip(self.schema, self._current):
+                self._columns[column] = np.concatenate(self._chunks[column] + [array[:self._fill]])
+                self._chunks[column] = []
+            self._current = [np.empty(self.chunk_size, dtype=dtype) for dtype in self.schema.values()]
+            self._fill = 0
+            self._consolidated = True
+
+    def __len__(self):
+        self._consolidate()
+        return len(self._columns[next(iter(self.schema))])
+
+    def __getitem__(self, column):
+        self._consolidate()
+        if column in self._columns:
+            return self._columns[column]
+        return self.derived[column](self)
+
+    def __setitem__(self, column, values):
+        '''Adds or replaces an extra column'''
+        if column in self.schema:
+            raise KeyError("Cannot replace stored column " + column)
+        values = np.asarray(values) if not isinstance(values, list) else object_array(values)
+        if len(values) != len(self):
+            raise ValueError("Column " + column + " does not match the length of the table")
+        self._columns[column] = values
+
+    def __contains__(self, column):
+        return column in self._columns or column in self.derived
+
+    def keys(self):
+        self._consolidate()
+        return list(self._columns) + [column for column in self.derived if column not in self._columns]
+
+    def stored_columns(self):
+        '''Stored and extra columns (without derived columns)'''
+        self._consolidate()
+        return dict(self._columns)
+
+    def as_dict(self, columns=None):
+        '''Dictionary of the given columns (all columns by default). Stored columns are returned without copying'''
+        if columns is None:
+            columns = self.keys()
+        return {column: self[column] for column in columns}
+
+    def filter(self, mask):
+        '''Keeps only the rows where mask is True'''
+        self._consolidate()
+        for column, values in self._columns.items():
+            self._columns[column] = values[mask]
+
+
+
+# -------------------------------------------------------------------
+# Table definitions. Times are stored as int64 ns relative to the first event of the trace
+
+EXECUTION_SCHEMA = {"name_id": np.int32, "start_ns": np.int64, "end_ns": np.int64,
+                    "logical_time": np.int64, "microstep": np.int64, "worker": np.int32}
+
+INSTANT_SCHEMA = {"name_id": np.int32, "logical_time": np.int64, "microstep": np.int64}
+
+
+def _name(table):
+    return table.categories.lookup("name", table["name_id"])
+
+def _y_axis(table):
+    return table.categories.y_axis[table["name_id"]]
+
+def _attribute(attribute):
+    return lambda table: table.categories.lookup(attribute, table["name_id"])
+
+def _constant(value):
+    return lambda table: np.full(len(table), value, dtype=object)
+
+def _exe_time_start(table):
+    return table["start_ns"] / 1000.0
+
+def _exe_time_end(table):
+    return table["end_ns"] / 1000.0
+
+def _inst_time(table):
+    return table["logical_time"].astype(np.float64)
+
+def _x_multi_line(table):
+    return np.column_stack((_exe_time_start(table), _exe_time_end(table))).tolist()
+
+def _y_multi_line(table):
+    y_axis = _y_axis(table)
+    return np.column_stack((y_axis, y_axis)).tolist()
+
+
+EXECUTION_DERIVED = {"name": _name, "time_start": _exe_time_start, "time_end": _exe_time_end, "trace_event_type": _constant("execution"),
+                     "priority": _attribute("priority"), "level": _attribute("level"), "triggers": _attribute("triggers"),
+                     "effects": _attribute("effects"), "x_multi_line": _x_multi_line, "y_multi_line": _y_multi_line, "y_axis": _y_axis}
+
+REACTION_DERIVED = {"name": _name, "reactor": _attribute("reactor"), "reaction": _attribute("reaction"), "time_start": _inst_time,
+                    "time_end": _inst_time, "trace_event_type": _constant("reaction"), "y_axis": _y_axis, "priority": _attribute("priority"),
+                    "level": _attribute("level"), "triggers": _attribute("triggers"), "effects": _attribute("effects")}
+
+ACTION_DERIVED = {"name": _name, "reactor": _attribute("reactor"), "reaction": _attribute("reaction"), "time_start": _inst_time,
+                  "time_end": _inst_time, "trace_event_type": _attribute("type"), "y_axis": _y_axis, "effects": _attribute("effects"),
+                  "triggers": _attribute("triggers")}
+
+
+def execution_table(categories, arrays=None):
+    '''Table of execution events (reaction_execution_starts/finishes pairs)'''
+    if arrays is not None:
+        return event_table.from_arrays(EXECUTION_SCHEMA, EXECUTION_DERIVED, categories, arrays)
+    return event_table(EXECUTION_SCHEMA, EXECUTION_DERIVED, categories)
+
+def reaction_table(categories, arrays=None):
+    '''Table of instantaneous reaction events (trigger_reaction, and scheduled startup/shutdown actions)'''
+    if arrays is not None:
+        return event_table.from_arrays(INSTANT_SCHEMA, REACTION_DERIVED, categories, arrays)
+    return event_table(INSTANT_SCHEMA, REACTION_DERIVED, categories)
+
+def action_table(categories, arrays=None):
+    '''Table of instantaneous action events (schedule_action)'''
+    if arrays is not None:
+        return event_table.from_arrays(INSTANT_SCHEMA, ACTION_DERIVED, categories, arrays)
+    return event_table(INSTANT_SCHEMA, ACTION_DERIVED, categories)
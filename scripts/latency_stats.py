@@ -0,0 +1,276 @@
+#!/usr/bin/python
+
+import array
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import io
+import json
+import tempfile
+
+import numpy as np
+
+from scripts import ctf_decoder
+from scripts.parallel_decode import stream_files, partition_streams
+from scripts.read_ctf import parser
+from scripts.sketch import ddsketch, DEFAULT_RELATIVE_ACCURACY
+from scripts.symbols import symbol_table
+from scripts.time_window import within_limits, babeltrace_bounds
+
+
+# Number of executions buffered before they are added to the sketches
+FLUSH_EVENTS = 1 << 16
+
+# Quantiles of the execution times reported for every reaction
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Columns of the statistics table (times in us)
+COLUMNS = ["name", "count", "total_ms", "mean_us", "p50_us", "p90_us", "p99_us", "max_us"]
+
+
+def sketch_durations(sketches, names, codes, durations, relative_accuracy):
+    '''Adds execution times (ns) to the sketches {name : ddsketch}, the name of each being names[code]'''
+    if len(codes) == 0:
+        return
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    durations = durations[order]
+    firsts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+    for code, values in zip(codes[firsts], np.split(durations, firsts[1:])):
+        name = names[code]
+        if name not in sketches:
+            sketches[name] = ddsketch(relative_accuracy)
+        sketches[name].add(values)
+
+
+def stream_partition(partition_path, limits=None, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    '''Reads a single-stream trace with Babeltrace, adding the execution times to one sketch per reaction as they are paired.
+    Only the executions in flight and a fixed-size buffer are held in memory. Returns the sketches and the starts and finishes
+    without a partner in this stream, keyed on (reaction, logical time, microstep), to be paired across streams'''
+    sketches = {}
+    names = []
+    codes = {}
+    buffered_codes = array.array("q")
+    buffered_durations = array.array("q")
+
+    def flush():
+        sketch_durations(sketches, names, np.frombuffer(buffered_codes, dtype=np.int64).copy(),
+                         np.frombuffer(buffered_durations, dtype=np.int64).copy(), relative_accuracy)
+        del buffered_codes[:]
+        del buffered_durations[:]
+
+    starts = {}
+    finishes = {}
+
+    # Imported only when decoding with Babeltrace, so that the native decoder runs without it
+    import bt2
+    fs_cc = bt2.find_plugin('ctf').source_component_classes['fs']
+    msg_it = bt2.TraceCollectionMessageIterator(bt2.ComponentSpec(fs_cc, {'inputs': [partition_path]}), **babeltrace_bounds(limits))
+
+    for msg in msg_it:
+        if type(msg) is bt2._EventMessageConst:
+            event = msg.event
+            if event.name != "reactor_cpp:reaction_execution_starts" and event.name != "reactor_cpp:reaction_execution_finishes":
+                continue
+
+            timestamp = msg.default_clock_snapshot.ns_from_origin
+            if limits is not None and not within_limits(limits, timestamp, int(event["timestamp_ns"])):
+                continue
+
+            key = (str(event["reaction_name"]), int(event["timestamp_ns"]), int(event["timestamp_microstep"]))
+            if event.name == "reactor_cpp:reaction_execution_starts":
+                starts[key] = timestamp
+                continue
+
+            start = starts.pop(key, None)
+            if start is None:
+                finishes[key] = timestamp
+                continue
+
+            code = codes.get(key[0])
+            if code is None:
+                code = codes[key[0]] = len(names)
+                names.append(key[0])
+            buffered_codes.append(code)
+            buffered_durations.append(timestamp - start)
+            if len(buffered_codes) >= FLUSH_EVENTS:
+                flush()
+
+    flush()
+    return {"sketches": sketches, "starts": starts, "finishes": finishes}
+
+
+def native_stream(ctf_path, stream, limits=None, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+    '''Same as stream_partition with the native decoder, which decodes a whole stream file at once (memory grows with the size of
+    a stream file, not of the trace)'''
+    partition = ctf_decoder.decode_stream(ctf_path, stream, limits)
+    names = [reactor_name + "." + reaction_name for reactor_name, reaction_name in partition["names"]]
+
+    sketches = {}
+    exe = partition["exe"]
+    sketch_durations(sketches, names, exe["name"], exe["end"] - exe["start"], relative_accuracy)
+
+    def keyed(columns, time_column):
+        return {(names[code], int(logical_time), int(microstep)): int(timestamp) for code, logical_time, microstep, timestamp
+                in zip(columns["name"], columns["logical_time"], columns["microstep"], columns[time_column])}
+
+    return {"sketches": sketches, "starts": keyed(partition["starts"], "start"), "finishes": keyed(partition["finishes"], "end")}
+
+
+
+class latency_stats:
+    '''Execution time statistics of every reaction (count, total, mean, quantiles and maximum), kept as one ddsketch per fully
+    qualified reaction name, so that memory does not grow with the length of the trace. Statistics of separate streams (or
+    separate runs) are combined with merge.'''
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.sketches = {}
+
+        # Starts and finishes waiting for their partner from another stream
+        self.starts = {}
+        self.finishes = {}
+
+    @classmethod
+    def load(cls, ctf_path, yaml_filepath, cache=None, jobs=1, native=False, window=None, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        '''Statistics of a trace: read from the parsed trace if it is in the trace_cache (with the same window), and streamed
+        from the CTF trace otherwise. Both leave out the redundant reactions (without triggers or effects)'''
+        if window is not None and not window.is_bounded():
+            window = None
+
+        if cache is not None:
+            cached = cache.load(ctf_path, yaml_filepath, str(window) if window is not None else "")
+            if cached is not None:
+                state, tables = cached
+                return cls.from_tables(tables["exe_events"], state["names"], relative_accuracy)
+
+        limits = None
+        if window is not None:
+            first_event = parser().find_first_event(ctf_path, native)
+            if first_event is not None:
+                limits = window.limits(*first_event)
+        return cls.from_trace(ctf_path, yaml_filepath, jobs, native, limits, relative_accuracy)
+
+    @classmethod
+    def from_trace(cls, ctf_path, yaml_filepath, jobs=1, native=False, limits=None, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        '''Streams the executions of a CTF trace, one stream file at a time (in parallel with jobs > 1). With limits (see
+        time_window.limits), only the executions within them are counted. The redundant reactions of the YAML file are left out,
+        as in the parsed trace'''
+        streams = stream_files(ctf_path)
+
+        # Reactions which have no triggers or effects, as found by the parser
+        yaml_parser = parser()
+        yaml_parser.redundant_reactions = []
+        yaml_parser.parse_yaml(yaml_filepath)
+        symbols = symbol_table.from_reaction_dict(yaml_parser.reaction_dict, yaml_parser.redundant_reactions)
+        hidden = [name for name, redundant in zip(symbols.names, symbols.redundant) if redundant]
+
+        stats = None
+        if native:
+            try:
+                ctf_decoder.open_trace(ctf_path)
+                stats = cls(relative_accuracy)
+                stats.merge_streams(native_stream, [ctf_path] * len(streams), streams, jobs, limits)
+            except ctf_decoder.unsupported_layout as error:
+                print("The native decoder does not support this trace (" + str(error) + "), decoding it with Babeltrace")
+                stats = None
+
+        if stats is None:
+            stats = cls(relative_accuracy)
+            with tempfile.TemporaryDirectory() as partitions_dir:
+                partition_paths = partition_streams(ctf_path, partitions_dir)
+                stats.merge_streams(stream_partition, partition_paths, None, jobs, limits)
+
+        for name in hidden:
+            stats.sketches.pop(name, None)
+        return stats
+
+    @classmethod
+    def from_tables(cls, exe_columns, names, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        '''Statistics of a parsed execution table ({"name_id", "start_ns", "end_ns"} columns, e.g. memory-mapped from the trace
+        cache), read in blocks of FLUSH_EVENTS rows'''
+        stats = cls(relative_accuracy)
+        for first in range(0, len(exe_columns["name_id"]), FLUSH_EVENTS):
+            block = slice(first, first + FLUSH_EVENTS)
+            sketch_durations(stats.sketches, names, np.asarray(exe_columns["name_id"][block]),
+                             np.asarray(exe_columns["end_ns"][block]) - np.asarray(exe_columns["start_ns"][block]), relative_accuracy)
+        return stats
+
+    def merge_streams(self, function, first_arguments, second_arguments, jobs, limits):
+        '''Merges the partial statistics returned by function for every stream'''
+        arguments = [first_arguments] + ([second_arguments] if second_arguments is not None else [])
+        count = len(first_arguments)
+        arguments += [[limits] * count, [self.relative_accuracy] * count]
+        if jobs > 1 and count > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for partial in executor.map(function, *arguments):
+                    self.merge_partial(partial)
+        else:
+            for partial in map(function, *arguments):
+                self.merge_partial(partial)
+
+    def merge_partial(self, partial):
+        '''Merges the sketches of a stream, and pairs its unmatched starts and finishes with those of the streams merged before'''
+        for name, sketch in partial["sketches"].items():
+            self.merge_sketch(name, sketch)
+
+        durations = []
+        names = []
+        for key, start in partial["starts"].items():
+            end = self.finishes.pop(key, None)
+            if end is None:
+                self.starts[key] = start
+            else:
+                names.append(key[0])
+                durations.append(end - start)
+        for key, end in partial["finishes"].items():
+            start = self.starts.pop(key, None)
+            if start is None:
+                self.finishes[key] = end
+            else:
+                names.append(key[0])
+                durations.append(end - start)
+        codes = np.arange(len(names), dtype=np.int64)
+        sketch_durations(self.sketches, names, codes, np.array(durations, dtype=np.int64), self.relative_accuracy)
+
+    def merge_sketch(self, name, sketch):
+        if name in self.sketches:
+            self.sketches[name].merge(sketch)
+        else:
+            self.sketches[name] = sketch
+
+    def merge(self, other):
+        '''Adds the statistics of another latency_stats'''
+        for name, sketch in other.sketches.items():
+            self.merge_sketch(name, sketch)
+
+    def table(self, names=None):
+        '''Statistics {column : values} of every reaction (of those kept by a name_filter if given), sorted by total execution
+        time'''
+        rows = []
+        for name, sketch in self.sketches.items():
+            if names is not None and not names.keeps(name):
+                continue
+            rows.append([name, sketch.count, sketch.total / 1e6, sketch.mean() / 1e3] +
+                        [sketch.quantile(q) / 1e3 for q in QUANTILES] + [sketch.max / 1e3])
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        return {column: [row[i] for row in rows] for i, column in enumerate(COLUMNS)}
+
+    def report(self, output_format="text", names=None):
+        '''The table as text, JSON or CSV'''
+        table = self.table(names)
+        rows = list(zip(*table.values()))
+        if output_format == "json":
+            return json.dumps([dict(zip(COLUMNS, row)) for row in rows], indent=1)
+        if output_format == "csv":
+            text = io.StringIO()
+            writer = csv.writer(text)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+            return text.getvalue()
+
+        width = max([len("reaction")] + [len(name) for name in table["name"]])
+        lines = [("%-" + str(width) + "s %10s %12s %12s %12s %12s %12s %12s") % ("reaction", "count", "total (ms)", "mean (us)", "p50 (us)",
+                                                                                 "p90 (us)", "p99 (us)", "max (us)")]
+        for row in rows:
+            lines.append(("%-" + str(width) + "s %10d %12.3f %12.3f %12.3f %12.3f %12.3f %12.3f") % row)
+        return "\n".join(lines)
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+# Quantiles of the lateness reported for every reaction
+QUANTILES = [0.5, 0.9, 0.99]
+
+# Number of late tags listed in the report
+REPORT_ROWS = 20
+
+
+
+class lateness:
+    '''Lateness of the executions of a trace: how long after its tag (logical time) each execution started in physical time.
+
+    The tables hold the start of every execution in ns since the first event of the trace (start_ns) and its logical time in ns
+    since the first tag (logical_time), so both clocks have the same unit but different origins. With alignment="min", the
+    origins are aligned so that the least late execution has a lateness of 0 (the physical clock is assumed to have reached some
+    tag in time). With alignment="first", the first event of the trace is assumed to be on time.'''
+
+    def __init__(self, exe_table, tags, alignment="min"):
+        self.name_ids = np.asarray(exe_table["name_id"])
+        self.exe_tags = np.asarray(exe_table["tag"])
+        lags = np.asarray(exe_table["start_ns"], dtype=np.int64) - np.asarray(exe_table["logical_time"], dtype=np.int64)
+
+        if alignment == "min":
+            self.offset = int(lags.min()) if len(lags) else 0
+        elif alignment == "first":
+            self.offset = 0
+        else:
+            raise ValueError("Unknown alignment " + str(alignment) + " (expected min or first)")
+
+        # Lateness of every execution (ns)
+        self.lateness = lags - self.offset
+
+        # Lateness of every tag, at the start of its first execution and at the end of its last one (0 for tags without executions)
+        self.tags = tags
+        started = tags.execution_count > 0
+        self.tag_start_lateness = np.where(started, tags.first_start_ns - tags.logical_time - self.offset, 0)
+        self.tag_end_lateness = np.where(started, tags.last_end_ns - tags.logical_time - self.offset, 0)
+
+    def late_tags(self, threshold_ns):
+        '''Ids of the tags whose first execution started more than threshold_ns after the tag, latest first'''
+        late = np.flatnonzero((self.tags.execution_count > 0) & (self.tag_start_lateness > threshold_ns))
+        return late[np.argsort(-self.tag_start_lateness[late], kind="stable")]
+
+    def reaction_table(self, names):
+        '''Lateness distribution {column : values} of every reaction with executions, in ms, sorted by its 99th percentile'''
+        # Sort the executions by reaction then lateness, so that the quantiles of each reaction are read at fixed offsets
+        order = np.lexsort((self.lateness, self.name_ids))
+        sorted_names = self.name_ids[order]
+        sorted_lateness = self.lateness[order]
+        firsts = np.flatnonzero(np.concatenate(([True], sorted_names[1:] != sorted_names[:-1]))) if len(order) else order
+        counts = np.diff(np.append(firsts, len(order)))
+
+        table = {"name": [names[code] for code in sorted_names[firsts]], "count": counts,
+                 "mean_ms": np.add.reduceat(sorted_lateness, firsts) / np.maximum(counts, 1) / 1e6 if len(order) else np.zeros(0)}
+        for q in QUANTILES:
+            table["p" + str(int(q * 100)) + "_ms"] = sorted_lateness[firsts + np.floor(q * (counts - 1)).astype(np.int64)] / 1e6
+        table["max_ms"] = sorted_lateness[firsts + counts - 1] / 1e6
+
+        rank = np.argsort(-table["p99_ms"], kind="stable")
+        return {column: [values[i] for i in rank] if isinstance(values, list) else values[rank] for column, values in table.items()}
+
+    def report(self, names, threshold_ns):
+        '''Text report of the lateness of every reaction and of the tags later than threshold_ns'''
+        reactions = self.reaction_table(names)
+        width = max([len("reaction")] + [len(name) for name in reactions["name"]])
+        lines = ["Lateness of the executions after their tag (clocks aligned with an offset of " + str(self.offset) + " ns)", "",
+                 ("%-" + str(width) + "s %10s %12s %12s %12s %12s %12s") % ("reaction", "count", "mean (ms)", "p50 (ms)", "p90 (ms)",
+                                                                            "p99 (ms)", "max (ms)")]
+        for row in zip(*reactions.values()):
+            lines.append(("%-" + str(width) + "s %10d %12.3f %12.3f %12.3f %12.3f %12.3f") % row)
+
+        late = self.late_tags(threshold_ns)
+        started = max(int(np.count_nonzero(self.tags.execution_count > 0)), 1)
+        lines.append("")
+        lines.append(str(len(late)) + " of " + str(started) + " tags started more than " + format(threshold_ns / 1e6, "g") + " ms late")
+        if len(late):
+            lines.append("%14s %10s %16s %16s" % ("logical time", "microstep", "start late (ms)", "end late (ms)"))
+            for tag in late[:REPORT_ROWS]:
+                lines.append("%14d %10d %16.3f %16.3f" % (self.tags.logical_time[tag], self.tags.microstep[tag],
+                                                         self.tag_start_lateness[tag] / 1e6, self.tag_end_lateness[tag] / 1e6))
+        return "\n".join(lines)
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+# Ratio between the bin widths of consecutive levels of detail
+LEVEL_FACTOR = 4
+
+
+
+class interval_index:
+    '''Intervals sorted by start time, with the running maximum of their end times, so that the intervals overlapping a range are
+    found with two binary searches'''
+
+    def __init__(self, starts, ends, rows):
+        order = np.argsort(starts, kind="stable")
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self.rows = rows[order]
+        self.max_ends = np.maximum.accumulate(self.ends) if len(order) else self.ends
+
+    def __len__(self):
+        return len(self.rows)
+
+    def query(self, begin, end):
+        '''Rows of the intervals overlapping [begin, end]'''
+        first = np.searchsorted(self.max_ends, begin, side="left")
+        last = np.searchsorted(self.starts, end, side="right")
+        if first >= last:
+            return self.rows[:0]
+        # Intervals after first may still end before begin (max_ends only bounds them)
+        return self.rows[first:last][self.ends[first:last] >= begin]
+
+
+
+class level_of_detail:
+    '''Range queries on intervals (executions, or instantaneous events with equal start and end), decimated to a given resolution.
+
+    The intervals are bucketed by duration, with bucket k holding the intervals lasting at least widths[k - 1] and less than
+    widths[k], each bucket being an interval_index. For a query at a resolution of pixel_width, the level is the smallest width
+    not below pixel_width: intervals lasting at least that width are returned individually, and shorter ones are merged into
+    bars, one per y-value and bin of that width holding more than one of them. A shorter interval alone in its bin (such as an
+    instantaneous event which does not collide with another one within a pixel) is returned individually as well. The bars of
+    each level are built on first use. Queries take two binary searches per bucket, and return at most about one bar or interval
+    per pixel and y-value'''
+
+    def __init__(self, starts, ends, y_values, finest_width):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.y_values = np.asarray(y_values)
+
+        # Bin widths of the levels, up to the length of the trace
+        span = float(self.ends.max() - self.starts.min()) if len(self.starts) else 0.0
+        self.widths = [float(finest_width)]
+        while self.widths[-1] < span:
+            self.widths.append(self.widths[-1] * LEVEL_FACTOR)
+        self.widths = np.array(self.widths)
+
+        # Duration bucket of every interval (the number of widths it lasts at least)
+        self.levels = np.searchsorted(self.widths, self.ends - self.starts, side="right")
+        rows = np.arange(len(self.starts))
+        self.buckets = [interval_index(self.starts[self.levels == level], self.ends[self.levels == level], rows[self.levels == level])
+                        for level in range(len(self.widths) + 1)]
+
+        # Bars of each level, built on first use {level : (bar columns, interval_index of the bars, interval_index of the short
+        # intervals alone in their bin)}
+        self._bars = {}
+
+    def query(self, begin, end, y_begin, y_end, pixel_width):
+        '''Returns the rows of the intervals within the x and y ranges which are shown individually, and the bars {"start", "end",
+        "y", "count"} merging the shorter ones'''
+        level = min(int(np.searchsorted(self.widths, pixel_width, side="left")) + 1, len(self.widths))
+
+        bars, bar_index, single_index = self.bars(level)
+
+        rows = np.concatenate([bucket.query(begin, end) for bucket in self.buckets[level:]] + [single_index.query(begin, end)])
+        rows = np.sort(rows[(self.y_values[rows] >= y_begin) & (self.y_values[rows] <= y_end)])
+
+        bar_rows = bar_index.query(begin, end)
+        bar_rows = bar_rows[(bars["y"][bar_rows] >= y_begin) & (bars["y"][bar_rows] <= y_end)]
+        return rows, {column: values[bar_rows] for column, values in bars.items()}
+
+    def bars(self, level):
+        '''Bars merging the intervals shorter than widths[level - 1], by y-value and bin of that width, and the index of the short
+        intervals which are alone in their bin (which are not merged)'''
+        if level not in self._bars:
+            width = self.widths[level - 1]
+            short = np.flatnonzero(self.levels < level)
+
+            # Sort the short intervals by (y-value, bin), and reduce each run of equal keys to a bar
+            bins = np.floor((self.starts[short] + self.ends[short]) / 2 / width).astype(np.int64)
+            y_values = self.y_values[short].astype(np.int64)
+            if len(short):
+                bins -= bins.min()
+                keys = (y_values - y_values.min()) * (bins.max() + 1) + bins
+            else:
+                keys = bins
+            order = np.argsort(keys, kind="stable")
+            short = short[order]
+            keys = keys[order]
+            firsts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(short) else short
+
+            if len(short):
+                bar_starts = np.minimum.reduceat(self.starts[short], firsts)
+                bar_ends = np.maximum.reduceat(self.ends[short], firsts)
+            else:
+                bar_starts = bar_ends = np.empty(0)
+            counts = np.diff(np.append(firsts, len(short)))
+
+            # Runs of a single interval are not merged
+            singles = short[firsts[counts == 1]]
+            merged = counts > 1
+            bar_starts = bar_starts[merged]
+            bar_ends = bar_ends[merged]
+            bars = {"start": bar_starts, "end": bar_ends, "y": self.y_values[short[firsts[merged]]], "count": counts[merged]}
+            self._bars[level] = (bars, interval_index(bar_starts, bar_ends, np.arange(len(bar_starts))),
+                                 interval_index(self.starts[singles], self.ends[singles], singles))
+        return self._bars[level]
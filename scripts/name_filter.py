@@ -0,0 +1,43 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+
+class name_filter:
+    '''Regex selecting reactions and actions by their fully qualified name: with include, only the names matching it are kept,
+    with exclude, the names matching it are removed. The regex is compiled once and evaluated once per name'''
+
+    def __init__(self, include=None, exclude=None):
+        # Too many args (user wants to include and exclude reactions at the same time)
+        if include and exclude:
+            raise TypeError("Too many arguments")
+
+        self.include = include
+        self.exclude = exclude
+        self.pattern = None
+        if include or exclude:
+            # Imported only when a regex is given, to keep the startup of the unfiltered runs short
+            import regex
+            self.pattern = regex.compile(include or exclude)
+
+    def is_active(self):
+        return self.pattern is not None
+
+    def keeps(self, name):
+        '''Whether the name passes the filter'''
+        if self.pattern is None:
+            return True
+        return (self.pattern.search(name) is not None) == bool(self.include)
+
+    def mask(self, names):
+        '''Boolean array of the names which pass the filter'''
+        return np.array([self.keeps(name) for name in names], dtype=np.bool_)
+
+    def __str__(self):
+        '''Description of the filter, used to key cached traces'''
+        if self.include:
+            return "include " + self.include
+        if self.exclude:
+            return "exclude " + self.exclude
+        return ""
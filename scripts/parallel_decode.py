@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+import os
+
+import numpy as np
+
+from scripts.event_store import event_table
+from scripts.time_window import within_limits, babeltrace_bounds
+
+
+# Partial columns built by each worker. Timestamps are absolute (ns from origin), as the start of the trace is only known once
+# all partitions are decoded
+EXE_SCHEMA = {"name": np.int32, "logical_time": np.int64, "microstep": np.int64, "start": np.int64, "end": np.int64, "worker": np.int32}
+START_SCHEMA = {"name": np.int32, "logical_time": np.int64, "microstep": np.int64, "start": np.int64, "worker": np.int32}
+FINISH_SCHEMA = {"name": np.int32, "logical_time": np.int64, "microstep": np.int64, "end": np.int64}
+INST_SCHEMA = {"name": np.int32, "logical_time": np.int64, "microstep": np.int64, "timestamp": np.int64, "is_reaction": np.bool_}
+
+
+def stream_files(ctf_path):
+    '''Names of the data stream files of a CTF trace (LTTng writes one per CPU and channel)'''
+    return sorted(f for f in os.listdir(ctf_path)
+                  if f != "metadata" and not f.startswith(".") and os.path.isfile(os.path.join(ctf_path, f)))
+
+
+def muxer_ranks(stream_keys):
+    '''Rank of each stream (in the order of stream_keys) in the order Babeltrace's muxer gives to messages with equal timestamps:
+    by stream id, then stream class id. stream_keys are (stream id, stream class id), None for streams without events (which
+    are ranked last). The given order is kept if some stream id is unknown'''
+    if any(key is not None and key[0] is None for key in stream_keys):
+        return list(range(len(stream_keys)))
+    order = sorted(range(len(stream_keys)), key=lambda index: (stream_keys[index] is None, stream_keys[index] or ()))
+    ranks = [0] * len(stream_keys)
+    for rank, index in enumerate(order):
+        ranks[index] = rank
+    return ranks
+
+
+def partition_streams(ctf_path, partitions_dir):
+    '''Creates one single-stream trace directory per stream file in partitions_dir, containing links to the metadata, the stream
+    file and its packet index. Returns the paths of the created directories'''
+    partition_paths = []
+    for stream in stream_files(ctf_path):
+        partition_path = os.path.join(partitions_dir, stream)
+        os.makedirs(partition_path)
+        os.symlink(os.path.abspath(os.path.join(ctf_path, "metadata")), os.path.join(partition_path, "metadata"))
+        os.symlink(os.path.abspath(os.path.join(ctf_path, stream)), os.path.join(partition_path, stream))
+
+        index_path = os.path.join(ctf_path, "index", stream + ".idx")
+        if os.path.isfile(index_path):
+            os.makedirs(os.path.join(partition_path, "index"))
+            os.symlink(os.path.abspath(index_path), os.path.join(partition_path, "index", stream + ".idx"))
+
+        partition_paths.append(partition_path)
+    return partition_paths
+
+
+def decode_partition(partition_path, limits=None):
+    '''Decodes a single-stream trace into partial columns. Names are encoded with codes local to the partition. With limits (see
+    time_window.limits), only the events within the limits are kept.
+
+    Executions are paired on (reaction, logical time, microstep), which identifies an execution independently of the stream it
+    was recorded in. Starts and finishes without a partner in this partition are returned separately, so that pairs crossing a
+    partition boundary can be matched when merging. The (stream id, stream class id) of the stream is returned as stream_key,
+    to order the events of different partitions with equal timestamps like the serial parse (see muxer_ranks).'''
+
+    # Local names [(reactor_name, reaction_name), ...] and their codes
+    names = []
+    codes = {}
+
+    def code(reactor_name, reaction_name):
+        name_code = codes.get((reactor_name, reaction_name))
+        if name_code is None:
+            name_code = len(names)
+            codes[(reactor_name, reaction_name)] = name_code
+            names.append((reactor_name, reaction_name))
+        return name_code
+
+    # Partial columns, grown in chunks
+    exe_events = event_table(EXE_SCHEMA, {}, None)
+    inst_events = event_table(INST_SCHEMA, {}, None)
+    finish_events = event_table(FINISH_SCHEMA, {}, None)
+    first_event = None
+    stream_key = None
+
+    # Starting messages waiting for their finishing message
+    execution_messages_dict = {}
+
+    # Imported only when decoding with Babeltrace, so that the native decoder (which uses stream_files and the schemas) runs
+    # without it
+    import bt2
+    fs_cc = bt2.find_plugin('ctf').source_component_classes['fs']
+    msg_it = bt2.TraceCollectionMessageIterator(bt2.ComponentSpec(fs_cc, {'inputs': [partition_path]}), **babeltrace_bounds(limits))
+
+    for msg in msg_it:
+        if type(msg) is bt2._EventMessageConst:
+            event = msg.event
+            timestamp = msg.default_clock_snapshot.ns_from_origin
+
+            if stream_key is None:
+                stream_key = (event.stream.id, event.stream.cls.id)
+
+            if limits is not None and not within_limits(limits, timestamp, int(event["timestamp_ns"])):
+                continue
+
+            if first_event is None:
+                first_event = (timestamp, int(event["timestamp_ns"]))
+
+            if (event.name == "reactor_cpp:reaction_execution_starts"):
+                reactor_name, reaction_name = str(event["reaction_name"]).rsplit(".", 1)
+                key = (code(reactor_name, reaction_name), int(event["timestamp_ns"]), int(event["timestamp_microstep"]))
+                execution_messages_dict[key] = (timestamp, int(event["worker_id"]))
+
+            elif (event.name == "reactor_cpp:reaction_execution_finishes"):
+                reactor_name, reaction_name = str(event["reaction_name"]).rsplit(".", 1)
+                key = (code(reactor_name, reaction_name), int(event["timestamp_ns"]), int(event["timestamp_microstep"]))
+                start = execution_messages_dict.pop(key, None)
+                if start is None:
+                    finish_events.append(*key, timestamp)
+                else:
+                    exe_events.append(*key, start[0], timestamp, start[1])
+
+            elif (event.name == "reactor_cpp:schedule_action"):
+                inst_events.append(code(str(event["reactor_name"]), str(event["action_name"])), int(event["timestamp_ns"]),
+                                   int(event["timestamp_microstep"]), timestamp, False)
+
+            elif (event.name == "reactor_cpp:trigger_reaction"):
+                inst_events.append(code(str(event["reactor_name"]), str(event["reaction_name"])), int(event["timestamp_ns"]),
+                                   int(event["timestamp_microstep"]), timestamp, True)
+
+    start_events = event_table(START_SCHEMA, {}, None)
+    for key, start in execution_messages_dict.items():
+        start_events.append(*key, *start)
+
+    return {"names": names,
+            "first_event": first_event,
+            "stream_key": stream_key,
+            "exe": exe_events.stored_columns(),
+            "starts": start_events.stored_columns(),
+            "finishes": finish_events.stored_columns(),
+            "inst": inst_events.stored_columns()}
+
+
+def columns(rows, schema):
+    '''Converts a list of row tuples (in the order of the schema) to a dictionary of typed column arrays'''
+    if not rows:
+        return {column: np.empty(0, dtype=dtype) for column, dtype in schema.items()}
+    return {column: np.array(values, dtype=dtype) for (column, dtype), values in zip(schema.items(), zip(*rows))}
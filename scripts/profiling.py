@@ -0,0 +1,193 @@
+#!/usr/bin/python
+
+from collections import Counter
+from contextlib import contextmanager
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+
+# Number of functions listed in the report of the sampling profiler
+TOP_FUNCTIONS = 30
+
+# Profiler the stages are recorded by (None when not profiling, which makes stage a no-op)
+active_profiler = None
+
+
+def reset_peak_rss():
+    '''Resets the peak RSS of the process (Linux only), so that the peak of each stage can be measured'''
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss():
+    '''Peak RSS of the process in bytes since the last reset (since the process started where it cannot be reset)'''
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+@contextmanager
+def stage(name):
+    '''Records the enclosed code as a stage of the active profiler. Yields the record of the stage, in which the number of events
+    it processed can be set (record["events"]) to report its throughput'''
+    if active_profiler is None:
+        yield {}
+    else:
+        with active_profiler.stage(name) as record:
+            yield record
+
+
+
+class sampling_profiler:
+    '''Samples the stack of a thread at a fixed interval from a background thread, counting the samples in which each function is
+    running (self) or on the stack (total), and the samples taken during each stage. Unlike cProfile, the overhead does not grow
+    with the number of function calls'''
+
+    def __init__(self, interval, current_stage, thread_id=None):
+        self.interval = interval
+        self.current_stage = current_stage
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.self_samples = Counter()
+        self.total_samples = Counter()
+        self.stage_samples = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.stage_samples[self.current_stage()] += 1
+            self.self_samples[self.location(frame)] += 1
+            on_stack = set()
+            while frame is not None:
+                on_stack.add(self.location(frame))
+                frame = frame.f_back
+            self.total_samples.update(on_stack)
+
+    def location(self, frame):
+        '''Function of a frame, with its file (relative to the working directory if it is below it) and first line'''
+        code = frame.f_code
+        filename = code.co_filename
+        if not filename.startswith("<") and not os.path.relpath(filename).startswith(".."):
+            filename = os.path.relpath(filename)
+        return "%s (%s:%d)" % (code.co_name, filename, code.co_firstlineno)
+
+    def report(self):
+        return {"interval_s": self.interval, "samples": self.samples, "stages": dict(self.stage_samples),
+                "self": [{"function": function, "samples": count, "share": count / max(self.samples, 1)}
+                         for function, count in self.self_samples.most_common(TOP_FUNCTIONS)],
+                "total": [{"function": function, "samples": count, "share": count / max(self.samples, 1)}
+                          for function, count in self.total_samples.most_common(TOP_FUNCTIONS)]}
+
+
+
+class stage_profiler:
+    '''Wall time, CPU time, peak RSS and (optionally) peak traced Python memory of the stages of a run. Stages nest, and are
+    reported in the order they start under their path ("parse/decode"). The peaks are reset when a stage starts, so the peak of a
+    stage includes those of the stages nested in it. Stages run in worker processes (-j) are only seen as a whole'''
+
+    def __init__(self, trace_memory=False, sample_interval=None):
+        self.trace_memory = trace_memory
+        self.sample_interval = sample_interval
+        self.stages = []
+        self.open_stages = []
+        self.sampler = None
+        self.start_time = None
+
+    def start(self):
+        '''Starts profiling, making this the profiler the stages are recorded by'''
+        global active_profiler
+        active_profiler = self
+        self.start_time = time.perf_counter()
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.sample_interval:
+            self.sampler = sampling_profiler(self.sample_interval, self.current_stage)
+            self.sampler.start()
+
+    def stop(self):
+        global active_profiler
+        active_profiler = None
+        self.total_seconds = time.perf_counter() - self.start_time
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.trace_memory:
+            tracemalloc.stop()
+
+    def current_stage(self):
+        open_stages = self.open_stages
+        return open_stages[-1]["stage"] if open_stages else ""
+
+    @contextmanager
+    def stage(self, name):
+        path = self.open_stages[-1]["stage"] + "/" + name if self.open_stages else name
+        record = {"stage": path, "children_peaks": []}
+        self.open_stages.append(record)
+        self.stages.append(record)
+        reset_peak_rss()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            record["cpu_seconds"] = time.process_time() - cpu_start
+            peaks = record.pop("children_peaks")
+            record["peak_rss_mb"] = max([peak_rss()] + [peak[0] for peak in peaks]) / 2**20
+            if self.trace_memory:
+                record["peak_traced_mb"] = max([tracemalloc.get_traced_memory()[1]] + [peak[1] for peak in peaks]) / 2**20
+            if record.get("events") is not None and record["seconds"] > 0:
+                record["events_per_second"] = record["events"] / record["seconds"]
+            self.open_stages.pop()
+            if self.open_stages:
+                self.open_stages[-1]["children_peaks"].append((record["peak_rss_mb"] * 2**20, record.get("peak_traced_mb", 0) * 2**20))
+
+    def report(self):
+        report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "argv": sys.argv, "python": platform.python_version(),
+                  "platform": platform.platform(), "total_seconds": self.total_seconds,
+                  # (resetting the peak RSS of a stage also resets that of the process, so the peak of the run is that of its stages)
+                  "peak_rss_mb": max([peak_rss() / 2**20] + [record["peak_rss_mb"] for record in self.stages if "peak_rss_mb" in record]),
+                  "stages": self.stages}
+        if self.sampler is not None:
+            report["sampling"] = self.sampler.report()
+        return report
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=1)
+
+    def summary(self):
+        '''Text table of the stages'''
+        lines = ["%-40s %10s %10s %12s %14s" % ("stage", "time (s)", "cpu (s)", "peak (MB)", "events/s")]
+        for record in self.stages:
+            depth = record["stage"].count("/")
+            lines.append("%-40s %10.3f %10.3f %12.1f %14s" % ("  " * depth + record["stage"].rsplit("/", 1)[-1], record["seconds"], record["cpu_seconds"],
+                                                             record["peak_rss_mb"], format(record["events_per_second"], ".0f") if "events_per_second" in record else ""))
+        return "\n".join(lines)
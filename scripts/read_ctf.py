@@ -8,41 +8,67 @@
 
 
 
-import bt2
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import tempfile
 import yaml
-import itertools
+import numpy as np
+
+from scripts.event_store import name_categories, execution_table, reaction_table, action_table
+from scripts.symbols import symbol_table
+from scripts import ctf_decoder
+from scripts.time_window import within_limits, babeltrace_bounds
+from scripts.parallel_decode import stream_files, partition_streams, decode_partition, muxer_ranks, columns, EXE_SCHEMA
+from scripts.profiling import stage
 import time
 
 
-pid_registry = {}
-tid_registry = {}
-
 class parser:
 
-    def get_ids(self, process, thread):
-        if process not in pid_registry:
-            pid_registry[process] = len(pid_registry) + 1
-            tid_registry[process] = {}
-        pid = pid_registry[process]
-        tid_reg = tid_registry[process]
-        if thread not in tid_reg:
-            tid_reg[thread] = len(tid_reg)
-        tid = tid_reg[thread]
-        return pid, tid
+    def parse(self, ctf_path, yaml_filepath, cache=None, jobs=1, native=False, window=None, names=None):
+        '''Parses the trace and YAML file. If a trace_cache is given, the parsed data is loaded from it when available (skipping
+        Babeltrace entirely), and stored in it otherwise. With jobs > 1, the stream files of the trace are decoded in parallel.
+        With native, the stream files are decoded by ctf_decoder instead of Babeltrace. With a time_window, only the events
+        within it are loaded. With a name_filter, the events of the reactions and actions it removes are not stored'''
 
+        if window is not None and not window.is_bounded():
+            window = None
+        if names is not None and not names.is_active():
+            names = None
+        variant = "; ".join(str(option) for option in (window, names) if option is not None)
+
+        if cache is not None:
+            with stage("cache_load"):
+                cached = cache.load(ctf_path, yaml_filepath, variant)
+                if cached is not None:
+                    self.set_state(*cached)
+            if cached is not None:
+                return
+
+        self.parse_trace(ctf_path, yaml_filepath, jobs, native, window, names)
+
+        if cache is not None:
+            with stage("cache_store"):
+                cache.store(ctf_path, yaml_filepath, *self.get_state(), variant=variant)
 
-    def parse(self, ctf_path, yaml_filepath):
-        
-        # Variables
-        self.x_offset = 0
 
+    def parse_trace(self, ctf_path, yaml_filepath, jobs=1, native=False, window=None, names=None):
+        
         # List of reactions which have no triggers or effects, which are removed from the visualisation
         self.redundant_reactions = []
 
         # Parse the YAML data from the file
-        self.parse_yaml(yaml_filepath)
-        self.yaml_data = self.reaction_dict
+        with stage("yaml"):
+            self.parse_yaml(yaml_filepath)
+            self.yaml_data = self.reaction_dict
+
+            # Integer ids of all reaction and action names, so that events are resolved with a single lookup
+            self.symbols = symbol_table.from_reaction_dict(self.reaction_dict, self.redundant_reactions)
+
+        # Whether the events of each symbol are left out: redundant reactions, and those removed by the name filter
+        self.name_filter = names
+        self.hidden = [redundant or (names is not None and not names.keeps(name))
+                       for name, redundant in zip(self.symbols.names, self.symbols.redundant)]
 
         # list of reactor names - [reactor.name0, reactor.name1, ...]
         self.y_axis_labels = []
@@ -56,8 +82,84 @@ class parser:
 
         # Get first reaction
         self.start_time = 0
+        self.start_time_ns = 0
         self.start_time_logical = 0
 
+        # Reaction and action names, encoded as integer codes in order of first appearance. The code is used as a provisional
+        # y-value: reaction labels are ordered by their first schedule_action/trigger_reaction event, which is only known at
+        # the end of the trace, so the y-values are assigned once parsing is done
+        self.categories = name_categories()
+
+        # Code of each symbol in categories (-1 until it first appears), and whether it has been added to the labels
+        self.name_ids = [-1] * len(self.symbols)
+        self.labelled = [False] * len(self.symbols)
+        
+        # Table containing all compiled data for each instantaneous event execution (reactions)
+        # Note: time_start is used for the x-axis, y-axis is the y value which is later substituted for a reaction name
+        self.ordered_inst_events_reactions = reaction_table(self.categories)
+
+        # Table containing all compiled data for each instantaneous event execution
+        self.ordered_inst_events_actions = action_table(self.categories)
+
+        # Table containing all compiled data for each execution event execution
+        # x_multi_line and y_multi_line contain nested lists with start and end x and y values respectively. These are used to draw the multilines
+        self.ordered_exe_events = execution_table(self.categories)
+
+        # Absolute limits of the events to load (None to load the whole trace). The window is relative to the first event of the
+        # trace, so the start times are found first, and kept when only part of the trace is decoded
+        self.window_limits = None
+        if window is not None:
+            with stage("first_event"):
+                first_event = self.find_first_event(ctf_path, native)
+            if first_event is not None:
+                self.start_time_ns, self.start_time_logical = first_event
+                self.start_time = self.start_time_ns / 1000.0
+                self.window_limits = window.limits(*first_event)
+
+        # Decode the trace, with the native decoder if requested (falling back to Babeltrace for layouts it does not support), in
+        # parallel if requested and the trace has more than one stream file
+        with stage("decode") as record:
+            if native and self.decode_trace_native(ctf_path, jobs):
+                pass
+            elif jobs > 1 and len(stream_files(ctf_path)) > 1:
+                self.decode_trace_parallel(ctf_path, jobs)
+            else:
+                self.decode_trace(ctf_path)
+            record["events"] = len(self.ordered_exe_events) + len(self.ordered_inst_events_reactions) + len(self.ordered_inst_events_actions)
+
+        with stage("labels"):
+            # Executions of reactions which never appeared in a schedule_action/trigger_reaction event are placed above all others
+            for event_name in self.categories.names:
+                self.add_to_reaction_labels(event_name)
+
+            # Assign the final label positions to the y-values
+            self.categories.set_y_axis(self.reactor_number)
+
+
+
+    def find_first_event(self, ctf_path, native=False):
+        '''(timestamp, logical time) of the first event of the trace, or None if the trace has no events'''
+        if native:
+            try:
+                return ctf_decoder.open_trace(ctf_path).first_event()
+            except ctf_decoder.unsupported_layout:
+                pass
+
+        # Imported only when decoding with Babeltrace, so that the native decoder runs without it
+        import bt2
+        fs_cc = bt2.find_plugin('ctf').source_component_classes['fs']
+        for msg in bt2.TraceCollectionMessageIterator(bt2.ComponentSpec(fs_cc, {'inputs': [ctf_path]})):
+            if type(msg) is bt2._EventMessageConst:
+                return msg.default_clock_snapshot.ns_from_origin, int(msg.event["timestamp_ns"])
+        return None
+
+
+    def decode_trace(self, ctf_path):
+        '''Decodes the trace into the event tables, in a single pass through Babeltrace'''
+
+        # Imported only when decoding with Babeltrace, so that the native decoder runs without it
+        import bt2
+
         # Find the `ctf` plugin (shipped with Babeltrace 2).
         ctf_plugin = bt2.find_plugin('ctf')
 
@@ -70,73 +172,52 @@ class parser:
         msg_it = bt2.TraceCollectionMessageIterator(bt2.ComponentSpec(fs_cc, {
             # Get the CTF trace path from the first command-line argument.
             'inputs': [ctf_path],
-        }))
+        }), **babeltrace_bounds(self.window_limits))
 
-        msg_it1, msg_it2, msg_it3 = itertools.tee(msg_it, 3)
-        
-        # Dictonary to match pairs of execution messages
+        # Dictonary to match pairs of execution messages. Only the fields needed from the starting message are kept
+        # (not the bt2 message itself), so that memory does not grow with the number of messages in the trace
         execution_messages_dict = {}
-        
-        # Dictionary containing all compiled data for each instantaneous event execution (reactions)
-        # Note: time_start is used for the x-axis, y-axis is the y value which is later substituted for a reaction name
-        self.ordered_inst_events_reactions = {"name": [], "reactor": [], "reaction": [], "time_start": [], "time_end": [], "trace_event_type": [], "y_axis": [],
-                                              "priority": [], "level": [], "triggers": [], "effects": [], "logical_time": [], "microstep": []}
 
-        # Dictionary containing all compiled data for each instantaneous event execution
-        self.ordered_inst_events_actions = {"name": [], "reactor": [], "reaction": [], "time_start": [], "time_end": [],
-                                            "trace_event_type": [], "y_axis": [], "effects": [], "triggers": [], "logical_time": [], "microstep": []}
+        # Stores whether the start times have been found (taken from the first event message, or before decoding for windows)
+        found_start_time = self.window_limits is not None
 
-        # Dictionary containing all compiled data for each execution event execution
-        # x_multi_line and y_multi_line contain nested lists with start and end x and y values respectively. These are used to draw the multilines
-        self.ordered_exe_events = {"name": [], "time_start": [], "time_end": [], "trace_event_type": [], "priority": [], "level": [], "triggers": [],
-                                "effects": [], "x_multi_line": [], "y_multi_line": [], "y_axis": [], "logical_time": [], "microstep": [], "worker": []}
-
-        
-        # Get the start times
-        for msg in msg_it1:
-            # `bt2._EventMessageConst` is the Python type of an event message.
-            if type(msg) is bt2._EventMessageConst:
-                self.start_time = self.get_timestamp_us(msg)
-                self.start_time_logical = int(msg.event["timestamp_ns"])
-                break
-        
-        # Get the labels of all reactions
-        for msg in msg_it2:
-            # `bt2._EventMessageConst` is the Python type of an event message.
-            if type(msg) is bt2._EventMessageConst:
-                event = msg.event
-                if (event.name == "reactor_cpp:schedule_action"):
-                    event_name = str(event["reactor_name"]) + "." + str(event["action_name"])
-                    if not event_name in self.redundant_reactions:
-                        self.add_to_reaction_labels(event_name)
-                
-                if (event.name == "reactor_cpp:trigger_reaction"):
-                    event_name = str(event["reactor_name"]) + "." + str(event["reaction_name"])
-                    if not event_name in self.redundant_reactions:
-                        self.add_to_reaction_labels(event_name)
-                
-        
-        # inverse of number_label dictionary. Gives the y-value (height) of the given reaction
-        self.reactor_number = {v: k for k, v in self.number_label.items()}
-
-        # Iterate the trace messages
-        for msg in msg_it3:
+        # Iterate the trace messages once, collecting the start time, labels and events together
+        for msg in msg_it:
 
             # `bt2._EventMessageConst` is the Python type of an event message.
             if type(msg) is bt2._EventMessageConst:
                 
                 event = msg.event
+
+                # Get the start times
+                if not found_start_time:
+                    self.start_time_ns = msg.default_clock_snapshot.ns_from_origin
+                    self.start_time = self.get_timestamp_us(msg)
+                    self.start_time_logical = int(event["timestamp_ns"])
+                    found_start_time = True
+
+                # Skip the events outside of the window
+                if self.window_limits is not None and not within_limits(self.window_limits, msg.default_clock_snapshot.ns_from_origin,
+                                                                        int(event["timestamp_ns"])):
+                    continue
                 
                 if (event.name == "reactor_cpp:reaction_execution_starts"):
                     
                     # Add the starting information to the dictionary
-                    execution_messages_dict[str(event["reaction_name"])] = msg
+                    execution_messages_dict[str(event["reaction_name"])] = (msg.default_clock_snapshot.ns_from_origin, int(event["timestamp_ns"]),
+                                                                             int(event["timestamp_microstep"]), int(event["worker_id"]))
                     
                 elif (event.name == "reactor_cpp:reaction_execution_finishes"):
                     
-                    msg_e = execution_messages_dict[str(event["reaction_name"])]
-                    
-                    self.write_execution_to_dict(msg_e, msg)
+                    rec_name = str(event["reaction_name"])
+
+                    # The starting message is missing if the execution started before the window
+                    start_info = execution_messages_dict.pop(rec_name, None)
+                    if start_info is not None:
+                        symbol = self.symbols.ids.get(rec_name)
+                        if symbol is None:
+                            symbol = self.get_symbol(*rec_name.rsplit(".", 1))
+                        self.write_execution_to_dict(symbol, start_info, msg.default_clock_snapshot.ns_from_origin)
                 
                 elif (event.name == "reactor_cpp:schedule_action"):
                     
@@ -146,59 +227,193 @@ class parser:
                     
                     self.write_event_to_dict(msg, True)
 
-        # order data for multiline graph
-        for start_time, end_time in zip(self.ordered_exe_events["time_start"], self.ordered_exe_events["time_end"]):
-            self.ordered_exe_events["x_multi_line"].append(
-                [start_time, end_time])
 
-        for y_value in self.ordered_exe_events["y_axis"]:
-            self.ordered_exe_events["y_multi_line"].append(
-                [y_value, y_value])
+    def decode_trace_parallel(self, ctf_path, jobs):
+        '''Decodes each stream file of the trace in a separate process, and merges the partial columns by timestamp. The result is
+        the same as decode_trace'''
+
+        with tempfile.TemporaryDirectory() as partitions_dir:
+            partition_paths = partition_streams(ctf_path, partitions_dir)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                partitions = list(executor.map(decode_partition, partition_paths, [self.window_limits] * len(partition_paths)))
+
+        self.merge_partitions(partitions, muxer_ranks([partition["stream_key"] for partition in partitions]))
+
+
+    def decode_trace_native(self, ctf_path, jobs):
+        '''Decodes the trace with the native decoder (see ctf_decoder), one stream file at a time, in parallel with jobs > 1.
+        Returns False, without storing anything, if the layout of the trace is not supported by the native decoder'''
+
+        try:
+            # Parse the metadata here first, so that unsupported traces are detected before starting the workers
+            ctf_decoder.open_trace(ctf_path)
 
+            streams = stream_files(ctf_path)
+            if jobs > 1 and len(streams) > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    partitions = list(executor.map(ctf_decoder.decode_stream, [ctf_path] * len(streams), streams,
+                                                   [self.window_limits] * len(streams)))
+            else:
+                partitions = [ctf_decoder.decode_stream(ctf_path, stream, self.window_limits) for stream in streams]
+        except ctf_decoder.unsupported_layout as error:
+            print("The native decoder does not support this trace (" + str(error) + "), decoding it with Babeltrace")
+            return False
+
+        self.merge_partitions(partitions, ctf_decoder.muxer_order(ctf_path))
+        return True
+
+
+    def merge_partitions(self, partitions, stream_ranks):
+        '''Merges the partial columns decoded from each stream file by timestamp. stream_ranks gives the order in which the
+        serial parse sees the events of the stream files which have equal timestamps (see parallel_decode.muxer_ranks)'''
+
+        for partition, rank in zip(partitions, stream_ranks):
+            partition["rank"] = rank
+        partitions = [partition for partition in partitions if partition["first_event"] is not None]
+        if not partitions:
+            return
+
+        # The start times are those of the earliest event in any partition (unless they were found before decoding a window)
+        if self.window_limits is None:
+            self.start_time_ns, self.start_time_logical = min(partition["first_event"] for partition in partitions)
+            self.start_time = self.start_time_ns / 1000.0
+
+        # Symbols of the local codes of each partition
+        for partition in partitions:
+            partition["symbols"] = np.array([self.get_symbol(reactor_name, name) for reactor_name, name in partition["names"]],
+                                            dtype=np.int32)
+
+        # Match the executions whose start and finish were decoded in different partitions
+        pending_starts = {}
+        for partition in partitions:
+            starts = partition["starts"]
+            for key_start in zip(partition["symbols"][starts["name"]].tolist(), starts["logical_time"].tolist(),
+                                 starts["microstep"].tolist(), starts["start"].tolist(), starts["worker"].tolist()):
+                pending_starts[key_start[:3]] = key_start[3:]
+
+        crossing_executions = []
+        crossing_ranks = []
+        for partition in partitions:
+            finishes = partition["finishes"]
+            for key_end in zip(partition["symbols"][finishes["name"]].tolist(), finishes["logical_time"].tolist(),
+                               finishes["microstep"].tolist(), finishes["end"].tolist()):
+                start = pending_starts.pop(key_end[:3], None)
+                if start is not None:
+                    crossing_executions.append(key_end[:3] + (start[0], key_end[3], start[1]))
+                    crossing_ranks.append(partition["rank"])
+        crossing = columns(crossing_executions, EXE_SCHEMA)
+
+        # Find when each symbol appears first: as an execution (at its finishing message, where the serial parse encounters it),
+        # or as an instantaneous event (which also orders the labels). Unmatched starts and finishes (of executions crossing the
+        # limits of a window) are not taken into account, as the serial parse drops them
+        never = np.iinfo(np.int64).max
+
+        def first_appearance(occurrences):
+            '''Timestamp and stream rank of the first of the occurrences [(symbols, timestamps, ranks), ...] of each symbol'''
+            first_time = np.full(len(self.symbols), never, dtype=np.int64)
+            first_rank = np.full(len(self.symbols), never, dtype=np.int64)
+            for symbols, timestamps, ranks in occurrences:
+                np.minimum.at(first_time, symbols, timestamps)
+            for symbols, timestamps, ranks in occurrences:
+                at_first = timestamps == first_time[symbols]
+                np.minimum.at(first_rank, symbols[at_first], np.broadcast_to(ranks, timestamps.shape)[at_first])
+            return first_time, first_rank
+
+        exe_occurrences = [(crossing["name"], crossing["end"], np.array(crossing_ranks, dtype=np.int64))]
+        inst_occurrences = []
+        for partition in partitions:
+            exe_occurrences.append((partition["symbols"][partition["exe"]["name"]], partition["exe"]["end"], partition["rank"]))
+            inst_occurrences.append((partition["symbols"][partition["inst"]["name"]], partition["inst"]["timestamp"], partition["rank"]))
+        first_seen, first_seen_rank = first_appearance(exe_occurrences + inst_occurrences)
+        first_label, first_label_rank = first_appearance(inst_occurrences)
+
+        # Assign codes and labels in order of first appearance (events with equal timestamps in the order of their stream files
+        # in the serial parse), leaving out hidden reactions
+        shown = ~np.array(self.hidden, dtype=np.bool_)
+        seen = np.flatnonzero((first_seen != never) & shown)
+        for symbol in seen[np.lexsort((first_seen_rank[seen], first_seen[seen]))].tolist():
+            self.get_name_id(symbol)
+        labelled = np.flatnonzero((first_label != never) & shown)
+        for symbol in labelled[np.lexsort((first_label_rank[labelled], first_label[labelled]))].tolist():
+            self.labelled[symbol] = True
+            self.add_to_reaction_labels(self.symbols.names[symbol])
+
+        # Map the symbols to the global codes (-1 for hidden reactions)
+        symbol_codes = np.array(self.name_ids, dtype=np.int32)
+        for partition in partitions:
+            partition["to_global"] = symbol_codes[partition["symbols"]]
+
+        # Merge the executions, ordered by the time they finished (then by the rank of the stream file they finished in)
+        exe_parts = [dict(partition["exe"], name=partition["to_global"][partition["exe"]["name"]],
+                          rank=np.full(len(partition["exe"]["end"]), partition["rank"], dtype=np.int64)) for partition in partitions]
+        exe_parts.append(dict(crossing, name=symbol_codes[crossing["name"]], rank=np.array(crossing_ranks, dtype=np.int64)))
+        exe = {column: np.concatenate([part[column] for part in exe_parts]) for column in exe_parts[0]}
+        order = np.lexsort((exe["rank"], exe["end"]))
+        order = order[exe["name"][order] >= 0]
+
+        self.ordered_exe_events = execution_table(self.categories, {
+            "name_id": exe["name"][order],
+            "start_ns": exe["start"][order] - self.start_time_ns,
+            "end_ns": exe["end"][order] - self.start_time_ns,
+            "logical_time": exe["logical_time"][order] - self.start_time_logical,
+            "microstep": exe["microstep"][order],
+            "worker": exe["worker"][order]})
+
+        # Merge the instantaneous events, ordered by timestamp (then stream file rank). Startup and shutdown actions are shown as reactions
+        inst = {column: np.concatenate([partition["inst"][column] for partition in partitions]) for column in partitions[0]["inst"]}
+        inst["symbol"] = np.concatenate([partition["symbols"][partition["inst"]["name"]] for partition in partitions])
+        inst["name"] = symbol_codes[inst["symbol"]]
+        inst["rank"] = np.concatenate([np.full(len(partition["inst"]["timestamp"]), partition["rank"], dtype=np.int64) for partition in partitions])
+        order = np.lexsort((inst["rank"], inst["timestamp"]))
+        order = order[inst["name"][order] >= 0]
+
+        startup_shutdown = np.array(self.symbols.startup_shutdown, dtype=np.bool_)
+        is_reaction = inst["is_reaction"][order] | startup_shutdown[inst["symbol"][order]]
+
+        def instant_arrays(rows):
+            return {"name_id": inst["name"][rows],
+                    "logical_time": inst["logical_time"][rows] - self.start_time_logical,
+                    "microstep": inst["microstep"][rows]}
+
+        self.ordered_inst_events_reactions = reaction_table(self.categories, instant_arrays(order[is_reaction]))
+        self.ordered_inst_events_actions = action_table(self.categories, instant_arrays(order[~is_reaction]))
 
 
     def get_timestamp_us(self, msg):
         timestamp_ns = msg.default_clock_snapshot.ns_from_origin
         return timestamp_ns / 1000.0
 
-    def write_execution_to_dict(self, msg_b, msg_e):
-        # msg_b - beginning message 
-        # msg_e - end message
-        
-        event_b = msg_b.event
+    def get_symbol(self, reactor_name, name):
+        '''Returns the symbol of a (reactor, reaction or action) pair, adding it if it is not in the YAML file'''
+        symbol = self.symbols.pair_ids.get((reactor_name, name))
+        if symbol is None:
+            symbol = self.symbols.add(reactor_name, name)
+            self.name_ids.append(-1)
+            self.labelled.append(False)
+            self.hidden.append(self.name_filter is not None and not self.name_filter.keeps(self.symbols.names[symbol]))
+        return symbol
+
+    def get_name_id(self, symbol):
+        '''Returns the code of a reaction or action, adding it and its YAML attributes on first appearance'''
+        name_id = self.name_ids[symbol]
+        if name_id < 0:
+            name_id = self.categories.add(self.symbols.names[symbol], self.symbols.attribute_row(symbol))
+            self.name_ids[symbol] = name_id
+        return name_id
+
+    def write_execution_to_dict(self, symbol, start_info, time_end):
+        # symbol - symbol of the reaction
+        # start_info - (start time, logical time, microstep, worker) of the beginning message
+        # time_end - time of the end message (ns)
         
-        rec_name = str(event_b["reaction_name"])
-        
-        rev_name = rec_name[::-1]
-        a, b = rev_name.split(".", 1)
-        reactor_name = b[::-1]
-        reaction_name = a[::-1]
-
-        # leave function if reaction is redundant
-        if rec_name in self.redundant_reactions:
+        # leave function if reaction is redundant or filtered out
+        if self.hidden[symbol]:
             return
+
+        time_start, logical_time, microstep, worker = start_info
         
-        reaction_yaml_data = self.yaml_data[reactor_name][reaction_name]
-        
-        self.ordered_exe_events["name"].append(rec_name)
-        self.ordered_exe_events["time_start"].append(self.get_timestamp_us(msg_b) - self.start_time)
-        self.ordered_exe_events["time_end"].append(self.get_timestamp_us(msg_e) - self.start_time)
-        self.ordered_exe_events["y_axis"].append(self.reactor_number[rec_name])
-        self.ordered_exe_events["trace_event_type"].append("execution")
-        self.ordered_exe_events["logical_time"].append(int(event_b["timestamp_ns"]) - self.start_time_logical)
-        self.ordered_exe_events["microstep"].append(int(event_b["timestamp_microstep"]))
-        self.ordered_exe_events["worker"].append(int(event_b["worker_id"]))
-
-        # YAML Data
-        attribute_list = ["priority",
-                        "level", "triggers", "effects"]
-        # YAML Data
-        for attribute in attribute_list:
-            if attribute in reaction_yaml_data:
-                self.ordered_exe_events[attribute].append(
-                    reaction_yaml_data[attribute])
-            else:
-                self.ordered_exe_events[attribute].append("n.a.")
+        self.ordered_exe_events.append(self.get_name_id(symbol), time_start - self.start_time_ns, time_end - self.start_time_ns,
+                                       logical_time - self.start_time_logical, microstep, worker)
         
         
     def write_event_to_dict(self, msg, is_reaction):
@@ -207,63 +422,93 @@ class parser:
         # name and timestart of reaction
         reactor_name = str(event["reactor_name"])
         reaction_name = ""
-        ordered_inst_events_dict = {}
+        ordered_inst_events_table = None
         
         if is_reaction:
             reaction_name = str(event["reaction_name"])
-            ordered_inst_events_dict = self.ordered_inst_events_reactions
+            ordered_inst_events_table = self.ordered_inst_events_reactions
         else:
             reaction_name = str(event["action_name"])
-            ordered_inst_events_dict = self.ordered_inst_events_actions
+            ordered_inst_events_table = self.ordered_inst_events_actions
 
-        reactor_reaction_name = reactor_name + "." + reaction_name
+        symbol = self.get_symbol(reactor_name, reaction_name)
         
-        # leave function if reaction is redundant
-        if reactor_reaction_name in self.redundant_reactions:
+        # leave function if reaction is redundant or filtered out
+        if self.hidden[symbol]:
             return
-        
-        time_start = float(event["timestamp_ns"]) - self.start_time_logical
 
-        reaction_yaml_data = self.yaml_data[reactor_name][reaction_name]
+        # Add the reaction to the labels, in order of first appearance
+        if not self.labelled[symbol]:
+            self.labelled[symbol] = True
+            self.add_to_reaction_labels(self.symbols.names[symbol])
+
+        name_id = self.get_name_id(symbol)
 
         # special case for startup and shutdown
-        if not is_reaction:
-            if reaction_yaml_data["type"] == "startup" or reaction_yaml_data["type"] == "shutdown":
-                is_reaction = True
-                ordered_inst_events_dict = self.ordered_inst_events_reactions
-
-        ordered_inst_events_dict["name"].append(reactor_reaction_name)
-        ordered_inst_events_dict["reactor"].append(reactor_name)
-        ordered_inst_events_dict["reaction"].append(reaction_name)
-        ordered_inst_events_dict["time_start"].append(time_start)
-        ordered_inst_events_dict["time_end"].append(time_start)  # same for instant events
-        ordered_inst_events_dict["y_axis"].append(self.reactor_number[reactor_reaction_name] + self.x_offset)
-        ordered_inst_events_dict["effects"].append(reaction_yaml_data["effects"])
-        ordered_inst_events_dict["triggers"].append(reaction_yaml_data["triggers"])
-        ordered_inst_events_dict["logical_time"].append(int(event["timestamp_ns"])- self.start_time_logical)
-        ordered_inst_events_dict["microstep"].append(int(event["timestamp_microstep"]))
-        
-        if is_reaction:
-            ordered_inst_events_dict["trace_event_type"].append("reaction")
-            
-            # YAML Data
-            attribute_list = ["priority", "level"]
-            
-            for attribute in attribute_list:
-                if attribute in reaction_yaml_data:
-                    ordered_inst_events_dict[attribute].append(reaction_yaml_data[attribute])
-                else:
-                    ordered_inst_events_dict[attribute].append("n.a.")
-            
-        else:
-            ordered_inst_events_dict["trace_event_type"].append(
-                reaction_yaml_data["type"])
+        if not is_reaction and self.symbols.startup_shutdown[symbol]:
+            ordered_inst_events_table = self.ordered_inst_events_reactions
+
+        ordered_inst_events_table.append(name_id, int(event["timestamp_ns"]) - self.start_time_logical, int(event["timestamp_microstep"]))
         
     
+    def get_state(self):
+        '''Returns the parsed data as a JSON serialisable dictionary (start times, labels and YAML topology) and the stored columns
+        of each event table'''
+        state = {"start_time": self.start_time,
+                 "start_time_ns": self.start_time_ns,
+                 "start_time_logical": self.start_time_logical,
+                 "y_axis_labels": self.y_axis_labels,
+                 "redundant_reactions": self.redundant_reactions,
+                 "reaction_dict": self.reaction_dict,
+                 "action_names": self.action_names,
+                 "reactor_name": self.reactor_name,
+                 "dependency_dict": dict(self.dependency_dict),
+                 "port_dict": dict(self.port_dict),
+                 "names": self.categories.names,
+                 "attributes": self.categories.attributes}
+
+        tables = {"exe_events": self.ordered_exe_events.stored_columns(),
+                  "inst_events_reactions": self.ordered_inst_events_reactions.stored_columns(),
+                  "inst_events_actions": self.ordered_inst_events_actions.stored_columns()}
+
+        return state, tables
+
+    def set_state(self, state, tables):
+        '''Restores the parsed data returned by get_state'''
+        self.start_time = state["start_time"]
+        self.start_time_ns = state["start_time_ns"]
+        self.start_time_logical = state["start_time_logical"]
+        self.redundant_reactions = state["redundant_reactions"]
+        self.reaction_dict = state["reaction_dict"]
+        self.yaml_data = self.reaction_dict
+        self.symbols = symbol_table.from_reaction_dict(self.reaction_dict, self.redundant_reactions)
+        self.action_names = state["action_names"]
+        self.reactor_name = state["reactor_name"]
+        self.dependency_dict = defaultdict(list, state["dependency_dict"])
+        self.port_dict = defaultdict(list, state["port_dict"])
+
+        self.y_axis_labels = []
+        self.reactor_number = {}
+        self.number_label = {}
+        for event_name in state["y_axis_labels"]:
+            self.add_to_reaction_labels(event_name)
+
+        self.categories = name_categories()
+        self.categories.names = state["names"]
+        self.categories.codes = {name: code for code, name in enumerate(self.categories.names)}
+        self.categories.attributes = state["attributes"]
+        self.categories.set_y_axis(self.reactor_number)
+
+        self.ordered_exe_events = execution_table(self.categories, tables["exe_events"])
+        self.ordered_inst_events_reactions = reaction_table(self.categories, tables["inst_events_reactions"])
+        self.ordered_inst_events_actions = action_table(self.categories, tables["inst_events_actions"])
+
+
     def add_to_reaction_labels(self, event_name):
-        if event_name not in self.y_axis_labels:
+        if event_name not in self.reactor_number:
             self.number_label[len(
                 self.y_axis_labels)] = event_name
+            self.reactor_number[event_name] = len(self.y_axis_labels)
 
             # Add reactor name to list
             self.y_axis_labels.append(event_name)
@@ -396,18 +641,21 @@ class parser:
         return self.reactor_name
     
     def get_reaction_pos(self, reaction_name, prev_reaction_time, react_dict):
-        '''Given some reaction and its start time, find its position in the dictionary of reactions'''
+        '''Given some reaction and its start time, find its position in the table of reactions'''
 
         reaction_pos = None
 
-        for i in range(len(react_dict["name"])):
+        names = react_dict["name"]
+        times = react_dict["time_start"]
+
+        for i in range(len(names)):
 
             # Time of the current reaction
-            i_time = react_dict["time_start"][i]
+            i_time = times[i]
 
             # Find the first reaction which matches the given name and has a start time greater than the given time
             if i_time >= prev_reaction_time:
-                i_name = react_dict["name"][i]
+                i_name = names[i]
                 if reaction_name == i_name:
                     reaction_pos = i
                     break
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+
+from bokeh.application import Application
+from bokeh.application.handlers.function import FunctionHandler
+from bokeh.events import RangesUpdate
+from bokeh.models import ColumnDataSource, HoverTool, Panel, Tabs, PrintfTickFormatter
+from bokeh.plotting import figure
+from bokeh.server.server import Server
+import numpy as np
+
+from scripts.level_of_detail import level_of_detail
+
+
+# Width of the plots (in pixels) assumed until the browser has reported it
+DEFAULT_PLOT_WIDTH = 1200
+
+# Finest bin width of the levels of detail (x-values of executions are in us, and of instantaneous events in ns)
+FINEST_WIDTH = 0.001
+
+# Columns sent to the browser for each individually shown event
+EXE_COLUMNS = ["name_id", "tag", "time_start", "time_end", "y_axis", "worker", "logical_time", "microstep"]
+INSTANT_COLUMNS = ["name_id", "tag", "logical_time", "y_axis", "microstep"]
+
+
+
+class trace_server:
+    '''Bokeh server application showing a parsed trace (a visualisers instance) at a level of detail matching the visible range.
+    On every pan or zoom, only the events in the range are sent to the browser: events longer than a pixel individually, and
+    shorter ones merged into bars counting them where more than one falls in the same pixel and row (see level_of_detail). The range queries use sorted time indices, so their cost
+    depends on the number of events shown rather than on the size of the trace.'''
+
+    def __init__(self, vis):
+        self.vis = vis
+
+        exe = vis.ordered_exe_events.as_dict(EXE_COLUMNS)
+        reactions = vis.ordered_inst_events_reactions.as_dict(INSTANT_COLUMNS)
+        actions = vis.ordered_inst_events_actions.as_dict(INSTANT_COLUMNS)
+
+        # Layers of each view: (columns of the events, level of detail index, y column). Instantaneous events are indexed as
+        # intervals of length 0
+        self.layers = {"reactions": {"exe": (exe, level_of_detail(exe["time_start"], exe["time_end"], exe["y_axis"], FINEST_WIDTH), "y_axis"),
+                                     "reaction": (reactions, self.instant_index(reactions), "y_axis"),
+                                     "action": (actions, self.instant_index(actions), "y_axis")},
+                       "workers": {"exe": (exe, level_of_detail(exe["time_start"], exe["time_end"], exe["worker"], FINEST_WIDTH), "worker")}}
+
+    def instant_index(self, columns):
+        logical_times = columns["logical_time"].astype(np.float64)
+        return level_of_detail(logical_times, logical_times, columns["y_axis"], FINEST_WIDTH)
+
+    def serve(self, port=5006, show=True):
+        '''Runs the server until interrupted, opening the application in a browser if show is set'''
+        server = Server({"/": Application(FunctionHandler(self.make_document))}, port=port)
+        server.start()
+        print("Serving the trace on http://localhost:" + str(port) + "/")
+        if show:
+            server.io_loop.add_callback(server.show, "/")
+        server.io_loop.start()
+
+    def make_document(self, doc):
+        '''Builds the plots of a browser session'''
+        colours = self.vis.tag_colours()
+        metadata = {"@name_id": self.vis.metadata_hover()}
+
+        tooltips_executions = [("name", "@name_id{name}"), ("time_start", "@time_start{0,0.00}"), ("time_end", "@time_end{0,0.00}"),
+                               ("priority", "@name_id{priority}"), ("level", "@name_id{level}"), ("logical_time", "@logical_time"),
+                               ("microstep", "@microstep")]
+        tooltips_instants = [("name", "@name_id{name}"), ("time_start", "@logical_time{0,0.00}"), ("logical_time", "@logical_time"),
+                             ("microstep", "@microstep")]
+        tooltips_bars = [("merged events", "@count"), ("from", "@start{0,0.00}"), ("to", "@end{0,0.00}")]
+
+        panels = []
+        for view, layers in self.layers.items():
+            # Fixed ranges (instead of data ranges), so that the plot does not rescale when the events it shows change
+            x0, x1, y0, y1 = self.extent(view)
+            plot = figure(sizing_mode="stretch_both", title=self.vis.graph_name + " (" + view + ")", x_range=(x0, x1), y_range=(y0, y1))
+            sources = {}
+            for layer, (columns, lod, y_column) in layers.items():
+                source = ColumnDataSource({column: values[:0] for column, values in columns.items()})
+                bar_source = ColumnDataSource({"start": [], "end": [], "y": [], "count": []})
+                sources[layer] = (source, bar_source)
+
+                if layer == "exe":
+                    renderer = plot.segment(x0="time_start", y0=y_column, x1="time_end", y1=y_column, width=8, color=colours,
+                                            hover_alpha=0.5, source=source, legend_label="Execution Events", muted_alpha=0.2)
+                    plot.add_tools(HoverTool(tooltips=tooltips_executions, renderers=[renderer], formatters=metadata))
+                    bars = plot.segment(x0="start", y0="y", x1="end", y1="y", width=8, color="grey", hover_alpha=0.5, source=bar_source,
+                                        legend_label="Merged Execution Events", muted_alpha=0.2)
+                else:
+                    marker = plot.hex if layer == "reaction" else plot.inverted_triangle
+                    renderer = marker(x="logical_time", y=y_column, fill_color=colours, line_color="lightgrey", size=10, source=source,
+                                      legend_label=layer.capitalize() + "s", muted_alpha=0.2)
+                    plot.add_tools(HoverTool(tooltips=tooltips_instants, renderers=[renderer], formatters=metadata))
+                    bars = marker(x="start", y="y", fill_color="grey", line_color="lightgrey", size=10, source=bar_source,
+                                  legend_label="Merged " + layer.capitalize() + "s", muted_alpha=0.2)
+                plot.add_tools(HoverTool(tooltips=tooltips_bars, renderers=[bars]))
+
+            plot.legend.location = "top_left"
+            plot.legend.click_policy = "mute"
+            plot.xaxis[0].formatter = PrintfTickFormatter(format="%f")
+            plot.xaxis.axis_label = "Time (ms)"
+            if view == "reactions":
+                plot.yaxis.ticker = list(range(len(self.vis.labels)))
+                plot.yaxis.major_label_overrides = {k: v.split(".", 1)[1] for k, v in self.vis.number_labels.items()}
+                plot.yaxis.axis_label = "Reaction Name"
+            else:
+                plot.yaxis.axis_label = "Worker"
+
+            def update(event, plot=plot, view=view, sources=sources):
+                self.update(plot, view, sources, event.x0, event.x1, event.y0, event.y1)
+
+            plot.on_event(RangesUpdate, update)
+            self.update(plot, view, sources, x0, x1, y0, y1)
+            panels.append(Panel(child=plot, title=view))
+
+        doc.add_root(Tabs(tabs=panels))
+        doc.title = self.vis.graph_name
+
+    def extent(self, view):
+        '''(x0, x1, y0, y1) covering all events of a view'''
+        starts = [lod.starts.min() for columns, lod, y_column in self.layers[view].values() if len(lod.starts)]
+        ends = [lod.ends.max() for columns, lod, y_column in self.layers[view].values() if len(lod.ends)]
+        y_values = [lod.y_values.max() for columns, lod, y_column in self.layers[view].values() if len(lod.y_values)]
+        if not starts:
+            return 0.0, 1.0, 0.0, 1.0
+        return float(min(starts)), float(max(ends)), -1.0, float(max(y_values)) + 1.0
+
+    def update(self, plot, view, sources, x0, x1, y0, y1):
+        '''Sends the events of a view within the given range to the browser'''
+        if x0 is None or x1 is None:
+            return
+        if y0 is None or y1 is None:
+            y0, y1 = -np.inf, np.inf
+        pixel_width = (x1 - x0) / (plot.inner_width or DEFAULT_PLOT_WIDTH)
+
+        for layer, (columns, lod, y_column) in self.layers[view].items():
+            rows, bars = lod.query(x0, x1, y0, y1, pixel_width)
+            source, bar_source = sources[layer]
+            source.data = {column: values[rows] for column, values in columns.items()}
+            bar_source.data = bars
@@ -0,0 +1,120 @@
+#!/usr/bin/python
+
+import math
+
+import numpy as np
+
+
+# Relative accuracy of the quantiles returned by the sketches
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+
+
+class ddsketch:
+    '''Quantile sketch of positive values (DDSketch): values are counted in buckets whose bounds grow geometrically by gamma, so
+    that every quantile is returned within the relative accuracy alpha, whatever the distribution. Buckets are stored as a dense
+    array of counts from the smallest bucket seen, which stays small for durations (about 1400 buckets from 1 ns to 1000 s at 1%).
+    Sketches with the same accuracy merge exactly, by adding their counts, so sketches built in parallel can be combined.'''
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+
+        # counts[i] is the number of values in bucket offset + i, i.e. in (gamma^(offset + i - 1), gamma^(offset + i)]
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.offset = 0
+
+        # Values which are not positive have no bucket
+        self.zero_count = 0
+
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __len__(self):
+        return self.count
+
+    def bucket(self, values):
+        '''Bucket index of positive values'''
+        return np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+
+    def add(self, values):
+        '''Adds an array of values'''
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive):
+            buckets = self.bucket(positive)
+            first = int(buckets.min())
+            self.grow(first, int(buckets.max()))
+            self.counts += np.bincount(buckets - self.offset, minlength=len(self.counts))
+
+    def grow(self, first, last):
+        '''Extends the bucket array to cover the buckets first to last'''
+        if len(self.counts) == 0:
+            self.offset = first
+            self.counts = np.zeros(last - first + 1, dtype=np.int64)
+            return
+        new_offset = min(self.offset, first)
+        new_end = max(self.offset + len(self.counts), last + 1)
+        if new_offset != self.offset or new_end != self.offset + len(self.counts):
+            counts = np.zeros(new_end - new_offset, dtype=np.int64)
+            counts[self.offset - new_offset:self.offset - new_offset + len(self.counts)] = self.counts
+            self.counts = counts
+            self.offset = new_offset
+
+    def merge(self, other):
+        '''Adds the values counted by another sketch with the same accuracy'''
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches with different accuracies cannot be merged")
+        if other.count == 0:
+            return
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.zero_count += other.zero_count
+        if len(other.counts):
+            self.grow(other.offset, other.offset + len(other.counts) - 1)
+            self.counts[other.offset - self.offset:other.offset - self.offset + len(other.counts)] += other.counts
+
+    def quantile(self, q):
+        '''Value of quantile q (between 0 and 1), within the relative accuracy (nan for an empty sketch)'''
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0) if self.min <= 0 else 0.0
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank - self.zero_count, side="right"))
+        # Middle of the bucket in relative terms, which is within alpha of every value of the bucket
+        value = 2 * self.gamma ** (self.offset + bucket) / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else math.nan
+
+    def to_dict(self):
+        '''JSON serialisable form of the sketch'''
+        return {"relative_accuracy": self.relative_accuracy, "offset": self.offset, "counts": self.counts.tolist(),
+                "zero_count": self.zero_count, "count": self.count, "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.offset = data["offset"]
+        sketch.counts = np.array(data["counts"], dtype=np.int64)
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
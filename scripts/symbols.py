@@ -0,0 +1,69 @@
+#!/usr/bin/python
+
+# YAML attributes of reactions and actions shown in the visualisation
+ATTRIBUTES = ["priority", "level", "triggers", "effects", "type"]
+
+
+
+class symbol_table:
+    '''Dense integer ids (symbols) for the fully qualified names of all reactions and actions, built once from the YAML file.
+    Events are resolved to a symbol with a single dictionary lookup, and everything else about the name (its parts, YAML
+    attributes, whether it is redundant or a startup/shutdown action) is read from lists indexed by the symbol.
+    Names found in the trace but not in the YAML file are added when they first appear, with "n.a." attributes.'''
+
+    def __init__(self):
+        # Fully qualified name of each symbol - [reactor.name0, reactor.name1, ...]
+        self.names = []
+
+        # inverse of names - {reactor.name0 : 0, reactor.name1 : 1, ...}
+        self.ids = {}
+
+        # Symbols by (reactor, name) pairs, as given by schedule_action/trigger_reaction events
+        self.pair_ids = {}
+
+        # Attributes of each symbol, as lists indexed by symbol {attribute : [value_0, value_1, ...]}
+        self.attributes = {attribute: [] for attribute in ["reactor", "reaction"] + ATTRIBUTES}
+
+        # Whether each symbol has neither triggers nor effects (these are removed from the visualisation)
+        self.redundant = []
+
+        # Whether each symbol is a startup or shutdown action (which are shown as reactions)
+        self.startup_shutdown = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, reactor_name, name, yaml_data=None, redundant=False):
+        '''Returns the symbol of a reaction or action, adding it with its YAML data on first appearance'''
+        symbol = self.pair_ids.get((reactor_name, name))
+        if symbol is None:
+            symbol = len(self.names)
+            full_name = reactor_name + "." + name
+            self.names.append(full_name)
+            self.ids[full_name] = symbol
+            self.pair_ids[(reactor_name, name)] = symbol
+
+            if yaml_data is None:
+                yaml_data = {}
+            self.attributes["reactor"].append(reactor_name)
+            self.attributes["reaction"].append(name)
+            for attribute in ATTRIBUTES:
+                self.attributes[attribute].append(yaml_data.get(attribute, "n.a."))
+
+            self.redundant.append(redundant)
+            self.startup_shutdown.append(yaml_data.get("type") in ("startup", "shutdown"))
+        return symbol
+
+    def attribute_row(self, symbol):
+        '''Dictionary of the attributes of a symbol'''
+        return {attribute: values[symbol] for attribute, values in self.attributes.items()}
+
+    @classmethod
+    def from_reaction_dict(cls, reaction_dict, redundant_reactions):
+        '''Builds the table from the nested YAML dictionary {reactor : {reaction : {attribute : value}}} of the parser'''
+        symbols = cls()
+        redundant_reactions = set(redundant_reactions)
+        for reactor_name, reactions in reaction_dict.items():
+            for name, yaml_data in reactions.items():
+                symbols.add(reactor_name, name, yaml_data, reactor_name + "." + name in redundant_reactions)
+        return symbols
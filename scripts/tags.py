@@ -0,0 +1,60 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+
+class tag_index:
+    '''Index of the tags (logical time, microstep) of a trace. Every tag gets a dense id, in order of logical time then
+    microstep, which is stored in the "tag" column of each event table. Per-tag columns hold the tag itself and the physical
+    time range of its executions, so that colours, logic lines and analyses work on arrays instead of (logical time,
+    microstep) tuples.'''
+
+    def __init__(self, exe_table, other_tables=()):
+        tables = [exe_table] + list(other_tables)
+        logical_times = np.concatenate([table["logical_time"] for table in tables]).astype(np.int64)
+        microsteps = np.concatenate([table["microstep"] for table in tables]).astype(np.int64)
+
+        # Sort all events by tag, and number the tags
+        order = np.lexsort((microsteps, logical_times))
+        sorted_logical_times = logical_times[order]
+        sorted_microsteps = microsteps[order]
+        is_new_tag = np.ones(len(order), dtype=np.bool_)
+        is_new_tag[1:] = (sorted_logical_times[1:] != sorted_logical_times[:-1]) | (sorted_microsteps[1:] != sorted_microsteps[:-1])
+
+        tags = np.empty(len(order), dtype=np.int32)
+        tags[order] = np.cumsum(is_new_tag) - 1
+
+        # Logical time and microstep of each tag (relative to the first tag of the trace, like the tables)
+        self.logical_time = sorted_logical_times[is_new_tag]
+        self.microstep = sorted_microsteps[is_new_tag]
+
+        # Tag id of every event
+        offset = 0
+        for table in tables:
+            table["tag"] = tags[offset:offset + len(table)]
+            offset += len(table)
+
+        # Number of executions and physical time range of the executions (ns) of each tag (0 for tags without executions)
+        exe_tags = exe_table["tag"]
+        self.execution_count = np.bincount(exe_tags, minlength=len(self))
+        self.first_start_ns = self._reduce(np.minimum, exe_tags, exe_table["start_ns"])
+        self.last_start_ns = self._reduce(np.maximum, exe_tags, exe_table["start_ns"])
+        self.first_end_ns = self._reduce(np.minimum, exe_tags, exe_table["end_ns"])
+        self.last_end_ns = self._reduce(np.maximum, exe_tags, exe_table["end_ns"])
+
+    def __len__(self):
+        return len(self.logical_time)
+
+    def _reduce(self, ufunc, tags, values):
+        '''Reduces the values of each tag with ufunc (np.minimum or np.maximum)'''
+        initial = np.iinfo(np.int64).max if ufunc is np.minimum else np.iinfo(np.int64).min
+        result = np.full(len(self), initial, dtype=np.int64)
+        ufunc.at(result, tags, values)
+        result[self.execution_count == 0] = 0
+        return result
+
+    def boundaries(self, table):
+        '''Rows of a table (in its order) where the tag differs from the tag of the previous row'''
+        tags = table["tag"]
+        return np.flatnonzero(tags[1:] != tags[:-1]) + 1
@@ -0,0 +1,64 @@
+#!/usr/bin/python
+
+import re
+
+
+# Limits used for the unbounded sides of a window (int64 range)
+NO_BEGIN = -(1 << 63)
+NO_END = (1 << 63) - 1
+
+# Units accepted by parse_duration, in ns
+DURATION_UNITS = {"ns": 1, "us": 1000, "ms": 1000000, "s": 1000000000, "min": 60000000000, "h": 3600000000000}
+
+
+def parse_duration(text):
+    '''Converts a duration such as "12.5", "300ms" or "2min" to ns (seconds if no unit is given)'''
+    match = re.fullmatch(r"\s*([0-9]*\.?[0-9]+)\s*([a-z]*)\s*", text)
+    if match is None or match.group(2) not in DURATION_UNITS and match.group(2) != "":
+        raise ValueError("Invalid duration " + text + " (expected a number followed by one of ns, us, ms, s, min, h)")
+    return int(round(float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]))
+
+
+
+class time_window:
+    '''Part of a trace to load. Physical times (begin, end) and logical times (tag_begin, tag_end) are given in ns relative to the
+    first event of the trace, None leaving that side unbounded. An event is loaded if it lies within both ranges'''
+
+    def __init__(self, begin=None, end=None, tag_begin=None, tag_end=None):
+        self.begin = begin
+        self.end = end
+        self.tag_begin = tag_begin
+        self.tag_end = tag_end
+
+    def is_bounded(self):
+        return any(limit is not None for limit in (self.begin, self.end, self.tag_begin, self.tag_end))
+
+    def limits(self, start_time_ns, start_time_logical):
+        '''Absolute limits (begin_ns, end_ns, begin_logical, end_logical) for a trace starting at the given times'''
+        return (NO_BEGIN if self.begin is None else start_time_ns + self.begin,
+                NO_END if self.end is None else start_time_ns + self.end,
+                NO_BEGIN if self.tag_begin is None else start_time_logical + self.tag_begin,
+                NO_END if self.tag_end is None else start_time_logical + self.tag_end)
+
+    def __str__(self):
+        '''Description of the window, used to key cached traces'''
+        return "physical %s..%s, logical %s..%s" % (self.begin, self.end, self.tag_begin, self.tag_end)
+
+
+def within_limits(limits, timestamps, logical_times):
+    '''Whether events with the given timestamps and logical times (scalars or arrays, absolute ns) are within limits'''
+    begin_ns, end_ns, begin_logical, end_logical = limits
+    return (begin_ns <= timestamps) & (timestamps <= end_ns) & (begin_logical <= logical_times) & (logical_times <= end_logical)
+
+
+def babeltrace_bounds(limits):
+    '''Keyword arguments of bt2.TraceCollectionMessageIterator trimming the trace to the physical time range of limits. Babeltrace
+    takes them in seconds as floats, so they are widened by 1 us, and events are filtered exactly with within_limits'''
+    if limits is None:
+        return {}
+    bounds = {}
+    if limits[0] != NO_BEGIN:
+        bounds["begin"] = (limits[0] - 1000) / 1e9
+    if limits[1] != NO_END:
+        bounds["end"] = (limits[1] + 1000) / 1e9
+    return bounds
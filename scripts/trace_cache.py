@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+
+# Incremented whenever the layout of a cache entry changes, so that entries written by older versions are rebuilt
+CACHE_VERSION = 1
+
+# Name of the file describing a cache entry. It is written last, so an entry without it is incomplete
+MANIFEST = "manifest.json"
+
+
+def default_cache_dir():
+    '''Directory used for the cache when none is given: $XDG_CACHE_HOME/tracing-lf (~/.cache/tracing-lf)'''
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "tracing-lf")
+
+
+def file_hash(filepath):
+    '''sha256 of the contents of a file'''
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ctf_fingerprint(ctf_path):
+    '''Fingerprint of a CTF trace directory. Stream files can be several GB, so they are identified by their path, size and
+    modification time, while the (small) metadata file is hashed'''
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(ctf_path):
+        dirs.sort()
+        for f in sorted(files):
+            filepath = os.path.join(root, f)
+            stat = os.stat(filepath)
+            digest.update(os.path.relpath(filepath, ctf_path).encode())
+            digest.update(str((stat.st_size, stat.st_mtime_ns)).encode())
+            if f == "metadata":
+                digest.update(file_hash(filepath).encode())
+    return digest.hexdigest()
+
+
+
+class trace_cache:
+    '''On-disk cache of parsed traces. Each entry is a directory holding one .npy file per table column (loaded memory-mapped)
+    and a JSON manifest with the parser state and YAML topology. Entries are keyed on the CTF directory and YAML file (and on a
+    variant string, for traces that are only partly loaded), and entries of the same trace with an outdated key are removed when
+    a new one is stored.'''
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+
+    def key(self, ctf_path, yaml_filepath, variant=""):
+        '''Key of the cache entry for the given trace, YAML file and variant'''
+        digest = hashlib.sha256()
+        digest.update(str(CACHE_VERSION).encode())
+        digest.update(ctf_fingerprint(ctf_path).encode())
+        digest.update(file_hash(yaml_filepath).encode())
+        digest.update(variant.encode())
+        return digest.hexdigest()[:32]
+
+    def entries(self):
+        '''All complete entries in the cache, as (path, manifest) tuples'''
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.cache_dir)):
+            manifest_path = os.path.join(self.cache_dir, name, MANIFEST)
+            try:
+                with open(manifest_path) as f:
+                    entries.append((os.path.join(self.cache_dir, name), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def load(self, ctf_path, yaml_filepath, variant=""):
+        '''Returns (manifest, tables) for the given trace, or None if it is not cached. Table columns are memory-mapped'''
+        entry_path = os.path.join(self.cache_dir, self.key(ctf_path, yaml_filepath, variant))
+        manifest_path = os.path.join(entry_path, MANIFEST)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != CACHE_VERSION:
+            return None
+
+        tables = {}
+        try:
+            for table, columns in manifest["tables"].items():
+                tables[table] = {column: np.load(os.path.join(entry_path, table, column + ".npy"), mmap_mode="r") for column in columns}
+        except (OSError, ValueError):
+            return None
+
+        # Mark the entry as used, for eviction by age
+        os.utime(manifest_path)
+        return manifest["state"], tables
+
+    def store(self, ctf_path, yaml_filepath, state, tables, variant=""):
+        '''Writes the parser state (JSON serialisable) and tables {table : {column : array}} for the given trace'''
+        key = self.key(ctf_path, yaml_filepath, variant)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary directory first, so that a partially written entry is never loaded
+        tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+        try:
+            for table, columns in tables.items():
+                os.makedirs(os.path.join(tmp_path, table))
+                for column, values in columns.items():
+                    np.save(os.path.join(tmp_path, table, column + ".npy"), np.ascontiguousarray(values))
+
+            manifest = {"version": CACHE_VERSION, "ctf_path": os.path.abspath(ctf_path), "yaml_path": os.path.abspath(yaml_filepath),
+                        "variant": variant, "created": time.time(), "tables": {table: list(columns) for table, columns in tables.items()}, "state": state}
+            with open(os.path.join(tmp_path, MANIFEST), "w") as f:
+                json.dump(manifest, f)
+
+            entry_path = os.path.join(self.cache_dir, key)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        # Remove stale entries of the same trace (the trace or YAML file changed since they were written)
+        for path, manifest in self.entries():
+            if os.path.basename(path) != key and manifest.get("ctf_path") == os.path.abspath(ctf_path) \
+                    and manifest.get("yaml_path") == os.path.abspath(yaml_filepath) and manifest.get("variant", "") == variant:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def evict(self, max_age_days=0):
+        '''Removes entries which have not been used for more than max_age_days (all entries by default), as well as entries of
+        traces that no longer exist. Returns the number of removed entries'''
+        removed = 0
+        now = time.time()
+        for path, manifest in self.entries():
+            last_used = os.path.getmtime(os.path.join(path, MANIFEST))
+            if now - last_used >= max_age_days * 86400 or not os.path.isdir(manifest.get("ctf_path", "")):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+
+        # Leftovers of interrupted writes
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(".tmp-"):
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+        return removed
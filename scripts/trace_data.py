@@ -0,0 +1,157 @@
+#!/usr/bin/python
+
+import numpy as np
+
+from scripts.read_ctf import parser
+from scripts.dependencies import dependency_edges, dependency_pairs
+from scripts.name_filter import name_filter
+from scripts.tags import tag_index
+from scripts.utilization import worker_utilization
+from scripts.critical_path import critical_path
+from scripts.lateness import lateness
+from scripts.profiling import stage
+
+
+# Colours of the logical times, cycled through in tag order (the 9 colours of the ColorBrewer Set1 palette, as in
+# bokeh.palettes.Set1[9], written out so that this module does not import bokeh)
+PALETTE = ["#e41a1c", "#377eb8", "#4daf4a", "#984ea3", "#ff7f00", "#ffff33", "#a65628", "#f781bf", "#999999"]
+
+
+
+class trace_data:
+    '''Parsed trace prepared for the views: the event tables filtered with the include/exclude regex and coloured by tag, the
+    dependencies between the reactions, and the analyses of the executions. Has no plotting dependencies (the views are built by
+    visualiser.visualisers, a subclass)'''
+
+    def __init__(self, ctf_filepath, yaml_filepath, include_regex, exclude_regex, cache=None, jobs=1, native=False, window=None, filter_on_load=False,
+                 data_parser=None):
+        # Reactions and actions to show (with filter_on_load, the parser does not store the others at all)
+        self.name_filter = name_filter(include_regex, exclude_regex)
+
+        # The trace is parsed here unless an already parsed one is given (e.g. restored with parser.set_state)
+        if data_parser is None:
+            data_parser = parser()
+            with stage("parse"):
+                data_parser.parse(ctf_filepath, yaml_filepath, cache, jobs, native, window, self.name_filter if filter_on_load else None)
+        self.data_parser = data_parser
+        
+        # All execution events
+        self.ordered_exe_events = self.data_parser.get_ordered_exe_events()
+        
+        # All instantaneous reactions
+        self.ordered_inst_events_reactions = self.data_parser.get_ordered_inst_events_reactions()
+        
+        # All instantaneous actions
+        self.ordered_inst_events_actions = self.data_parser.get_ordered_inst_events_actions()
+        
+        # Dictionaries which contain pairs for the numbers assigned to a reactor
+        self.labels = self.data_parser.get_y_axis_labels()
+
+        # Dictionary that is the inverse of self.labels
+        self.number_labels = self.data_parser.get_number_label()
+        
+        # Dictionary containing a port as a key, with the value containing the reactions triggered by the downstream port (of the current port)
+        self.port_dict = self.data_parser.get_port_dict()
+        
+        # Dictionary containing all dependencies between reactions
+        self.dependency_dict = self.data_parser.get_dependency_dict()
+        
+        # List containing all reaction names
+        self.action_names = self.data_parser.get_action_names()
+        
+        # Columns of the dependency arrows (x_start, y_start, x_end, y_end), drawn from a single data source
+        self.arrow_pos = {"x_start": [], "y_start": [], "x_end": [], "y_end": []}
+        
+        # Stores whether to show coloured graph
+        self.diable_arrows = False
+        
+        # Graph name is the name of the main reactor
+        self.graph_name = self.data_parser.get_main_reactor_name()
+
+        # If --include or --exclude flag was set by user, remove actions and reaction accordingly
+        with stage("remove_reactions"):
+            self.remove_reactions()
+
+        # Colour actions and reactions based on their logical time
+        with stage("colour") as record:
+            self.colour()
+            record["events"] = len(self.ordered_exe_events) + len(self.ordered_inst_events_reactions) + len(self.ordered_inst_events_actions)
+
+    def worker_utilization(self):
+        '''Busy and idle time of the workers (see worker_utilization)'''
+        return worker_utilization(self.ordered_exe_events, self.tags)
+
+    def critical_path(self):
+        '''Critical path of every tag (see critical_path)'''
+        edges = dependency_edges(self.ordered_exe_events.categories, self.dependency_dict)
+        return critical_path(self.ordered_exe_events, self.tags, edges)
+
+    def lateness(self, alignment="min"):
+        '''Lateness of the executions after their tag (see lateness)'''
+        return lateness(self.ordered_exe_events, self.tags, alignment)
+
+    def colour(self):
+        '''Colour actions and reactions based on logical time. Each logical time is assigned a new colour from a palette of 9 colours. 
+        The tags of all events are indexed first (see tag_index), and each tag id is mapped to a colour.'''
+        
+            
+        # Set some default colour for all actions and reactions, to populate the dictionary
+        default_colour = "lightgrey"
+        
+        # Set the default colours for all actions and reactions
+        for data_table in [self.ordered_inst_events_reactions, self.ordered_inst_events_actions, self.ordered_exe_events]:
+            data_table["default_colours"] = np.full(len(data_table), default_colour, dtype=object)
+
+        # Dense ids of all logical times (time, microstep) of the actions, reactions and physical executions, in sorted order
+        self.tags = tag_index(self.ordered_exe_events, [self.ordered_inst_events_actions, self.ordered_inst_events_reactions])
+
+        # Assign colours to logical times, cycling through the palette
+        colours = np.array(PALETTE, dtype=object)
+        for data_table in [self.ordered_exe_events, self.ordered_inst_events_actions, self.ordered_inst_events_reactions]:
+            data_table["colours"] = colours[data_table["tag"] % len(PALETTE)]
+
+
+
+
+
+    def remove_reactions(self):
+        '''Removes the actions and reactions which do not pass the user's include/exclude regex from the data set'''
+
+        if not self.name_filter.is_active():
+            return
+        self.diable_arrows = True
+
+        # Evaluate the regex once per label (self.labels contains all reaction names)
+        keep = self.name_filter.mask(self.labels)
+        self.labels = [label for label, kept in zip(self.labels, keep.tolist()) if kept]
+
+        # Update the number_labels list, to reflect the new dataset
+        self.number_labels = dict(enumerate(self.labels))
+
+        # Update the positions of reactions on the y-axis, as some reactions have been removed
+        # (positions are integers, which are later overwritten with the reaction name label). The trailing -1 keeps hidden
+        # names (y-value -1) hidden
+        new_positions = np.full(len(keep) + 1, -1, dtype=np.int32)
+        new_positions[:-1][keep] = np.arange(len(self.labels), dtype=np.int32)
+        categories = self.ordered_exe_events.categories
+        categories.y_axis = new_positions[categories.y_axis]
+
+        # remove excluded data from the tables (names without a y-position are no longer active), with one mask per table
+        for data_source in [self.ordered_inst_events_reactions, self.ordered_inst_events_actions, self.ordered_exe_events]:
+            data_source.filter(categories.y_axis[data_source["name_id"]] >= 0)
+
+
+
+    
+              
+    def find_dependencies(self):
+        '''Finds the pairs of executions at the same logical time where the later one depends on the earlier one, and stores the
+        arrow positions (end of the earlier execution, start of the later one) in self.arrow_pos'''
+
+        edges = dependency_edges(self.ordered_exe_events.categories, self.dependency_dict)
+        sources, targets = dependency_pairs(self.ordered_exe_events["name_id"], self.ordered_exe_events["logical_time"],
+                                            self.ordered_exe_events["microstep"], edges)
+
+        y_axis = self.ordered_exe_events["y_axis"]
+        self.arrow_pos = {"x_start": self.ordered_exe_events["time_end"][sources], "y_start": y_axis[sources],
+                          "x_end": self.ordered_exe_events["time_start"][targets], "y_end": y_axis[targets]}
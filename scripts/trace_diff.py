@@ -0,0 +1,190 @@
+#!/usr/bin/python
+
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+
+import numpy as np
+
+from scripts.read_ctf import parser
+from scripts.tags import tag_index
+from scripts.utilization import worker_utilization
+
+
+# Differences are significant if the p-value of the Mann-Whitney U test is below SIGNIFICANCE and the medians differ by at
+# least MIN_CHANGE (relative)
+SIGNIFICANCE = 0.01
+MIN_CHANGE = 0.05
+
+
+def parse_state(ctf_path, yaml_filepath, cache=None, jobs=1, native=False, window=None):
+    '''Parses a trace and returns its parser state (used as process pool task, the state being sent back to the main process)'''
+    trace_parser = parser()
+    trace_parser.parse(ctf_path, yaml_filepath, cache, jobs, native, window)
+    return trace_parser.get_state()
+
+
+def parse_concurrently(traces, cache=None, jobs=1, native=False, window=None):
+    '''Parses the traces [(ctf_path, yaml_filepath), ...] in separate processes at the same time. Returns a parser per trace'''
+    with ProcessPoolExecutor(max_workers=len(traces)) as executor:
+        states = list(executor.map(parse_state, *zip(*traces), *([option] * len(traces) for option in (cache, jobs, native, window))))
+
+    parsers = []
+    for state, tables in states:
+        trace_parser = parser()
+        trace_parser.set_state(state, tables)
+        parsers.append(trace_parser)
+    return parsers
+
+
+def mann_whitney(a, b):
+    '''Two-sided p-value of the Mann-Whitney U test of samples a and b (normal approximation, with tie correction)'''
+    count_a = len(a)
+    count_b = len(b)
+    if count_a == 0 or count_b == 0:
+        return math.nan
+    values = np.concatenate((a, b))
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+
+    # Average rank of each run of equal values
+    firsts = np.flatnonzero(np.concatenate(([True], sorted_values[1:] != sorted_values[:-1])))
+    ties = np.diff(np.append(firsts, len(values)))
+    ranks = np.empty(len(values))
+    ranks[order] = np.repeat(firsts + (ties + 1) / 2.0, ties)
+
+    u = ranks[:count_a].sum() - count_a * (count_a + 1) / 2.0
+    total = count_a + count_b
+    variance = count_a * count_b / 12.0 * ((total + 1) - np.sum(ties ** 3 - ties) / (total * (total - 1)) if total > 1 else 0)
+    if variance <= 0:
+        return 1.0
+    z = (u - count_a * count_b / 2.0) / math.sqrt(variance)
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def json_values(value):
+    '''Replaces the non-finite floats (nan, inf) of nested lists and dictionaries with None, which JSON can represent'''
+    if isinstance(value, dict):
+        return {key: json_values(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [json_values(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def relative_change(before, after):
+    if before == 0:
+        return 0.0 if after == 0 else math.inf
+    return (after - before) / before
+
+
+
+class trace_summary:
+    '''Per-reaction execution times, per-tag makespans and worker utilization of a parsed trace'''
+
+    def __init__(self, trace_parser):
+        exe = trace_parser.get_ordered_exe_events()
+        names = exe.categories.names
+        durations = exe["end_ns"] - exe["start_ns"]
+
+        # Execution times of every reaction, by fully qualified name
+        order = np.argsort(exe["name_id"], kind="stable")
+        codes = exe["name_id"][order]
+        firsts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1]))) if len(codes) else codes
+        self.durations = {names[code]: values for code, values in zip(codes[firsts], np.split(durations[order], firsts[1:]))}
+
+        # Makespan of every tag (first start to last end of its executions)
+        tags = tag_index(exe)
+        started = tags.execution_count > 0
+        self.makespans = (tags.last_end_ns - tags.first_start_ns)[started]
+
+        self.utilization = worker_utilization(exe, tags).table()["utilization"] if len(exe) else np.zeros(0)
+
+
+
+class trace_diff:
+    '''Comparison of two traces (before and after a change): reactions are matched by fully qualified name, and their execution
+    times, invocation counts, the makespan of the tags and the worker utilization are compared. Execution time differences are
+    ranked by their impact on the total execution time of the after trace.'''
+
+    def __init__(self, before, after):
+        self.before = before
+        self.after = after
+
+        self.reactions = []
+        for name in sorted(set(before.durations) | set(after.durations)):
+            a = before.durations.get(name, np.zeros(0, dtype=np.int64))
+            b = after.durations.get(name, np.zeros(0, dtype=np.int64))
+            median_a = float(np.median(a)) if len(a) else math.nan
+            median_b = float(np.median(b)) if len(b) else math.nan
+            p_value = mann_whitney(a, b)
+            change = relative_change(median_a, median_b) if len(a) and len(b) else math.nan
+            significant = p_value < SIGNIFICANCE and abs(change) >= MIN_CHANGE
+
+            if not len(a):
+                status = "added"
+            elif not len(b):
+                status = "removed"
+            elif significant:
+                status = "regression" if change > 0 else "improvement"
+            else:
+                status = "unchanged"
+
+            self.reactions.append({"name": name, "status": status, "count_before": len(a), "count_after": len(b),
+                                   "median_us_before": median_a / 1e3, "median_us_after": median_b / 1e3,
+                                   "p99_us_before": float(np.percentile(a, 99)) / 1e3 if len(a) else math.nan,
+                                   "p99_us_after": float(np.percentile(b, 99)) / 1e3 if len(b) else math.nan,
+                                   "total_ms_before": float(a.sum()) / 1e6, "total_ms_after": float(b.sum()) / 1e6,
+                                   "median_change": change, "p_value": p_value,
+                                   # Change of the total execution time if the after trace had the same invocations at the old median
+                                   "impact_ms": (median_b - median_a) * len(b) / 1e6 if len(a) and len(b) else float(b.sum() - a.sum()) / 1e6})
+
+        # Largest regressions first, then the largest improvements
+        self.reactions.sort(key=lambda row: (row["status"] != "regression", row["status"] != "improvement", -abs(row["impact_ms"])))
+
+        makespan_change = relative_change(float(np.median(before.makespans)), float(np.median(after.makespans))) \
+            if len(before.makespans) and len(after.makespans) else math.nan
+        makespan_p = mann_whitney(before.makespans, after.makespans)
+        self.makespan = {"tags_before": len(before.makespans), "tags_after": len(after.makespans),
+                         "median_ms_before": float(np.median(before.makespans)) / 1e6 if len(before.makespans) else math.nan,
+                         "median_ms_after": float(np.median(after.makespans)) / 1e6 if len(after.makespans) else math.nan,
+                         "p99_ms_before": float(np.percentile(before.makespans, 99)) / 1e6 if len(before.makespans) else math.nan,
+                         "p99_ms_after": float(np.percentile(after.makespans, 99)) / 1e6 if len(after.makespans) else math.nan,
+                         "median_change": makespan_change, "p_value": makespan_p,
+                         "significant": bool(makespan_p < SIGNIFICANCE and abs(makespan_change) >= MIN_CHANGE)}
+
+        self.utilization = {"before": before.utilization.tolist(), "after": after.utilization.tolist(),
+                            "mean_before": float(np.mean(before.utilization)) if len(before.utilization) else math.nan,
+                            "mean_after": float(np.mean(after.utilization)) if len(after.utilization) else math.nan}
+
+    def to_json(self):
+        return json.dumps(json_values({"reactions": self.reactions, "makespan": self.makespan, "utilization": self.utilization}), indent=1)
+
+    def report(self):
+        '''Text report: significant changes of the reactions, makespan and utilization'''
+        counts = {status: sum(1 for row in self.reactions if row["status"] == status)
+                  for status in ("regression", "improvement", "unchanged", "added", "removed")}
+        lines = [", ".join(str(count) + " " + status + ("s" if count != 1 and status in ("regression", "improvement") else "")
+                           for status, count in counts.items()), ""]
+
+        width = max([len("reaction")] + [len(row["name"]) for row in self.reactions])
+        lines.append(("%-12s %-" + str(width) + "s %9s %9s %12s %12s %8s %10s %12s") % ("status", "reaction", "count", "count", "median (us)",
+                                                                                        "median (us)", "change", "p-value", "impact (ms)"))
+        for row in self.reactions:
+            if row["status"] == "unchanged":
+                continue
+            lines.append(("%-12s %-" + str(width) + "s %9d %9d %12.3f %12.3f %7.1f%% %10.2g %12.3f") % (
+                row["status"], row["name"], row["count_before"], row["count_after"], row["median_us_before"], row["median_us_after"],
+                100 * row["median_change"], row["p_value"], row["impact_ms"]))
+
+        makespan = self.makespan
+        lines.append("")
+        lines.append("Tag makespan: median %.3f -> %.3f ms (%+.1f%%, p=%.2g%s), p99 %.3f -> %.3f ms, %d -> %d tags" % (
+            makespan["median_ms_before"], makespan["median_ms_after"], 100 * makespan["median_change"], makespan["p_value"],
+            ", significant" if makespan["significant"] else "", makespan["p99_ms_before"], makespan["p99_ms_after"],
+            makespan["tags_before"], makespan["tags_after"]))
+        lines.append("Worker utilization: mean %.1f%% -> %.1f%% (%s -> %s)" % (
+            100 * self.utilization["mean_before"], 100 * self.utilization["mean_after"],
+            " ".join(format(value, ".0%") for value in self.utilization["before"]), " ".join(format(value, ".0%") for value in self.utilization["after"])))
+        return "\n".join(lines)
@@ -0,0 +1,291 @@
+#!/usr/bin/python
+
+import json
+import struct
+
+import yaml
+
+from scripts.read_ctf import parser
+from scripts.time_window import within_limits, babeltrace_bounds
+
+
+# Formats written by trace_exporter, and the extension of their default file name
+FORMATS = {"perfetto": ".perfetto-trace", "chrome-json": ".json"}
+
+# Size of the output buffer (the events are written as they are read, so memory does not grow with the length of the trace)
+BUFFER_SIZE = 1 << 20
+
+# Perfetto TrackEvent types and TracePacket sequence flags (see perfetto/protos/perfetto/trace/track_event/track_event.proto)
+SLICE_BEGIN = 1
+SLICE_END = 2
+COUNTER = 4
+SEQ_INCREMENTAL_STATE_CLEARED = 1
+SEQ_NEEDS_INCREMENTAL_STATE = 2
+
+# Sequence id of the packets (a single writer)
+SEQUENCE_ID = 1
+
+# Track uuids of the process, the logical time counter and the worker threads (COUNTER_UUID + tid, tids starting from 1)
+PROCESS_UUID = 1
+COUNTER_UUID = 2
+
+# Process id of the exported process (the program, named after its main reactor)
+PROCESS_ID = 1
+
+
+def flow_id(logical_time, microstep):
+    '''Id of the flow linking the executions of a tag (logical time in ns since the first tag), unique for 2^47 ns (39 hours)'''
+    return ((logical_time << 16) + microstep + 1) & 0xFFFFFFFFFFFFFFFF
+
+
+# Protobuf wire format encoding, so that the Perfetto output does not depend on the protobuf package
+
+def varint(value):
+    value &= 0xFFFFFFFFFFFFFFFF
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def varint_field(number, value):
+    return varint(number << 3) + varint(value)
+
+
+def bytes_field(number, value):
+    if isinstance(value, str):
+        value = value.encode()
+    return varint(number << 3 | 2) + varint(len(value)) + value
+
+
+def fixed64_field(number, value):
+    return varint(number << 3 | 1) + struct.pack("<Q", value & 0xFFFFFFFFFFFFFFFF)
+
+
+def double_field(number, value):
+    return varint(number << 3 | 1) + struct.pack("<d", value)
+
+
+
+class perfetto_writer:
+    '''Writes TracePackets to a Perfetto protobuf trace file. Reaction names and the names of the tag annotations are interned
+    (sent once, then referred to by id), which keeps the slices a few dozen bytes each'''
+
+    def __init__(self, output):
+        self.output = output
+        self.event_names = {}
+        self.first_packet = True
+
+    def packet(self, fields):
+        if self.first_packet:
+            fields += varint_field(13, SEQ_INCREMENTAL_STATE_CLEARED)
+            self.first_packet = False
+        fields += varint_field(10, SEQUENCE_ID)
+        # Trace.packet (field 1)
+        self.output.write(bytes_field(1, fields))
+
+    def process(self, pid, name):
+        self.packet(bytes_field(60, varint_field(1, PROCESS_UUID) + bytes_field(3, varint_field(1, pid) + bytes_field(6, name))))
+        self.packet(bytes_field(60, varint_field(1, COUNTER_UUID) + varint_field(5, PROCESS_UUID) + bytes_field(2, "logical time (ms)") +
+                                bytes_field(8, b"")))
+
+    def thread(self, pid, tid, name):
+        self.packet(bytes_field(60, varint_field(1, COUNTER_UUID + tid) + varint_field(5, PROCESS_UUID) +
+                                bytes_field(4, varint_field(1, pid) + varint_field(2, tid) + bytes_field(5, name))))
+
+    def name_iid(self, name):
+        '''Interned id of an event name, and the InternedData defining it the first time it is used (empty otherwise)'''
+        iid = self.event_names.get(name)
+        if iid is not None:
+            return iid, b""
+        iid = self.event_names[name] = len(self.event_names) + 1
+        # InternedData.event_names (field 2): EventName {iid = 1, name = 2}, with the annotation names the first time
+        interned = bytes_field(2, varint_field(1, iid) + bytes_field(2, name))
+        if iid == 1:
+            interned += bytes_field(3, varint_field(1, 1) + bytes_field(2, "logical_time")) + bytes_field(3, varint_field(1, 2) + bytes_field(2, "microstep"))
+        return iid, bytes_field(12, interned)
+
+    def begin(self, timestamp, tid, key, name, logical_time, microstep):
+        iid, interned = self.name_iid(name)
+        # DebugAnnotation {name_iid = 1, int_value = 4}
+        event = (varint_field(9, SLICE_BEGIN) + varint_field(11, COUNTER_UUID + tid) + varint_field(10, iid) +
+                 bytes_field(4, varint_field(1, 1) + varint_field(4, logical_time)) + bytes_field(4, varint_field(1, 2) + varint_field(4, microstep)) +
+                 fixed64_field(47, flow_id(logical_time, microstep)))
+        self.packet(varint_field(8, timestamp) + bytes_field(11, event) + interned + varint_field(13, SEQ_NEEDS_INCREMENTAL_STATE))
+
+    def end(self, timestamp, tid, key):
+        # The slice ended is the last one begun on the track, which is the execution of key (see trace_exporter.write_events)
+        self.packet(varint_field(8, timestamp) + bytes_field(11, varint_field(9, SLICE_END) + varint_field(11, COUNTER_UUID + tid)))
+
+    def counter(self, timestamp, value):
+        self.packet(varint_field(8, timestamp) + bytes_field(11, varint_field(9, COUNTER) + varint_field(11, COUNTER_UUID) + double_field(44, value)))
+
+    def close(self):
+        pass
+
+
+
+class chrome_json_writer:
+    '''Writes a Chrome Trace Event Format JSON file (also read by Perfetto), one event per line. Executions are complete ("X")
+    events written when they finish, and the executions of a tag are linked by flow events (bind_id, flow_in and flow_out)'''
+
+    def __init__(self, output):
+        self.output = output
+        self.output.write(b'{"displayTimeUnit": "ns", "traceEvents": [\n')
+        self.first_event = True
+        self.pid = 0
+
+        # Start, name and tag of the executions in flight, keyed on (reaction, logical time, microstep)
+        self.starts = {}
+
+    def event(self, event):
+        self.output.write((b"" if self.first_event else b",\n") + json.dumps(event, separators=(",", ":")).encode())
+        self.first_event = False
+
+    def process(self, pid, name):
+        self.pid = pid
+        self.event({"ph": "M", "name": "process_name", "pid": pid, "tid": 0, "args": {"name": name}})
+
+    def thread(self, pid, tid, name):
+        self.event({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid, "args": {"name": name}})
+
+    def begin(self, timestamp, tid, key, name, logical_time, microstep):
+        # The slice is written once its duration is known
+        self.starts[key] = (timestamp, name, logical_time, microstep)
+
+    def end(self, timestamp, tid, key):
+        start, name, logical_time, microstep = self.starts.pop(key)
+        self.event({"ph": "X", "name": name, "cat": "reaction", "pid": self.pid, "tid": tid, "ts": start / 1e3, "dur": (timestamp - start) / 1e3,
+                    "bind_id": "0x%x" % flow_id(logical_time, microstep), "flow_in": True, "flow_out": True,
+                    "args": {"logical_time": logical_time, "microstep": microstep}})
+
+    def counter(self, timestamp, value):
+        self.event({"ph": "C", "name": "logical time", "pid": self.pid, "tid": 0, "ts": timestamp / 1e3, "args": {"ms": value}})
+
+    def close(self):
+        self.output.write(b"\n]}\n")
+
+
+
+class trace_exporter:
+    '''Converts a CTF trace to a Perfetto (protobuf) or Chrome JSON trace while it is read from Babeltrace, so that only the
+    executions in flight are held in memory. Workers become the threads of a process named after the main reactor, executions
+    become slices on them, the executions of each tag are linked by a flow, and the logical time of the last started tag is
+    shown as a counter track. Times are relative to the first event of the trace'''
+
+    def __init__(self, ctf_path, yaml_filepath, names=None, window=None, native=False):
+        self.ctf_path = ctf_path
+        self.names = names if names is not None and names.is_active() else None
+
+        # Main reactor and the reactions without triggers or effects, which are left out like in the visualisation
+        yaml_data = yaml.load(open(yaml_filepath), Loader=yaml.FullLoader)
+        self.reactor_name = yaml_data["top_level_instances"][0]
+        self.hidden = set()
+        for reactor, items in yaml_data["all_reactor_instances"].items():
+            for reaction in items["reactions"] or []:
+                if reaction["triggers"] is None and reaction["effects"] is None:
+                    self.hidden.add(reactor + "." + reaction["name"])
+
+        # Times are relative to the first event of the trace (as in the visualisation and the window), even if it is outside the
+        # window
+        self.first_event = parser().find_first_event(ctf_path, native)
+        self.limits = None
+        if window is not None and window.is_bounded() and self.first_event is not None:
+            self.limits = window.limits(*self.first_event)
+
+    def is_hidden(self, name):
+        '''Whether the executions of a reaction are left out (memoized, as the filter is a regex)'''
+        hidden = self.hidden_names.get(name)
+        if hidden is None:
+            hidden = self.hidden_names[name] = name in self.hidden or (self.names is not None and not self.names.keeps(name))
+        return hidden
+
+    def export(self, filename, output_format="perfetto"):
+        '''Writes the trace to filename, returning the number of exported executions'''
+        if output_format not in FORMATS:
+            raise ValueError("Unknown export format " + str(output_format) + " (expected " + " or ".join(FORMATS) + ")")
+        self.hidden_names = {}
+
+        # Thread id of each worker (from 1), in order of first appearance
+        self.worker_tids = {}
+
+        with open(filename, "wb", buffering=BUFFER_SIZE) as output:
+            writer = perfetto_writer(output) if output_format == "perfetto" else chrome_json_writer(output)
+            count = self.write_events(writer)
+            writer.close()
+        return count
+
+    def write_events(self, writer):
+        # Imported only when the events are written, like in the other modules reading the trace with Babeltrace
+        import bt2
+        fs_cc = bt2.find_plugin('ctf').source_component_classes['fs']
+        msg_it = bt2.TraceCollectionMessageIterator(bt2.ComponentSpec(fs_cc, {'inputs': [self.ctf_path]}), **babeltrace_bounds(self.limits))
+
+        # Thread of the executions in flight, keyed on (reaction, logical time, microstep), and the execution in flight on each
+        # thread. A worker runs one execution at a time, so an execution still in flight when its worker starts another one has
+        # lost its finishing message (e.g. discarded by LTTng): it ends when the next one starts
+        running = {}
+        thread_execution = {}
+        if self.first_event is None:
+            return 0
+        start_time_ns, start_time_logical = self.first_event
+        last_timestamp = start_time_ns
+        last_tag = None
+        count = 0
+
+        for msg in msg_it:
+            if type(msg) is not bt2._EventMessageConst:
+                continue
+            event = msg.event
+            timestamp = msg.default_clock_snapshot.ns_from_origin
+            if event.name != "reactor_cpp:reaction_execution_starts" and event.name != "reactor_cpp:reaction_execution_finishes":
+                continue
+            if self.limits is not None and not within_limits(self.limits, timestamp, int(event["timestamp_ns"])):
+                continue
+            last_timestamp = timestamp
+            name = str(event["reaction_name"])
+            if self.is_hidden(name):
+                continue
+
+            key = (name, int(event["timestamp_ns"]), int(event["timestamp_microstep"]))
+            if event.name == "reactor_cpp:reaction_execution_starts":
+                worker = int(event["worker_id"])
+                tid = self.worker_tids.get(worker)
+                if tid is None:
+                    # The process is described with its first thread
+                    if not self.worker_tids:
+                        writer.process(PROCESS_ID, self.reactor_name)
+                    tid = self.worker_tids[worker] = len(self.worker_tids) + 1
+                    writer.thread(PROCESS_ID, tid, "worker " + str(worker))
+
+                # End the execution in flight on the thread, and an earlier start of the same execution (both lost their finish)
+                for stale in (thread_execution.get(tid), key):
+                    stale_tid = running.pop(stale, None)
+                    if stale_tid is not None:
+                        del thread_execution[stale_tid]
+                        writer.end(timestamp - start_time_ns, stale_tid, stale)
+                        count += 1
+
+                logical_time = key[1] - start_time_logical
+                if last_tag != key[1:]:
+                    last_tag = key[1:]
+                    writer.counter(timestamp - start_time_ns, logical_time / 1e6)
+                writer.begin(timestamp - start_time_ns, tid, key, name, logical_time, key[2])
+                running[key] = tid
+                thread_execution[tid] = key
+
+            else:
+                # The start is missing if the execution started before the window (or was ended by a later start on its thread)
+                tid = running.pop(key, None)
+                if tid is not None:
+                    del thread_execution[tid]
+                    writer.end(timestamp - start_time_ns, tid, key)
+                    count += 1
+
+        # Executions still running at the end of the trace (or of the window) end at its last event, in both formats
+        for key, tid in running.items():
+            writer.end(last_timestamp - start_time_ns, tid, key)
+            count += 1
+        return count
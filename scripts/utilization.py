@@ -0,0 +1,136 @@
+#!/usr/bin/python
+
+import numpy as np
+
+
+# Number of sliding windows used when no window width is given
+DEFAULT_WINDOWS = 100
+
+
+
+def merge_intervals(starts, ends):
+    '''Merges intervals, sorted by start, into disjoint intervals (starts, ends), sorted by start'''
+    if len(starts) == 0:
+        return starts, ends
+    running_ends = np.maximum.accumulate(ends)
+    firsts = np.flatnonzero(np.concatenate(([True], starts[1:] > running_ends[:-1])))
+    return starts[firsts], np.maximum.reduceat(ends, firsts)
+
+
+def coverage(starts, ends, times):
+    '''Total length of the disjoint intervals (sorted by start) lying before each time'''
+    covered = np.concatenate(([0], np.cumsum(ends - starts)))
+    following = np.searchsorted(starts, times, side="right")
+    # The interval containing a time is only covered up to that time
+    overhang = np.where(following > 0, ends[np.maximum(following - 1, 0)] - times, 0) if len(starts) else np.zeros(len(times))
+    return covered[following] - np.clip(overhang, 0, None)
+
+
+
+class worker_utilization:
+    '''Busy and idle time of the workers of a trace, computed with interval arithmetic on the execution table (start_ns, end_ns,
+    worker columns) and the tag_index of the trace.
+
+    The executions of each worker are merged into disjoint busy intervals. All workers are handled in a single sorted array, the
+    times of worker w being shifted by w * offset (offset being longer than the trace), so that every step is one vectorized pass.
+    An idle gap of a worker is "pending" while some tag has started executing but not all of its reactions have started yet
+    (from the first to the last start of the executions of the tag), i.e. while work at a started tag was waiting.'''
+
+    def __init__(self, exe_table, tags):
+        starts = np.asarray(exe_table["start_ns"], dtype=np.int64)
+        ends = np.asarray(exe_table["end_ns"], dtype=np.int64)
+        workers = np.asarray(exe_table["worker"], dtype=np.int64)
+
+        self.worker_count = int(workers.max()) + 1 if len(workers) else 0
+        self.executions = np.bincount(workers, minlength=self.worker_count)
+        self.begin_ns = int(starts.min()) if len(starts) else 0
+        self.end_ns = int(ends.max()) if len(ends) else 0
+        self.offset = self.end_ns - self.begin_ns + 1
+        all_workers = np.arange(self.worker_count)
+
+        # Busy intervals of every worker, with empty intervals at the start and end of the trace, so that the gaps between
+        # consecutive intervals of a worker are exactly its idle time (including before its first and after its last execution)
+        shift = workers * self.offset
+        starts = np.concatenate((starts + shift, all_workers * self.offset + self.begin_ns, all_workers * self.offset + self.end_ns))
+        ends = np.concatenate((ends + shift, all_workers * self.offset + self.begin_ns, all_workers * self.offset + self.end_ns))
+        order = np.argsort(starts, kind="stable")
+        self.busy_starts, self.busy_ends = merge_intervals(starts[order], ends[order])
+        self.busy_workers = (self.busy_starts - self.begin_ns) // self.offset
+
+        self.busy_ns = np.bincount(self.busy_workers, weights=self.busy_ends - self.busy_starts, minlength=self.worker_count).astype(np.int64)
+        self.idle_ns = (self.end_ns - self.begin_ns) - self.busy_ns
+
+        # Idle gaps (between consecutive busy intervals of the same worker), in unshifted times
+        same_worker = self.busy_workers[1:] == self.busy_workers[:-1]
+        gap_workers = self.busy_workers[1:][same_worker]
+        gap_starts = self.busy_ends[:-1][same_worker] - gap_workers * self.offset
+        gap_ends = self.busy_starts[1:][same_worker] - gap_workers * self.offset
+        nonempty = gap_ends > gap_starts
+
+        # Time of each gap during which work was pending
+        started = tags.execution_count > 0
+        pending_order = np.argsort(tags.first_start_ns[started], kind="stable")
+        self.pending_starts, self.pending_ends = merge_intervals(tags.first_start_ns[started][pending_order],
+                                                                 tags.last_start_ns[started][pending_order])
+        pending = coverage(self.pending_starts, self.pending_ends, gap_ends[nonempty]) - \
+                  coverage(self.pending_starts, self.pending_ends, gap_starts[nonempty])
+
+        self.gaps = {"worker": gap_workers[nonempty], "start_ns": gap_starts[nonempty], "end_ns": gap_ends[nonempty], "pending_ns": pending}
+        self.idle_pending_ns = np.bincount(self.gaps["worker"], weights=pending, minlength=self.worker_count).astype(np.int64)
+
+    def stalls(self):
+        '''Idle gaps during which work was pending {"worker", "start_ns", "end_ns", "pending_ns"}'''
+        stalled = self.gaps["pending_ns"] > 0
+        return {column: values[stalled] for column, values in self.gaps.items()}
+
+    def windows(self, width=None, step=None):
+        '''Utilization (busy fraction, between 0 and 1) of every worker over sliding windows of the given width (ns), starting every
+        step ns (width by default). Returns the window starts and an array of shape (workers, windows)'''
+        width = width or max((self.end_ns - self.begin_ns) // DEFAULT_WINDOWS, 1)
+        step = step or width
+        window_starts = np.arange(self.begin_ns, max(self.end_ns - width, self.begin_ns) + 1, step, dtype=np.int64)
+
+        # Busy time before the start and end of every window, for every worker
+        shifts = (np.arange(self.worker_count) * self.offset)[:, None]
+        busy_before_start = coverage(self.busy_starts, self.busy_ends, (window_starts[None, :] + shifts).ravel())
+        busy_before_end = coverage(self.busy_starts, self.busy_ends, (window_starts[None, :] + width + shifts).ravel())
+        return window_starts, ((busy_before_end - busy_before_start) / width).reshape(self.worker_count, len(window_starts))
+
+    def concurrency(self):
+        '''Time (ns) spent with each number of busy workers (0 to the number of workers)'''
+        workers = self.busy_workers
+        starts = self.busy_starts - workers * self.offset
+        ends = self.busy_ends - workers * self.offset
+        times = np.concatenate((starts, ends))
+        changes = np.concatenate((np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)))
+
+        # At equal times, starts are counted before ends (the levels between them last 0 ns), so that empty intervals never
+        # give a negative level
+        order = np.lexsort((-changes, times))
+        levels = np.cumsum(changes[order])
+        durations = np.diff(times[order])
+        return np.bincount(levels[:-1], weights=durations, minlength=self.worker_count + 1).astype(np.int64) if len(durations) else \
+               np.zeros(self.worker_count + 1, dtype=np.int64)
+
+    def table(self):
+        '''Per-worker summary {column : values}, with times in ms'''
+        span = max(self.end_ns - self.begin_ns, 1)
+        stalls = self.stalls()
+        return {"worker": np.arange(self.worker_count), "executions": self.executions, "busy_ms": self.busy_ns / 1e6,
+                "idle_ms": self.idle_ns / 1e6, "utilization": self.busy_ns / span, "idle_pending_ms": self.idle_pending_ns / 1e6,
+                "stalls": np.bincount(stalls["worker"], minlength=self.worker_count)}
+
+    def report(self):
+        '''Text report of the per-worker summary and the concurrency histogram'''
+        table = self.table()
+        lines = ["%6s %10s %12s %12s %11s %16s %7s" % ("worker", "executions", "busy (ms)", "idle (ms)", "utilization", "idle pending (ms)", "stalls")]
+        for row in zip(*table.values()):
+            lines.append("%6d %10d %12.3f %12.3f %10.1f%% %16.3f %7d" % (row[0], row[1], row[2], row[3], 100 * row[4], row[5], row[6]))
+
+        lines.append("")
+        lines.append("%12s %12s %8s" % ("busy workers", "time (ms)", "share"))
+        histogram = self.concurrency()
+        total = max(int(histogram.sum()), 1)
+        for level, duration in enumerate(histogram):
+            lines.append("%12d %12.3f %7.1f%%" % (level, duration / 1e6, 100 * duration / total))
+        return "\n".join(lines)
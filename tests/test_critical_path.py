@@ -0,0 +1,83 @@
+from collections import defaultdict
+import random
+
+import numpy as np
+
+from scripts.critical_path import critical_path
+from scripts.dependencies import dependency_edges
+from scripts.event_store import execution_table, name_categories
+from scripts.tags import tag_index
+
+
+def find_critical_path(executions, dependency_dict):
+    '''critical_path of executions (name, start_ns, end_ns, logical_time), and the names of the reactions'''
+    categories = name_categories()
+    columns = list(zip(*executions))
+    exe_table = execution_table(categories, {"name_id": np.array([categories.add(name, {}) for name in columns[0]], dtype=np.int32),
+                                             "start_ns": np.array(columns[1]), "end_ns": np.array(columns[2]),
+                                             "logical_time": np.array(columns[3]), "microstep": np.zeros(len(executions), dtype=np.int64),
+                                             "worker": np.zeros(len(executions), dtype=np.int32)})
+    return critical_path(exe_table, tag_index(exe_table), dependency_edges(categories, dependency_dict)), categories.names
+
+
+def baseline_lengths(durations, sources, targets):
+    '''Length of the longest chain ending with each execution, found one execution at a time in table order'''
+    lengths = list(durations)
+    for target in range(len(durations)):
+        for source in sources[targets == target].tolist():
+            lengths[target] = max(lengths[target], lengths[source] + durations[target])
+    return lengths
+
+
+def test_hand_checked():
+    # a depends on b and c, which both depend on d. At tag 0 the longest chain is a, c, d (5 + 10 + 2 ns). At tag 1, c does not
+    # execute, so it is a, b, d (3 + 7 + 1 ns), and e (not linked) is not on it
+    dependency_dict = defaultdict(list, {"a": ["b", "c"], "b": ["d"], "c": ["d"]})
+    path, names = find_critical_path([("a", 0, 5, 0), ("b", 5, 6, 0), ("c", 5, 15, 0), ("d", 15, 17, 0),
+                                      ("e", 20, 22, 1), ("a", 20, 23, 1), ("b", 23, 30, 1), ("d", 30, 31, 1)], dependency_dict)
+    assert path.lengths.tolist() == [5, 6, 15, 17, 2, 3, 10, 11]
+    assert path.path_lengths.tolist() == [17, 11]
+    assert path.spans().tolist() == [17, 11]
+    assert path.on_path.tolist() == [True, False, True, True, False, True, True, True]
+    assert [rows.tolist() for rows in path.critical_edges()] == [[0, 2, 5, 6], [2, 3, 6, 7]]
+
+    # a and d are on both critical paths (a for longer), c and b on one
+    reactions = path.reaction_table(names)
+    assert reactions["name"] == ["a", "d", "c", "b"]
+    assert reactions["critical_tags"].tolist() == [2, 2, 1, 1]
+    assert reactions["executions"].tolist() == [2, 2, 1, 2]
+    assert np.allclose(reactions["path_ms"], [8e-6, 3e-6, 10e-6, 7e-6])
+
+
+def test_matches_baseline():
+    # Random dependencies and executions at a few logical times, in order of end time
+    random_generator = random.Random(0)
+    reactions = ["r%d" % reaction for reaction in range(8)]
+    dependency_dict = defaultdict(list)
+    for reaction in reactions:
+        dependency_dict[reaction] = random_generator.sample(reactions, random_generator.randrange(4))
+
+    executions = []
+    end = 0
+    for row in range(300):
+        duration = random_generator.randrange(1, 100)
+        end += random_generator.randrange(100)
+        executions.append((random_generator.choice(reactions), end - duration, end, row // 20))
+    path, names = find_critical_path(executions, dependency_dict)
+
+    expected = baseline_lengths(path.durations.tolist(), path.sources, path.targets)
+    assert path.lengths.tolist() == expected
+    assert path.path_lengths.tolist() == [max(expected[row:row + 20]) for row in range(0, 300, 20)]
+
+    # Every critical path is a chain of linked executions of its tag, whose durations add up to its length
+    linked = set(zip(path.sources.tolist(), path.targets.tolist()))
+    on_path = np.zeros(len(executions), dtype=np.bool_)
+    for tag, end in enumerate(path.path_ends.tolist()):
+        chain = [end]
+        while path.predecessors[chain[-1]] >= 0:
+            chain.append(int(path.predecessors[chain[-1]]))
+        assert all((source, target) in linked for target, source in zip(chain, chain[1:]))
+        assert all(path.exe_tags[row] == tag for row in chain)
+        assert sum(path.durations[row] for row in chain) == path.path_lengths[tag]
+        on_path[chain] = True
+    assert path.on_path.tolist() == on_path.tolist()
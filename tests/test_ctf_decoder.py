@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from scripts import ctf_decoder
+from scripts.ctf_writer import synthetic_events, write_trace
+from scripts.parallel_decode import stream_files
+from scripts.time_window import NO_BEGIN, NO_END, within_limits
+
+
+@pytest.fixture(scope="module")
+def events():
+    return synthetic_events(tags=500, cpus=4)
+
+
+@pytest.fixture(scope="module")
+def ctf_path(tmp_path_factory, events):
+    '''Synthetic trace with a few hundred packets per stream file'''
+    ctf_path = os.path.join(tmp_path_factory.mktemp("trace"), "ctf")
+    write_trace(ctf_path, events, offset_ns=1600000000000000000)
+    return ctf_path
+
+
+def written_rows(events, cpu, limits):
+    '''Rows of the starts, finishes and instantaneous events written to the stream file of a cpu, and its first event'''
+    rows = {"starts": [], "finishes": [], "inst": []}
+    first_event = None
+    for timestamp, name, values, event_cpu in events:
+        if event_cpu != cpu or not within_limits(limits, timestamp, values["timestamp_ns"]):
+            continue
+        if first_event is None:
+            first_event = (timestamp, values["timestamp_ns"])
+        tag = (values["timestamp_ns"], values["timestamp_microstep"])
+        if name == "reactor_cpp:reaction_execution_starts":
+            rows["starts"].append((tuple(values["reaction_name"].rsplit(".", 1)),) + tag + (timestamp, values["worker_id"]))
+        elif name == "reactor_cpp:reaction_execution_finishes":
+            rows["finishes"].append((tuple(values["reaction_name"].rsplit(".", 1)),) + tag + (timestamp,))
+        else:
+            target = values["action_name"] if name == "reactor_cpp:schedule_action" else values["reaction_name"]
+            rows["inst"].append(((values["reactor_name"], target),) + tag + (timestamp, name == "reactor_cpp:trigger_reaction"))
+    return {table: sorted(table_rows) for table, table_rows in rows.items()}, first_event
+
+
+def decoded_rows(partition):
+    '''Rows of the starts, finishes and instantaneous events of a decoded stream file (paired executions split again), and its
+    first event'''
+    def rows(columns, names):
+        return list(zip([partition["names"][code] for code in columns["name"].tolist()], *(columns[name].tolist() for name in names)))
+
+    exe = partition["exe"]
+    return {"starts": sorted(rows(exe, ("logical_time", "microstep", "start", "worker"))
+                             + rows(partition["starts"], ("logical_time", "microstep", "start", "worker"))),
+            "finishes": sorted(rows(exe, ("logical_time", "microstep", "end")) + rows(partition["finishes"], ("logical_time", "microstep", "end"))),
+            "inst": sorted(rows(partition["inst"], ("logical_time", "microstep", "timestamp", "is_reaction")))}, partition["first_event"]
+
+
+def test_matches_babeltrace(ctf_path):
+    # The decoder is compared with (and falls back to) the Babeltrace 2 Python bindings
+    pytest.importorskip("bt2")
+    assert ctf_decoder.compare_with_babeltrace(ctf_path) == []
+
+
+def test_matches_written_events(ctf_path, events):
+    # Whole trace, and windows of physical and logical time (packets are skipped and decoded in batches of different sizes)
+    first_timestamp, first_logical = min((timestamp, values["timestamp_ns"]) for timestamp, name, values, cpu in events)
+    assert ctf_decoder.open_trace(ctf_path).first_event() == (first_timestamp, first_logical)
+    windows = [None, (first_timestamp + 10**6, first_timestamp + 10**7, NO_BEGIN, NO_END),
+               (NO_BEGIN, NO_END, first_logical + 10**8, first_logical + 2 * 10**8)]
+
+    for limits in windows:
+        for stream in stream_files(ctf_path):
+            cpu = int(stream.split("_")[1])
+            expected = written_rows(events, cpu, limits or (NO_BEGIN, NO_END, NO_BEGIN, NO_END))
+            assert decoded_rows(ctf_decoder.decode_stream(ctf_path, stream, limits)) == expected
@@ -0,0 +1,63 @@
+from collections import defaultdict
+import random
+
+import numpy as np
+
+from scripts.dependencies import dependency_edges, dependency_pairs, next_greater
+from scripts.event_store import name_categories
+
+
+def baseline_pairs(names, logical_times, microsteps, dependency_dict):
+    '''Pairs of rows found by the nested scan of the original visualisers.find_dependencies'''
+    pairs = []
+    for pos in range(len(names)):
+        for inc_index in range(pos + 1, len(names)):
+            if logical_times[inc_index] > logical_times[pos]:
+                break
+            if logical_times[inc_index] == logical_times[pos] and microsteps[inc_index] == microsteps[pos] \
+                    and names[inc_index] in dependency_dict[names[pos]]:
+                pairs.append((pos, inc_index))
+    return pairs
+
+
+def find_pairs(names, logical_times, microsteps, dependency_dict):
+    categories = name_categories()
+    codes = [categories.add(name, {}) for name in names]
+    i, j = dependency_pairs(codes, logical_times, microsteps, dependency_edges(categories, dependency_dict))
+    return list(zip(i.tolist(), j.tolist()))
+
+
+def test_next_greater():
+    assert next_greater(np.array([3, 1, 2, 5, 4, 4])).tolist() == [3, 2, 3, 6, 6, 6]
+
+
+def test_hand_checked_pairs():
+    # a depends on b (listed twice), b on c. Row 2 has another microstep, row 4 a greater logical time, which ends the scan of
+    # rows 0 to 3 (so row 5 is not paired with row 0), and row 5 is not paired with row 7 because of row 6
+    dependency_dict = defaultdict(list, {"a": ["b", "b"], "b": ["c"]})
+    names = ["a", "b", "b", "c", "b", "b", "c", "c"]
+    logical_times = [0, 0, 0, 0, 1, 0, 1, 0]
+    microsteps = [0, 0, 1, 0, 0, 0, 0, 0]
+    assert baseline_pairs(names, logical_times, microsteps, dependency_dict) == [(0, 1), (1, 3), (4, 6)]
+    assert find_pairs(names, logical_times, microsteps, dependency_dict) == [(0, 1), (1, 3), (4, 6)]
+
+
+def test_matches_baseline():
+    # Executions ordered by end time, so logical times mostly increase but sometimes go back, with repeated reactions and tags
+    random_generator = random.Random(0)
+    reactions = ["r%d" % reaction for reaction in range(6)]
+    dependency_dict = defaultdict(list)
+    for reaction in reactions:
+        dependency_dict[reaction] = [random_generator.choice(reactions) for dependency in range(random_generator.randrange(4))]
+
+    names, logical_times, microsteps = [], [], []
+    logical_time = 0
+    for row in range(400):
+        logical_time += random_generator.choice([0, 0, 0, 1])
+        names.append(random_generator.choice(reactions))
+        logical_times.append(logical_time - random_generator.choice([0, 0, 0, 0, 1, 2]))
+        microsteps.append(random_generator.choice([0, 0, 1]))
+
+    expected = baseline_pairs(names, logical_times, microsteps, dependency_dict)
+    assert len(expected) > 100
+    assert find_pairs(names, logical_times, microsteps, dependency_dict) == expected
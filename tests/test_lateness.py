@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+
+from scripts.event_store import execution_table, name_categories
+from scripts.lateness import QUANTILES, lateness
+from scripts.tags import tag_index
+
+
+def find_lateness(executions, alignment="min"):
+    '''lateness of executions (name, logical_time, start_ns, end_ns), and the names of the reactions'''
+    categories = name_categories()
+    columns = list(zip(*executions))
+    exe_table = execution_table(categories, {"name_id": np.array([categories.add(name, {}) for name in columns[0]], dtype=np.int32),
+                                             "start_ns": np.array(columns[2]), "end_ns": np.array(columns[3]),
+                                             "logical_time": np.array(columns[1]), "microstep": np.zeros(len(executions), dtype=np.int64),
+                                             "worker": np.zeros(len(executions), dtype=np.int32)})
+    return lateness(exe_table, tag_index(exe_table), alignment), categories.names
+
+
+def test_hand_checked():
+    # Times in ms. b is the least late execution (5 ms after its tag), so the lateness of a is 5, 25, 15, 35 and 45 ms, and
+    # that of b 0 and 100 ms. The quantiles are the lower ones, e.g. p90 of a is the value of rank floor(0.9 * 4) = 3 (35 ms)
+    executions = [("b", 0, 5, 8), ("a", 0, 10, 12), ("a", 100, 130, 131), ("a", 200, 220, 221), ("b", 300, 405, 406),
+                  ("a", 400, 440, 441), ("a", 500, 550, 551)]
+    late, names = find_lateness([(name, logical_time * 10**6, start * 10**6, end * 10**6) for name, logical_time, start, end in executions])
+    assert late.offset == 5 * 10**6
+    assert (late.lateness // 10**6).tolist() == [0, 5, 25, 15, 100, 35, 45]
+    assert (late.tag_start_lateness // 10**6).tolist() == [0, 25, 15, 100, 35, 45]
+    assert (late.tag_end_lateness // 10**6).tolist() == [7, 26, 16, 101, 36, 46]
+    assert late.late_tags(20 * 10**6).tolist() == [3, 5, 4, 1]
+
+    reactions = late.reaction_table(names)
+    assert reactions["name"] == ["a", "b"]
+    assert reactions["count"].tolist() == [5, 2]
+    assert reactions["mean_ms"].tolist() == [25, 50]
+    assert reactions["p50_ms"].tolist() == [25, 0]
+    assert reactions["p90_ms"].tolist() == [35, 0]
+    assert reactions["p99_ms"].tolist() == [35, 0]
+    assert reactions["max_ms"].tolist() == [45, 100]
+
+    # With the first event on time, the lateness is the lag between the clocks
+    assert (find_lateness([("a", 0, 5, 8), ("a", 10, 12, 13)], "first")[0].lateness).tolist() == [5, 2]
+
+
+def test_matches_sorted_lateness():
+    # Random reactions and lags, compared with the lower quantiles read from the sorted lateness of each reaction
+    random_generator = random.Random(0)
+    executions = []
+    for row in range(500):
+        start = row * 1000 + random_generator.randrange(10**6)
+        executions.append(("r%d" % random_generator.randrange(7), row * 1000, start, start + 10))
+    late, names = find_lateness(executions)
+    reactions = late.reaction_table(names)
+
+    lags = {}
+    for name, logical_time, start, end in executions:
+        lags.setdefault(name, []).append(start - logical_time - late.offset)
+    assert sorted(reactions["name"]) == sorted(lags)
+    for row, name in enumerate(reactions["name"]):
+        values = sorted(lags[name])
+        assert reactions["count"][row] == len(values)
+        assert np.isclose(reactions["mean_ms"][row], sum(values) / len(values) / 1e6)
+        for q in QUANTILES:
+            assert reactions["p" + str(int(q * 100)) + "_ms"][row] == values[int(q * (len(values) - 1))] / 1e6
+        assert reactions["max_ms"][row] == values[-1] / 1e6
+    assert list(reactions["p99_ms"]) == sorted(reactions["p99_ms"], reverse=True)
@@ -0,0 +1,77 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from scripts.sketch import ddsketch
+
+
+def exact_quantile(values, q):
+    '''Lower quantile q of the values, i.e. the value of rank floor(q * (n - 1))'''
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+def within_accuracy(sketch, values, q):
+    # Tiny margin for the rounding of the logarithms at the bounds of the buckets
+    expected = exact_quantile(values, q)
+    return abs(sketch.quantile(q) - expected) <= sketch.relative_accuracy * abs(expected) * (1 + 1e-9)
+
+
+def test_hand_checked():
+    # With 1% accuracy, gamma = 1.01 / 0.99 and 10 falls in bucket ceil(ln(10) / ln(gamma)) = 116, whose middle value
+    # 2 * gamma^116 / (gamma + 1) is about 10.07. The two zeros have no bucket and are returned as 0
+    sketch = ddsketch(0.01)
+    sketch.add([0, 0, 10, 100, 1000])
+    assert (len(sketch), sketch.zero_count, sketch.counts.sum()) == (5, 2, 3)
+    assert (sketch.min, sketch.max, sketch.mean()) == (0, 1000, 222)
+    assert sketch.bucket(np.array([10.0])).tolist() == [116]
+    assert sketch.quantile(0) == sketch.quantile(0.25) == 0
+    gamma = 1.01 / 0.99
+    assert sketch.quantile(0.5) == pytest.approx(2 * gamma ** 116 / (gamma + 1))
+    assert abs(sketch.quantile(0.5) - 10) < 0.1
+    assert abs(sketch.quantile(0.75) - 100) < 1
+    # The middle of the bucket of 1000 is above it, so the maximum is returned instead
+    assert sketch.quantile(1) == 1000
+
+    assert math.isnan(ddsketch().quantile(0.5)) and math.isnan(ddsketch().mean())
+
+
+def test_relative_accuracy():
+    # Durations spread over several orders of magnitude, added in batches
+    random_generator = random.Random(0)
+    values = [random_generator.lognormvariate(10, 3) for value in range(5000)]
+    for relative_accuracy in [0.01, 0.05]:
+        sketch = ddsketch(relative_accuracy)
+        for batch in range(0, len(values), 700):
+            sketch.add(values[batch:batch + 700])
+        assert all(within_accuracy(sketch, values, q) for q in np.linspace(0, 1, 101))
+        assert sketch.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_merge():
+    # Sketches of disjoint ranges (so that merging extends the buckets on both sides) merge into the sketch of all the values
+    random_generator = random.Random(1)
+    parts = [[random_generator.uniform(low, 10 * low) for value in range(300)] for low in [100, 1, 10**4]]
+    sketches = []
+    for part in parts:
+        sketches.append(ddsketch())
+        sketches[-1].add(part)
+    merged = ddsketch()
+    for sketch in sketches + [ddsketch()]:
+        merged.merge(sketch)
+
+    whole = ddsketch()
+    whole.add(parts[0] + parts[1] + parts[2])
+    assert (merged.offset, merged.counts.tolist(), merged.count, merged.min, merged.max) == \
+           (whole.offset, whole.counts.tolist(), whole.count, whole.min, whole.max)
+    assert all(within_accuracy(merged, parts[0] + parts[1] + parts[2], q) for q in np.linspace(0, 1, 101))
+
+    # The serialised form gives back the same sketch
+    copy = ddsketch.from_dict(merged.to_dict())
+    assert copy.to_dict() == merged.to_dict()
+    assert copy.quantile(0.9) == merged.quantile(0.9)
+
+    with pytest.raises(ValueError):
+        merged.merge(ddsketch(0.05))
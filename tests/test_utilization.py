@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+
+from scripts.event_store import execution_table, name_categories
+from scripts.tags import tag_index
+from scripts.utilization import worker_utilization
+
+
+def utilization(executions):
+    '''worker_utilization of executions (start_ns, end_ns, worker, logical_time)'''
+    columns = list(zip(*executions))
+    exe_table = execution_table(name_categories(), {"name_id": np.zeros(len(executions), dtype=np.int32), "start_ns": np.array(columns[0]),
+                                                    "end_ns": np.array(columns[1]), "logical_time": np.array(columns[3]),
+                                                    "microstep": np.zeros(len(executions), dtype=np.int64), "worker": np.array(columns[2])})
+    return worker_utilization(exe_table, tag_index(exe_table))
+
+
+def busy_nanoseconds(executions):
+    '''Array of shape (workers, ns) telling whether each worker was busy during each nanosecond of the trace'''
+    begin = min(start for start, end, worker, logical_time in executions)
+    end = max(end for start, end, worker, logical_time in executions)
+    busy = np.zeros((max(worker for start, end, worker, logical_time in executions) + 1, end - begin), dtype=np.bool_)
+    for start, end, worker, logical_time in executions:
+        busy[worker, start - begin:end - begin] = True
+    return busy
+
+
+def test_hand_checked():
+    # Worker 0 is busy from 0 to 20 (two overlapping executions) and from 30 to 40, worker 1 from 10 to 30. Tag 1 starts
+    # executing at 5 and its last reaction starts at 10, so 5 ns of the first idle gap of worker 1 are pending
+    workers = utilization([(0, 10, 0, 0), (5, 20, 0, 1), (10, 30, 1, 1), (30, 40, 0, 2)])
+    assert workers.busy_ns.tolist() == [30, 20]
+    assert workers.idle_ns.tolist() == [10, 20]
+    assert workers.idle_pending_ns.tolist() == [0, 5]
+    assert {column: values.tolist() for column, values in workers.stalls().items()} == \
+           {"worker": [1], "start_ns": [0], "end_ns": [10], "pending_ns": [5]}
+
+    # 0 ns with no busy worker, 30 ns with one, 10 ns (from 10 to 20) with both
+    assert workers.concurrency().tolist() == [0, 30, 10]
+
+    window_starts, busy = workers.windows(10, 5)
+    assert window_starts.tolist() == [0, 5, 10, 15, 20, 25, 30]
+    assert busy.tolist() == [[1, 1, 1, 0.5, 0, 0.5, 1], [0, 0.5, 1, 1, 1, 0.5, 0]]
+
+
+def test_matches_nanoseconds():
+    # Random overlapping and empty executions, compared with the busy state of every nanosecond
+    random_generator = random.Random(0)
+    executions = []
+    for execution in range(200):
+        start = random_generator.randrange(1000)
+        executions.append((start, start + random_generator.choice([0, 1, 5, 20, 50]), random_generator.randrange(4),
+                           random_generator.randrange(50)))
+    busy = busy_nanoseconds(executions)
+    workers = utilization(executions)
+
+    assert workers.busy_ns.tolist() == busy.sum(axis=1).tolist()
+    assert workers.concurrency().tolist() == np.bincount(busy.sum(axis=0), minlength=len(busy) + 1).tolist()
+
+    window_starts, windows = workers.windows(100, 30)
+    begin = workers.begin_ns
+    expected = [[busy[worker, start - begin:start - begin + 100].sum() / 100 for start in window_starts.tolist()]
+                for worker in range(len(busy))]
+    assert np.allclose(windows, expected)
@@ -1,77 +1,58 @@
 #!/usr/bin/env python3
-from scripts.read_ctf import parser
+from scripts.trace_data import trace_data, PALETTE
+from scripts.level_of_detail import interval_index
+from scripts.profiling import stage
 
+# Only the Bokeh backend is imported with this module (holoviews and pandas are imported by the holoviews views), and this module
+# is only imported by main.py when a view is rendered, so that the other modes start without loading the plotting libraries
 from bokeh.io import output_file, show
-from bokeh.models import ColumnDataSource, HoverTool, Arrow, OpenHead, PrintfTickFormatter
+from bokeh.models import ColumnDataSource, HoverTool, Arrow, OpenHead, PrintfTickFormatter, CustomJSTransform, CustomJSHover
+from bokeh.transform import transform
 from bokeh.plotting import figure, show
-from bokeh.palettes import Set1 as palette
 from bokeh.models import Title
 from bokeh.models import Panel, Tabs
-import pandas as pd
-import holoviews as hv
-from holoviews import opts
-import regex
+import numpy as np
 
 
 
-class visualisers:
-    
-    def __init__(self, ctf_filepath, yaml_filepath, include_regex, exclude_regex, plain_view, logic_lines_view):
-        self.data_parser = parser()
-        self.data_parser.parse(ctf_filepath, yaml_filepath)
-        
-        # All execution events
-        self.ordered_exe_events = self.data_parser.get_ordered_exe_events()
-        
-        # All instantaneous reactions
-        self.ordered_inst_events_reactions = self.data_parser.get_ordered_inst_events_reactions()
-        
-        # All instantaneous actions
-        self.ordered_inst_events_actions = self.data_parser.get_ordered_inst_events_actions()
-        
-        # Dictionaries which contain pairs for the numbers assigned to a reactor
-        self.labels = self.data_parser.get_y_axis_labels()
+# Columns of each event table sent to the browser. Only values which change per event are included: the name and YAML
+# attributes of each reaction are sent once (see metadata_hover) and looked up by name_id in the tooltips
+EXE_SOURCE_COLUMNS = ["name_id", "tag", "time_start", "time_end", "y_axis", "worker", "logical_time", "microstep"]
+INSTANT_SOURCE_COLUMNS = ["name_id", "tag", "logical_time", "y_axis", "microstep"]
 
-        # Dictionary that is the inverse of self.labels
-        self.number_labels = self.data_parser.get_number_label()
-        
-        # Dictionary containing a port as a key, with the value containing the reactions triggered by the downstream port (of the current port)
-        self.port_dict = self.data_parser.get_port_dict()
-        
-        # Dictionary containing all dependencies between reactions
-        self.dependency_dict = self.data_parser.get_dependency_dict()
-        
-        # List containing all reaction names
-        self.action_names = self.data_parser.get_action_names()
-        
-        # List containing 4-tuples for arrow drawing
-        self.arrow_pos = []
-        
-        # Stores whether to show coloured graph
-        self.diable_arrows = False
-        
-        # Graph name is the name of the main reactor
-        self.graph_name = self.data_parser.get_main_reactor_name()
+# Reaction attributes available to the tooltips, as @name_id{attribute}
+METADATA_ATTRIBUTES = ["priority", "level", "type"]
+
+# Rasterized holoviews views: maximum number of executions in the visible range drawn individually (with their tooltips) on top
+# of the raster
+HOVER_LIMIT = 20000
 
+
+class visualisers(trace_data):
+    '''Bokeh and holoviews views of a parsed trace (see trace_data). Holoviews and pandas are only imported by the holoviews
+    views'''
+    
+    def __init__(self, ctf_filepath, yaml_filepath, include_regex, exclude_regex, plain_view, logic_lines_view, cache=None, jobs=1, native=False, window=None,
+                 filter_on_load=False, data_parser=None):
         # Booleans containing which views to include, based on user flags
         self.plain_view = plain_view 
         self.logic_lines_view = logic_lines_view
 
-        # If --include or --exclude flag was set by user, remove actions and reaction accordingly
-        self.remove_reactions(include_regex, exclude_regex)
-
-        # Colour actions and reactions based on their logical time
-        self.colour()
+        # Parse, filter and colour the trace
+        super().__init__(ctf_filepath, yaml_filepath, include_regex, exclude_regex, cache, jobs, native, window, filter_on_load, data_parser)
         
         
     
-    def bokeh_visualisation(self):
+    def bokeh_visualisation(self, utilization=False, critical=False):
         """Builds the bokeh visualisation. First assembles the plots and all options,"""
 
         
         # Output to 
         output_file(self.graph_name + ".html")
 
+        # Columns of the execution events used below (the data sources are built by data_sources)
+        exe_columns = self.ordered_exe_events.as_dict(["time_start", "time_end", "worker"])
+
 
 
         # plot which displays colours
@@ -96,13 +77,29 @@ class visualisers:
         # Disbale arrows if reactions are removed in above block.
         if not self.diable_arrows:
             # Discover all dependencies
-            self.find_dependencies()
-        
-        # Draw
-        for x_start, y_start, x_end, y_end in self.arrow_pos:
-            p_arrows.add_layout(Arrow(end=OpenHead(
-                line_width=1, size=5), line_color="lightblue", x_start=x_start, y_start=y_start, line_width=0.7,
-                x_end=x_end, y_end=y_end))
+            with stage("find_dependencies") as record:
+                self.find_dependencies()
+                record["events"] = len(self.ordered_exe_events)
+        
+        # Draw all arrows with a single Arrow model, so that the document size grows linearly with the number of arrows
+        p_arrows.add_layout(Arrow(end=OpenHead(
+            line_width=1, size=5), line_color="lightblue", x_start="x_start", y_start="y_start", line_width=0.7,
+            x_end="x_end", y_end="y_end", source=ColumnDataSource(self.arrow_pos)))
+
+        # Critical path of every tag (if enabled), drawn over the dependencies: its arrows in red, and its executions outlined
+        if critical and not self.diable_arrows:
+            paths = self.critical_path()
+            print(paths.report(self.ordered_exe_events.categories.names))
+
+            path_sources, path_targets = paths.critical_edges()
+            y_axis = self.ordered_exe_events["y_axis"]
+            p_arrows.add_layout(Arrow(end=OpenHead(line_width=2, size=6, line_color="red"), line_color="red", line_width=2,
+                x_start="x_start", y_start="y_start", x_end="x_end", y_end="y_end",
+                source=ColumnDataSource({"x_start": exe_columns["time_end"][path_sources], "y_start": y_axis[path_sources],
+                                         "x_end": exe_columns["time_start"][path_targets], "y_end": y_axis[path_targets]})))
+            on_path = np.flatnonzero(paths.on_path)
+            p_arrows.segment(x0=exe_columns["time_start"][on_path], y0=y_axis[on_path], x1=exe_columns["time_end"][on_path], y1=y_axis[on_path],
+                             color="red", line_width=12, alpha=0.3, legend_label="Critical Path", muted_alpha=0.05)
 
 
         # -------------------------------------------------------------------
@@ -113,31 +110,11 @@ class visualisers:
             min_y = list(self.number_labels.keys())[0]
             max_y = list(self.number_labels.keys())[-1]
 
-            # list to track x values of lines
-            line_x_coords = []
-            
-        # Each new logical time (logical_time, microstep) is encoded with a new colour
-            if len(self.ordered_exe_events["colours"]) > 0: #If more than one event exists
-                
-                # Get the first colour
-                current_colour = self.ordered_exe_events["colours"][0]
-
-                # Iterate through all positions in the self.ordered_exe_events list
-                for i in range(len(self.ordered_exe_events["colours"])):
-                    new_colour = self.ordered_exe_events["colours"][i]
-
-                    # New logical time reached when a colour change occurs (colours are computed earlier in the script)
-                    if current_colour != new_colour:
-                        
-                        # Get the x value between the end of old logical time and the start of the new one (so that the line falls in the middle, between
-                        # logical times)
-                        x_value = (self.ordered_exe_events["time_start"][i] + self.ordered_exe_events["time_end"][i-1]) / 2
-
-                        # Append the x-value where the line is to be placed to the list
-                        line_x_coords.append(x_value)
-
-                        # Assign current_colour variable the newly reached colour
-                        current_colour = new_colour
+            # A new logical time (logical_time, microstep) is reached when the tag changes between consecutive executions. The line
+            # is placed between the end of the old logical time and the start of the new one (so that the line falls in the middle,
+            # between logical times)
+            boundaries = self.tags.boundaries(self.ordered_exe_events)
+            line_x_coords = ((exe_columns["time_start"][boundaries] + exe_columns["time_end"][boundaries - 1]) / 2).tolist()
 
 
             # Segment plotting requires x0, y0, x1, y1 to plot a line. Below lists are as long as line_x_coords list, containing the same y value
@@ -149,25 +126,35 @@ class visualisers:
                 y1=line_y1_coords, color="lightgrey", line_width=1)     
 
         # -------------------------------------------------------------------
-        # All execution events
+        # Data sources and transforms
 
-        # Plot the data with multiline, adding it to each available plot. 
+        # One data source per event table, shared by all views. Columns are typed NumPy arrays where possible, so that they are
+        # serialised as binary arrays. Colours and marker positions are computed in the browser by the transforms below
+        source_exec_events, source_inst_events_reactions, source_inst_events_actions = self.data_sources()
 
-        
-        # data source
-        source_exec_events = ColumnDataSource(self.ordered_exe_events)
+        # Middle point of every execution, between its start and end time
+        exe_midpoint = CustomJSTransform(args={"source": source_exec_events},
+                                         v_func="const ends = source.data.time_end; return xs.map((start, i) => (start + ends[i]) / 2)")
+
+        colours = self.tag_colours()
+        x_marker = transform("time_start", exe_midpoint)
+
+        # -------------------------------------------------------------------
+        # All execution events
+
+        # Plot the data with segments (from the start to the end of each execution), adding it to each available plot. 
         
         # Plotting with bokeh:
         # https://docs.bokeh.org/en/latest/docs/user_guide/plotting.html#line-glyphs
 
-        exe_line_colours = p_colours.multi_line(xs='x_multi_line', ys='y_multi_line', width=8, color="colours", hover_alpha=0.5,
-                                               source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
+        exe_line_colours = p_colours.segment(x0='time_start', y0='y_axis', x1='time_end', y1='y_axis', width=8, color=colours, hover_alpha=0.5,
+                                             source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
         
-        exe_line_arrows = p_arrows.multi_line(xs='x_multi_line', ys='y_multi_line', width=8, color="colours", hover_alpha=0.5,
-                                                source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
+        exe_line_arrows = p_arrows.segment(x0='time_start', y0='y_axis', x1='time_end', y1='y_axis', width=8, color=colours, hover_alpha=0.5,
+                                           source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
         
-        exe_line_physical_time = p_physical_time.multi_line(xs='x_multi_line', ys='y_multi_line', width=8, color="colours", hover_alpha=0.5,
-                                                source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
+        exe_line_physical_time = p_physical_time.segment(x0='time_start', y0='y_axis', x1='time_end', y1='y_axis', width=8, color=colours, hover_alpha=0.5,
+                                                         source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
         # -------------------------------------------------------------------      
         
         # Execution event markers 
@@ -175,53 +162,28 @@ class visualisers:
         # Primary purpose is for showing the user where very short execution events are on the graph, which would not be 
         # visible without large amounts of zoom
 
-        # Find the middle point of every execution. x_multi_line contains start and end time as tuple. Take the middle value of this
-        exe_x_marker = [((x1 + x2)/2)
-                        for x1, x2 in self.ordered_exe_events["x_multi_line"]]
-        
-        # Y-value of the marker
-        exe_y_marker = self.ordered_exe_events["y_axis"]
-        
-        # Assemble dict
-        dict_exec_markers = {"x_values" : exe_x_marker,
-                            "y_values" : exe_y_marker,
-                            "name": self.ordered_exe_events["name"],
-                            "default_colours" : self.ordered_exe_events["default_colours"],
-                            "colours" : self.ordered_exe_events["colours"],
-                            "time_start" : self.ordered_exe_events["time_start"],
-                            "time_end" : self.ordered_exe_events["time_end"],
-                            "priority" : self.ordered_exe_events["priority"],
-                            "level" : self.ordered_exe_events["level"],
-                            "logical_time" : self.ordered_exe_events["logical_time"],
-                            "microstep" : self.ordered_exe_events["microstep"]}
-        # Set datasource
-        source_exec_markers = ColumnDataSource(data=dict_exec_markers)
-
         # Add to plots
-        p_colours.diamond(x='x_values', y='y_values', color="colours",
-                          size=7, source=source_exec_markers, legend_label="Execution Event Markers", muted_alpha=0.2)
+        p_colours.diamond(x=x_marker, y='y_axis', color=colours,
+                          size=7, source=source_exec_events, legend_label="Execution Event Markers", muted_alpha=0.2)
         
-        p_arrows.diamond(x='x_values', y='y_values', color="colours",
-                          size=7, source=source_exec_markers, legend_label="Execution Event Markers", muted_alpha=0.2)
+        p_arrows.diamond(x=x_marker, y='y_axis', color=colours,
+                          size=7, source=source_exec_events, legend_label="Execution Event Markers", muted_alpha=0.2)
 
 
-        p_physical_time.diamond(x='x_values', y='y_values', color="colours",
-                        size=7, source=source_exec_markers, legend_label="Execution Event Markers", muted_alpha=0.2)
+        p_physical_time.diamond(x=x_marker, y='y_axis', color=colours,
+                        size=7, source=source_exec_events, legend_label="Execution Event Markers", muted_alpha=0.2)
 
         # -------------------------------------------------------------------
         
         # All reactions
         # The markers denoting the logical time execution of a reaction. 
-
-        # Add to data source
-        source_inst_events_reactions = ColumnDataSource(self.ordered_inst_events_reactions)
         
         # Add to plots
-        inst_reaction_hex_colours = p_colours.hex(x='time_start', y='y_axis', fill_color='colours', line_color="lightgrey",
+        inst_reaction_hex_colours = p_colours.hex(x='logical_time', y='y_axis', fill_color=colours, line_color="lightgrey",
                                   size=10, source=source_inst_events_reactions, legend_label="Reactions", muted_alpha=0.2)
 
 
-        inst_reaction_hex_arrows = p_arrows.hex(x='time_start', y='y_axis', fill_color='colours', line_color="lightgrey",
+        inst_reaction_hex_arrows = p_arrows.hex(x='logical_time', y='y_axis', fill_color=colours, line_color="lightgrey",
                                                 size=10, source=source_inst_events_reactions, legend_label="Reactions", muted_alpha=0.2)
 
         # -------------------------------------------------------------------
@@ -229,18 +191,15 @@ class visualisers:
         # All actions
         # The markers denoting the logical time execution of an action. 
 
-        # Add to data source
-        source_inst_events_actions = ColumnDataSource(self.ordered_inst_events_actions)
-
         # Add to plots
-        inst_action_hex_colours = p_colours.inverted_triangle(x='time_start', y='y_axis', fill_color='colours', line_color="lightgrey",
+        inst_action_hex_colours = p_colours.inverted_triangle(x='logical_time', y='y_axis', fill_color=colours, line_color="lightgrey",
                                               size=10, source=source_inst_events_actions, legend_label="Actions", muted_alpha=0.2)
         
-        inst_action_hex_arrows = p_arrows.inverted_triangle(x='time_start', y='y_axis', fill_color='colours', line_color="lightgrey",
+        inst_action_hex_arrows = p_arrows.inverted_triangle(x='logical_time', y='y_axis', fill_color=colours, line_color="lightgrey",
                                                               size=10, source=source_inst_events_actions, legend_label="Actions", muted_alpha=0.2)
 
 
-        inst_action_hex_physical_time = p_physical_time.inverted_triangle(x='time_start', y='y_axis', fill_color='colours', line_color="lightgrey",
+        inst_action_hex_physical_time = p_physical_time.inverted_triangle(x='logical_time', y='y_axis', fill_color=colours, line_color="lightgrey",
                                                       size=10, source=source_inst_events_actions, legend_label="Actions", muted_alpha=0.2)
 
         
@@ -248,52 +207,39 @@ class visualisers:
 
         # Worker view 
         # Includes only exection events as these are the physical executions done by the workers. Each y-axis value is a numbered worker. 
-        
-        worker_y_marker = list()
-        
-        # Build list of tuples of workers (y-axis integer), needed to plot multiline graph
-        for y_value in self.ordered_exe_events["worker"]:
-            worker_y_marker.append([y_value, y_value])
-
-        # Assemble dictionary
-        dict_workers = {"x_values" : self.ordered_exe_events["x_multi_line"],
-                            "y_values" : worker_y_marker,
-                            "name": self.ordered_exe_events["name"],
-                            "default_colours" : self.ordered_exe_events["default_colours"],
-                            "colours" : self.ordered_exe_events["colours"],
-                            "time_start" : self.ordered_exe_events["time_start"],
-                            "time_end" : self.ordered_exe_events["time_end"],
-                            "priority" : self.ordered_exe_events["priority"],
-                            "level" : self.ordered_exe_events["level"],
-                            "logical_time" : self.ordered_exe_events["logical_time"],
-                            "microstep" : self.ordered_exe_events["microstep"]}
-
-        source_workers = ColumnDataSource(data=dict_workers)
 
         # Add to plot
-        workers = p_workers.multi_line(xs='x_values', ys='y_values', width=8, color="colours", hover_alpha=0.5,
-                                               source=source_workers, legend_label="Execution Events", muted_alpha=0.2)
+        workers = p_workers.segment(x0='time_start', y0='worker', x1='time_end', y1='worker', width=8, color=colours, hover_alpha=0.5,
+                                    source=source_exec_events, legend_label="Execution Events", muted_alpha=0.2)
 
 
         # -------------------------------------------------------------------
         
         # Identical to execution markers. Denote executions with a marker, to make small (short) executions visible on the graph
         # Here markers are invisible until toggled in the legend. Abused by making the normal alpha = 0, muted alpha = 0.5
-        exe_x_marker = [((x1 + x2)/2)
-                        for x1, x2 in self.ordered_exe_events["x_multi_line"]]
-        exe_y_marker = self.ordered_exe_events["worker"]
-        
-        dict_workers_markers = {"x_values" : exe_x_marker,
-                            "y_values" : exe_y_marker,
-                            "name": self.ordered_exe_events["name"],
-                            "default_colours" : self.ordered_exe_events["default_colours"],
-                            "colours" : self.ordered_exe_events["colours"]}
-        
-        source_workers_markers = ColumnDataSource(data=dict_workers_markers)
+        p_workers.diamond(x=x_marker, y='worker', color=colours,
+                          size=7, source=source_exec_events, legend_label="Execution Event Markers", alpha=0, muted_alpha=0.5)
+
+
+        # -------------------------------------------------------------------
+
+        # Worker utilization (if enabled): the busy fraction of each worker over sliding windows is drawn as a line within its row
+        # (from worker - 0.4 when idle to worker + 0.4 when always busy), and the idle gaps during which work was pending are
+        # marked in red
+        if utilization:
+            analysis = self.worker_utilization()
+            print(analysis.report())
 
-        p_workers.diamond(x='x_values', y='y_values', color="colours",
-                          size=7, source=source_workers_markers, legend_label="Execution Event Markers", alpha=0, muted_alpha=0.5)
+            window_starts, busy_fractions = analysis.windows()
+            window_width = window_starts[1] - window_starts[0] if len(window_starts) > 1 else analysis.end_ns - analysis.begin_ns
+            window_x = ((window_starts + window_width / 2) / 1000.0).tolist()
+            p_workers.multi_line(xs=[window_x] * analysis.worker_count,
+                                 ys=[(worker - 0.4 + 0.8 * busy_fractions[worker]).tolist() for worker in range(analysis.worker_count)],
+                                 color="black", line_width=1, alpha=0.6, legend_label="Utilization", muted_alpha=0.1)
 
+            stalls = analysis.stalls()
+            p_workers.segment(x0=stalls["start_ns"] / 1000.0, y0=stalls["worker"], x1=stalls["end_ns"] / 1000.0, y1=stalls["worker"],
+                              color="red", line_width=3, alpha=0.5, legend_label="Idle While Work Pending", muted_alpha=0.1)
 
         # -------------------------------------------------------------------
 
@@ -319,8 +265,12 @@ class visualisers:
         
 
         # Worker y-axis display labels and ticker formating
-        worker_ticker = [y for y in range(max(self.ordered_exe_events["worker"]) + 1)]
-        worker_major_label_overrides = {i : ("Worker " + str(i)) for i in range(max(self.ordered_exe_events["worker"]) + 1)}
+        max_worker = int(exe_columns["worker"].max())
+        worker_ticker = [y for y in range(max_worker + 1)]
+        worker_major_label_overrides = {i : ("Worker " + str(i)) for i in range(max_worker + 1)}
+        if utilization:
+            worker_major_label_overrides = {i : label + " (" + format(busy, ".0%") + ")"
+                                            for (i, label), busy in zip(worker_major_label_overrides.items(), analysis.table()["utilization"])}
 
         # Add axis labels
         xaxis_label = "Time (ms)"
@@ -361,49 +311,52 @@ class visualisers:
 
         # Define tooltips for Reactions and Execution Events
         tooltips_reactions = [
-            ("name", "@name"),
-            ("time_start", "@time_start{0,0.00}"),
-            ("priority", "@priority"),
-            ("level", "@level"),
+            ("name", "@name_id{name}"),
+            ("time_start", "@logical_time{0,0.00}"),
+            ("priority", "@name_id{priority}"),
+            ("level", "@name_id{level}"),
             ("logical_time", "@logical_time"),
             ("microstep", "@microstep")
         ]
 
         # Define tooltips for Reactions and Execution Events
         tooltips_actions = [
-            ("name", "@name"),
-            ("time_start", "@time_start{0,0.00}"),
-            ("trace_event_type", "@trace_event_type"),
+            ("name", "@name_id{name}"),
+            ("time_start", "@logical_time{0,0.00}"),
+            ("trace_event_type", "@name_id{type}"),
             ("logical_time", "@logical_time"),
             ("microstep", "@microstep")
         ]
         
         tooltips_executions = [
-            ("name", "@name"),
+            ("name", "@name_id{name}"),
             ("time_start", "@time_start{0,0.00}"),
             ("time_end", "@time_end{0,0.00}"),
-            ("priority", "@priority"),
-            ("level", "@level"),
+            ("priority", "@name_id{priority}"),
+            ("level", "@name_id{level}"),
             ("logical_time", "@logical_time"),
             ("microstep", "@microstep")
         ]
         
+        # Lookup of the reaction names and attributes in the tooltips
+        metadata = {"@name_id": self.metadata_hover()}
+
         # Hover tool only for instantaneous events 
-        hover_tool_colours = HoverTool(tooltips=tooltips_reactions, renderers=[inst_reaction_hex_colours])
-        hover_tool_arrows = HoverTool(tooltips=tooltips_reactions, renderers=[inst_reaction_hex_arrows])
+        hover_tool_colours = HoverTool(tooltips=tooltips_reactions, renderers=[inst_reaction_hex_colours], formatters=metadata)
+        hover_tool_arrows = HoverTool(tooltips=tooltips_reactions, renderers=[inst_reaction_hex_arrows], formatters=metadata)
         
         # Hover tool only for instantaneous events and execution event lines (so that markers for exe events dont also have a tooltip)
-        hover_tool_actions_colours = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_colours])
-        hover_tool_actions_arrows = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_arrows])
-        hover_tool_actions_physical_time = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_physical_time])
+        hover_tool_actions_colours = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_colours], formatters=metadata)
+        hover_tool_actions_arrows = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_arrows], formatters=metadata)
+        hover_tool_actions_physical_time = HoverTool(tooltips=tooltips_actions, renderers=[inst_action_hex_physical_time], formatters=metadata)
         
         # Hover tool only for execution events (so that markers for exe events dont also have a tooltip)
-        hover_tool_executions_colours = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_colours])
-        hover_tool_executions_arrows = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_arrows])
-        hover_tool_executions_physical_time = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_physical_time])
+        hover_tool_executions_colours = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_colours], formatters=metadata)
+        hover_tool_executions_arrows = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_arrows], formatters=metadata)
+        hover_tool_executions_physical_time = HoverTool(tooltips=tooltips_executions, renderers=[exe_line_physical_time], formatters=metadata)
 
         # Hover tool for wokers
-        hover_tool_workers = HoverTool(tooltips=tooltips_executions, renderers=[workers])
+        hover_tool_workers = HoverTool(tooltips=tooltips_executions, renderers=[workers], formatters=metadata)
         
         # Add the tools to the plot
         p_colours.add_tools(hover_tool_colours, hover_tool_actions_colours, hover_tool_executions_colours)
@@ -419,24 +372,26 @@ class visualisers:
         workers = Panel(child=p_workers, title="workers")
         
         # Logic for showing different views, based on flags set by users
-        if not self.diable_arrows:
-            if self.plain_view and self.logic_lines_view:
-                show(Tabs(tabs=[coloured_trace, dependencies, physical_time, workers]))
-            elif self.logic_lines_view:
-                show(Tabs(tabs=[dependencies, physical_time, workers]))
-            elif self.plain_view:
-                show(Tabs(tabs=[coloured_trace, dependencies, workers]))
-            else:
-                show(Tabs(tabs=[dependencies, workers]))
+        # (show serializes the document and writes the HTML file)
+        with stage("bokeh_save"):
+            if not self.diable_arrows:
+                if self.plain_view and self.logic_lines_view:
+                    show(Tabs(tabs=[coloured_trace, dependencies, physical_time, workers]))
+                elif self.logic_lines_view:
+                    show(Tabs(tabs=[dependencies, physical_time, workers]))
+                elif self.plain_view:
+                    show(Tabs(tabs=[coloured_trace, dependencies, workers]))
+                else:
+                    show(Tabs(tabs=[dependencies, workers]))
         
-        else:
-            if self.logic_lines_view:
-                show(Tabs(tabs=[coloured_trace, physical_time, workers]))
             else:
-                show(Tabs(tabs=[coloured_trace, workers]))
+                if self.logic_lines_view:
+                    show(Tabs(tabs=[coloured_trace, physical_time, workers]))
+                else:
+                    show(Tabs(tabs=[coloured_trace, workers]))
 
         # 2x exec events because of exec markers 
-        total_data_points = len(self.ordered_inst_events_reactions["name"]) + len(self.ordered_inst_events_actions["name"]) + (2 * len(self.ordered_exe_events["name"]))
+        total_data_points = len(self.ordered_inst_events_reactions) + len(self.ordered_inst_events_actions) + (2 * len(self.ordered_exe_events))
         print("Number of points: " + str(total_data_points))
 
 
@@ -445,270 +400,156 @@ class visualisers:
 
 
 
-    def holoviews_visualisation(self):
+    def holoviews_visualisation(self, rasterize=False, port=0):
 
-         # Find the middle point of every execution. x_multi_line contains start and end time as tuple. Take the middle value of this
-        exe_x_marker = [((x1 + x2)/2)
-                        for x1, x2 in self.ordered_exe_events["x_multi_line"]]
-        
-        # Y-value of the marker
-        exe_y_marker = self.ordered_exe_events["y_axis"]
-        
-        # Assemble dict
-        dict_exec_markers = {"x_values" : exe_x_marker,
-                            "y_values" : exe_y_marker,
-                            "name": self.ordered_exe_events["name"],
-                            "default_colours" : self.ordered_exe_events["default_colours"],
-                            "colours" : self.ordered_exe_events["colours"],
-                            "time_start" : self.ordered_exe_events["time_start"],
-                            "time_end" : self.ordered_exe_events["time_end"],
-                            "priority" : self.ordered_exe_events["priority"],
-                            "level" : self.ordered_exe_events["level"],
-                            "logical_time" : self.ordered_exe_events["logical_time"],
-                            "microstep" : self.ordered_exe_events["microstep"]}
+        # Columns of the execution events
+        df_execution_markers = self.execution_frame()
+
+        # Find the middle point of every execution, between its start and end time
+        df_execution_markers["x_values"] = (df_execution_markers["time_start"] + df_execution_markers["time_end"]) / 2
 
-        
-        df_execution_markers = pd.DataFrame(dict_exec_markers)
 
 
         # Hover tool configuration 
         tooltips_executions = [
-            ("name", "@name"),
+            ("name", "@name_id{name}"),
             ("time_start", "@time_start{0,0.00}"),
             ("time_end", "@time_end{0,0.00}"),
-            ("priority", "@priority"),
-            ("level", "@level"),
+            ("priority", "@name_id{priority}"),
+            ("level", "@name_id{level}"),
             ("logical_time", "@logical_time"),
             ("microstep", "@microstep")
         ]
 
-        tooltips = HoverTool(tooltips=tooltips_executions)
+        metadata = {"@name_id": self.metadata_hover()}
+        tooltips = HoverTool(tooltips=tooltips_executions, formatters=metadata)
         
+        import holoviews as hv
         hv.extension('bokeh')
 
         # Tick formatting (remove main reactor name from all number labels)
         yticks = [(k, v.split(".", 1)[1]) for k, v in self.number_labels.items()]
         
-        exe_markers = hv.Scatter(df_execution_markers, ['x_values', 'y_values'], ["name", "colours", "time_start", "time_end", "priority", "level", "logical_time", "microstep"]).opts(
+        exe_markers = hv.Scatter(df_execution_markers, ['x_values', hv.Dimension('y_axis', label='y_values')], ["name_id", "colours", "time_start", "time_end", "logical_time", "microstep"]).opts(
             height=700, width=1300, color='colours', marker="diamond", tools=[tooltips], size=7, xformatter="%f", yticks = yticks)
 
-        
-        hv.save(exe_markers, self.graph_name + "_holoviews.html", backend='bokeh')
 
+        if rasterize:
+            plot = self.rasterized(exe_markers, df_execution_markers["x_values"], df_execution_markers["x_values"], df_execution_markers["y_axis"])
+            self.serve_holoviews(plot, port)
+        else:
+            hv.save(exe_markers, self.graph_name + "_holoviews.html", backend='bokeh')
 
 
 
 
 
-    def holoviews_worker_visualisation(self):
-        # Assemble data 
-        dict_workers = {"x_start" : self.ordered_exe_events["time_start"],
-                        "y_start" : self.ordered_exe_events["worker"],
-                        "x_end" : self.ordered_exe_events["time_end"],
-                        "y_end" : self.ordered_exe_events["worker"],
-                        "name": self.ordered_exe_events["name"],
-                        "default_colours" : self.ordered_exe_events["default_colours"],
-                        "colours" : self.ordered_exe_events["colours"],
-                        "time_start" : self.ordered_exe_events["time_start"],
-                        "time_end" : self.ordered_exe_events["time_end"],
-                        "priority" : self.ordered_exe_events["priority"],
-                        "level" : self.ordered_exe_events["level"],
-                        "logical_time" : self.ordered_exe_events["logical_time"],
-                        "microstep" : self.ordered_exe_events["microstep"]}
 
-        # Convert to pandas dataframe
-        df_worker_markers = pd.DataFrame(dict_workers)
+    def holoviews_worker_visualisation(self, rasterize=False, port=0):
+        # Columns of the execution events (segments need distinct columns for their start and end y-values)
+        df_worker_markers = self.execution_frame()
+        df_worker_markers["worker_end"] = df_worker_markers["worker"]
         
         
         # -------------------------------------------------------------------
         # Hover tool configuration 
         tooltips_executions = [
-            ("name", "@name"),
+            ("name", "@name_id{name}"),
             ("time_start", "@time_start{0,0.00}"),
             ("time_end", "@time_end{0,0.00}"),
-            ("priority", "@priority"),
-            ("level", "@level"),
+            ("priority", "@name_id{priority}"),
+            ("level", "@name_id{level}"),
             ("logical_time", "@logical_time"),
             ("microstep", "@microstep")
         ]
 
-        hover_tool_workers = HoverTool(tooltips=tooltips_executions)
+        metadata = {"@name_id": self.metadata_hover()}
+        hover_tool_workers = HoverTool(tooltips=tooltips_executions, formatters=metadata)
         # -------------------------------------------------------------------
 
         # load bokeh extension
+        import holoviews as hv
         hv.extension('bokeh')
 
         # Tick formatting 
-        worker_number_list = [y for y in range(max(self.ordered_exe_events["worker"]) + 1)]
+        worker_number_list = [y for y in range(int(df_worker_markers["worker"].max()) + 1)]
         yticks = [(y, "worker " + str(y)) for y in worker_number_list]  # of form: [(i, "worker i"), (i+1, "worker i+1"), ...] 
 
 
         # Define the holoviews plot and options
-        seg = hv.Segments(df_worker_markers, [hv.Dimension('x_start', label='time (ms)'), hv.Dimension('y_start', label='Worker'), 'x_end', 'y_end'], vdims=["name", "colours", "time_start", "time_end", "priority", "level", "logical_time", "microstep"]).opts(
+        seg = hv.Segments(df_worker_markers, [hv.Dimension('time_start', label='time (ms)'), hv.Dimension('worker', label='Worker'), 'time_end', 'worker_end'], vdims=["name_id", "colours", "logical_time", "microstep"]).opts(
                 height=700, width=1300, color='colours', tools=[hover_tool_workers], line_width=8, xformatter="%f", yticks=yticks)
         
-        # save file 
-        hv.save(seg, self.graph_name + "_holoviews_worker.html", backend='bokeh')
-
-
-
-
-
-
-    def colour(self):
-        '''Colour actions and reactions based on logical time. Each logical time is assigned a new colour from a palette of 9 colours. 
-        All logical times an action or reaction was executed at are found, then each is assigned a colour.'''
-        
-            
-        # Set some default colour for all actions and reactions, to populate the dictionary
-        default_colour = "lightgrey"
-        
-        # Set the default colours for all actions and reactions
-        for data_dict in [self.ordered_inst_events_reactions, self.ordered_inst_events_actions, self.ordered_exe_events]:
-            data_dict["default_colours"] = [default_colour for x in data_dict["name"]]
-            data_dict["colours"] = [default_colour for x in data_dict["name"]]
-
-
-        
-        # Find all possible logical times, by getting the logical time of all possible events (actions, reactions and physical executions).
-        action_logic_times = set(zip(
-            self.ordered_inst_events_actions["logical_time"], self.ordered_inst_events_actions["microstep"]))
-        
-        reaction_logic_times = set(zip(
-            self.ordered_inst_events_reactions["logical_time"], self.ordered_inst_events_reactions["microstep"]))
-
-        execution_logic_times = set(zip(
-            self.ordered_exe_events["logical_time"], self.ordered_exe_events["microstep"]))
-        
-        # compile all tuples of logical times into one list
-        action_logic_times.update(reaction_logic_times, execution_logic_times)
-        
-        # Sorted set of all logical times (time, microstep)
-        all_logic_times = sorted(action_logic_times)
-        
-        # Dictionary containing tuple as key, colour as value
-        logical_colours_dict = {}
-        
-        # Assign colours to logical times
-        palette_pos = 0
-        for logical_time in all_logic_times:
-            logical_colours_dict[logical_time] = palette[9][palette_pos % 9]
-            palette_pos += 1
-            
-        # Assign colours to reactions
-        for dictonary in [self.ordered_exe_events, self.ordered_inst_events_actions, self.ordered_inst_events_reactions]:
-            for pos in range(len(dictonary["name"])):
-                logic_time_tuple = (dictonary["logical_time"][pos], dictonary["microstep"][pos])
-                dictonary["colours"][pos] = logical_colours_dict[logic_time_tuple]
-
-
-
-
-
-    def remove_reactions(self, include, exclude):
-        '''Takes regex input from user and removes data from the data set accordingly.'''
-
-        # Too many args (user wants to include and exclude reactions at the same time)
-        if include and exclude:
-            raise TypeError("Too many arguments")
-
-        # Include reactions
-        filtered_labels = []
-        if include:
-
-            # Iterate through all reactions (self.labels contains all reaction names), and add those that
-            # match the regex to a list
-            for label in self.labels:
-                if regex.search(include, label):
-                    filtered_labels.append(label)
-            self.labels = filtered_labels
-            self.diable_arrows = True
-
-        # Same as include, except here labels that do not match are kept
-        if exclude:
-            for label in self.labels:
-                if not regex.search(exclude, label):
-                    filtered_labels.append(label)
-            self.labels = filtered_labels
-            self.diable_arrows = True
-
-
-
-
-        # Update the number_labels list, to reflect the new dataset
-        self.number_labels = {}
-        for i in range(len(self.labels)):
-            self.number_labels[i] = self.labels[i]
-        
-        # Update the positions of reactions on the y-axis, as some reactions have been removed 
-        # (positions are integers, which are later overwritten with the reaction name label)
-        label_y_pos = {v: k for k, v in self.number_labels.items()}
-        
-
-        # remove excluded data from the dictionaries 
-        for data_source in [self.ordered_inst_events_reactions, self.ordered_inst_events_actions, self.ordered_exe_events]:
-            
-            # find all datapoints with exluded names and add their position index to a list
-            active_values = self.labels
-            indices_to_remove = []
-            for i in range(len(data_source["name"])):
-                current_label = data_source["name"][i]
-
-                # If the datapoint is to be removed, add its index to a list
-                if current_label not in active_values:
-                    indices_to_remove.append(i)
-                
-                # Else, update the y-position of the reaction 
-                else:
-                    data_source["y_axis"][i] = label_y_pos[current_label]
-                    if data_source is self.ordered_exe_events:
-                        data_source["y_multi_line"][i] = [
-                            label_y_pos[current_label], label_y_pos[current_label]]
-
-            # Going from bottom to top, remove all datapoints with exluded names (using their index in the respective data source table)
-            indices_to_remove.reverse()
-            for index in indices_to_remove:
-                for key in data_source.keys():
-                    data_source[key].pop(index)
-
-
-
-
-    
-              
-    def find_dependencies(self):
-        
-        event_dict = self.ordered_exe_events
-        
-        total_dependencies = len(event_dict["logical_time"])
-        current_dependency = 1
-        for pos in range(len(event_dict["logical_time"])):
-
-            event_logical_time = event_dict["logical_time"][pos]
-            event_logical_microstep = event_dict["microstep"][pos]
-            
-            inc_index = pos + 1
-
-            # iterate, incrementing pos
-            for time in event_dict["logical_time"][inc_index:]:
-                
-                # logical time greater, so no dependency
-                if time > event_logical_time:
-                    break
-                
-                # if the logical time is the same, check if there is a dependency
-                if time == event_logical_time and event_logical_microstep == event_dict["microstep"][inc_index]:
-                    
-                    event_name = event_dict["name"][pos]
-                    dependent_event_name = event_dict["name"][inc_index]
-                    
-                    # if there is a dependency, draw an arrow
-                    if dependent_event_name in self.dependency_dict[event_name]:
-                        self.arrow_pos.append((event_dict["time_end"][pos], event_dict["y_axis"][pos],
-                                               event_dict["time_start"][inc_index], event_dict["y_axis"][inc_index]))
-                        
-                        
-                # increment index
-                inc_index += 1
-                
-        
\ No newline at end of file
+        if rasterize:
+            plot = self.rasterized(seg, df_worker_markers["time_start"], df_worker_markers["time_end"], df_worker_markers["worker"])
+            self.serve_holoviews(plot, port)
+        else:
+            # save file 
+            hv.save(seg, self.graph_name + "_holoviews_worker.html", backend='bokeh')
+
+
+
+
+
+
+    def rasterized(self, element, starts, ends, y_values):
+        '''Datashader rasterization of a holoviews element of the executions, re-aggregated on every zoom. When the visible range
+        holds at most HOVER_LIMIT executions, they are also drawn individually on top of the raster, with their tooltips'''
+        import holoviews as hv
+        try:
+            from holoviews.operation.datashader import rasterize, dynspread
+        except ImportError as error:
+            raise ImportError("--rasterize requires datashader (pip install datashader)") from error
+
+        # Executions overlapping the visible x-range are found with two binary searches (see interval_index)
+        index = interval_index(np.asarray(starts, dtype=np.float64), np.asarray(ends, dtype=np.float64), np.arange(len(starts)))
+        y_values = np.asarray(y_values)
+
+        raster = dynspread(rasterize(element).opts(cnorm="eq_hist", tools=["hover"], height=700, width=1300, xformatter="%f"))
+
+        def visible_executions(x_range, y_range):
+            rows = index.query(*x_range) if x_range is not None else index.rows[:0]
+            if y_range is not None:
+                rows = rows[(y_values[rows] >= y_range[0]) & (y_values[rows] <= y_range[1])]
+            if len(rows) > HOVER_LIMIT:
+                rows = rows[:0]
+            return element.iloc[np.sort(rows)]
+
+        return raster * hv.DynamicMap(visible_executions, streams=[hv.streams.RangeXY(source=raster)])
+
+    def serve_holoviews(self, plot, port=0):
+        '''Shows a holoviews plot from a Bokeh server until interrupted (rasterized plots are aggregated in Python on every zoom,
+        so they cannot be saved to a static file)'''
+        import holoviews as hv
+        print("Serving " + self.graph_name + " (interrupt to stop)")
+        hv.renderer('bokeh').app(plot, show=True, new_window=True, port=port)
+
+
+    def data_sources(self):
+        '''One ColumnDataSource for each event table (executions, reactions, actions), holding only the columns used by the glyphs
+        and tooltips'''
+        exe_source = ColumnDataSource(self.ordered_exe_events.as_dict(EXE_SOURCE_COLUMNS))
+        reaction_source = ColumnDataSource(self.ordered_inst_events_reactions.as_dict(INSTANT_SOURCE_COLUMNS))
+        action_source = ColumnDataSource(self.ordered_inst_events_actions.as_dict(INSTANT_SOURCE_COLUMNS))
+        return exe_source, reaction_source, action_source
+
+    def tag_colours(self):
+        '''Colour spec giving the palette colour of the tag id of each row, computed in the browser'''
+        return transform("tag", CustomJSTransform(args={"palette": PALETTE},
+                                                  v_func="return Array.from(xs, (tag) => palette[tag % palette.length])"))
+
+    def metadata_hover(self):
+        '''Tooltip formatter of the name_id column, which gives the name or a YAML attribute of the reaction (e.g. @name_id{name},
+        @name_id{priority}). The names and attributes are stored once per reaction in the document, in a data source with one row per
+        name_id'''
+        categories = self.ordered_exe_events.categories
+        metadata = {"name": categories.names}
+        for attribute in METADATA_ATTRIBUTES:
+            metadata[attribute] = [value if isinstance(value, (int, float, str)) or value is None else str(value)
+                                   for value in categories.attributes.get(attribute, [])]
+        return CustomJSHover(args={"metadata": ColumnDataSource(metadata)}, code="return String(metadata.data[format][value])")
+
+    def execution_frame(self):
+        '''DataFrame of the execution columns used by the holoviews views'''
+        import pandas as pd
+        return pd.DataFrame(self.ordered_exe_events.as_dict(EXE_SOURCE_COLUMNS + ["colours"]))